@@ -0,0 +1,480 @@
+"""
+Đo chi phí suy luận của agent Prolog: số inference và thời gian CPU mỗi vòng
+(statistics/2 của SWI-Prolog) cùng tỉ lệ thắng, trên cùng các bản đồ sinh
+theo seed.
+
+    python bench_agent.py --sizes 4 6 8 --count 50 --seed 0
+    python bench_agent.py --sizes 8 12 16 --count 100
+    git show HEAD~1:src/wumpus_agent.pl > /tmp/old_agent.pl
+    python bench_agent.py --script /tmp/old_agent.pl
+    python bench_agent.py --baseline HEAD~1 --traces --sizes 4 6 8 --count 200
+    python bench_agent.py --baseline REV --soundness --save-traces runs --sizes 6 8 12
+    python bench_agent.py --lookups 32 48 64 --baseline REV
+    python bench_agent.py --sizes 32 48 --count 20 --baseline REV
+    python bench_agent.py --startup --repeat 10
+
+Mọi ván chạy trong một tiến trình swipl (như chế độ serve), trace được ghi
+vào null stream nên chỉ còn chi phí của agent. Chỉ dùng play_game/4,
+clear_kb/0 và các fact của thế giới nên so được cả các phiên bản agent cũ
+(--script). ms/vòng là thời gian CPU agent cần cho một quyết định.
+
+--baseline REV đo thêm wumpus_agent.pl của revision git REV (thường là
+revision ngay trước thay đổi cần đo, vd. HEAD~1) trên cùng các bản đồ, mỗi
+kích thước một dòng cho mỗi agent. Thêm --traces thì mỗi bản
+đồ còn được chơi lại bằng `serve` với trace JSON (bỏ event cost) để so
+từng ván: số ván có trace giống hệt, số ván có cùng chuỗi quyết định (move /
+shoot / grab / end) và ván khác đầu tiên.
+
+--soundness kiểm tra mọi fact chắc chắn trong trace JSON của mỗi agent với
+bản đồ thật: ô OK, "không có" / "chắc chắn có" pit hoặc wumpus (wumpus đã bị
+bắn chết không còn tính). In số hazard được suy ra chắc chắn (pit yes,
+wumpus known) và số fact sai. --save-traces DIR ghi trace đó cùng
+init_data.txt vào DIR/<agent>/<kích thước>_<bản đồ>/, xem lại được bằng
+render_batch.py.
+
+--lookups đo riêng một lần tra KB theo ô của chính agent: agent chơi một
+ván trên bản đồ size x size (seed --seed), rồi tra mọi ô của bản đồ trên KB
+còn lại sau ván, bằng kb_ok(L, S) nếu agent có (ô đứng trước), nếu không thì
+isOK(S, L) như agent cũ (trạng thái đứng trước).
+
+--startup đo từ lúc chạy `swipl -g start.` (như run_prolog_script) tới khi
+dòng "New Round:" đầu tiên xuất hiện, khi nạp mã nguồn .pl và khi nạp bản
+biên dịch sẵn .qlf (được biên dịch lại nếu cũ hơn mã nguồn).
+"""
+import argparse
+import json
+import os
+import re
+import random
+import subprocess
+import tempfile
+import time
+
+from map_gen import format_init_data, generate_map
+from prolog_pool import END_MARKER
+from prolog_runner import (
+    AGENT_QLF,
+    PROLOG_SCRIPT,
+    agent_file,
+    budget_env,
+    build_command,
+    compile_agent,
+    find_prolog_executable,
+    trace_env,
+)
+
+DECISION_EVENTS = ("move", "shoot", "grab", "end")
+
+# Với mỗi term game(...) đọc từ stdin: chơi một ván, in "vòng inference cpu kết_quả".
+# Ván kết thúc bằng game_over; lỗi khác (agent hỏng) in ra stderr và thoát mã 1.
+BENCH_GOAL = """
+nb_setval(wumpus_serving, true),
+nb_setval(trace_stream, none),
+prompt(_, ''),
+open_null_stream(Null),
+set_output(Null),
+repeat,
+read(user_input, Request),
+( Request == end_of_file ->
+    !
+; Request = game(Size, Wumpus, Pits, Gold),
+  clear_kb,
+  statistics(inferences, I0),
+  statistics(cputime, T0),
+  ( catch(play_game(Size, Wumpus, Pits, Gold), E,
+          ( E == game_over -> true ; format(user_error, 'ERROR: ~q~n', [E]), halt(1) ))
+  -> Played = true
+  ; Played = false
+  ),
+  statistics(inferences, I1),
+  statistics(cputime, T1),
+  ( time_taken(Rounds) -> true ; Rounds = 0 ),
+  ( Played == false ->
+      Status = failed
+  ; gold_status(grabbed) ->
+      Status = won
+  ; agent_location(At),
+    ( pit_location(At) ; wumpus_location(At), wumpus_status(At, alive) ) ->
+      Status = lost
+  ; Status = other
+  ),
+  Inferences is I1 - I0,
+  Cpu is T1 - T0,
+  format(user_output, '~w ~w ~6f ~w~n', [Rounds, Inferences, Cpu, Status]),
+  flush_output(user_output),
+  fail
+)
+"""
+
+# Chơi một ván để có KB thật, rồi tra mọi ô repeat lần; in "predicate số_fact ns"
+LOOKUP_GOAL = """
+Size = {size},
+Repeat = {repeat},
+nb_setval(wumpus_serving, true),
+nb_setval(trace_stream, none),
+open_null_stream(Null),
+set_output(Null),
+clear_kb,
+catch(play_game({size}, {wumpus}, {pits}, {gold}), E,
+      ( E == game_over -> true ; format(user_error, 'ERROR: ~q~n', [E]), halt(1) )),
+( current_predicate(kb_ok/2) ->
+    Name = 'kb_ok(L, S)',
+    aggregate_all(count, kb_ok(_, _), Facts),
+    statistics(cputime, T0),
+    forall(
+        ( between(1, Repeat, _), between(1, Size, X), between(1, Size, Y) ),
+        ( kb_ok([X,Y], _) -> true ; true )
+    ),
+    statistics(cputime, T1)
+; Name = 'isOK(S, L)',
+  aggregate_all(count, isOK(_, _), Facts),
+  statistics(cputime, T0),
+  forall(
+      ( between(1, Repeat, _), between(1, Size, X), between(1, Size, Y) ),
+      ( isOK(_, [X,Y]) -> true ; true )
+  ),
+  statistics(cputime, T1)
+),
+Ns is (T1 - T0) * 1e9 / (Repeat * Size * Size),
+format(user_output, '~w ~w ~1f~n', [Name, Facts, Ns])
+"""
+
+
+def run_swipl(args, script, prolog_cmd=None, **kwargs):
+    """
+    Chạy `swipl -q -s script` với các tham số args; agent lỗi (mã thoát khác
+    0) thì dừng benchmark kèm stderr thay vì đo tiếp một agent hỏng.
+    """
+    result = subprocess.run(
+        [prolog_cmd or find_prolog_executable(), "-q", "-s", script, *args],
+        capture_output=True,
+        text=True,
+        check=False,
+        **kwargs,
+    )
+    if result.returncode != 0:
+        raise SystemExit(
+            f"swipl lỗi với {script} (mã {result.returncode}): {result.stderr.strip()}"
+        )
+    return result
+
+
+def lookup_costs(world_map, script=PROLOG_SCRIPT, repeat=20, prolog_cmd=None):
+    """
+    Tra KB theo ô trên KB thật của agent sau một ván trên world_map. Trả về
+    (predicate được tra, số fact của nó, ns mỗi lần tra).
+    """
+    size, wumpus, pits, gold = world_map
+    goal = LOOKUP_GOAL.format(size=size, repeat=repeat, wumpus=wumpus, pits=pits, gold=gold)
+    result = run_swipl(["-g", goal, "-t", "halt"], script, prolog_cmd)
+    name, facts, ns = result.stdout.rsplit(maxsplit=2)
+    return name, int(facts), float(ns)
+
+
+def first_round_ms(world_map, script):
+    """
+    Thời gian (ms) từ lúc chạy swipl tới dòng "New Round:" đầu tiên của trace
+    (WUMPUS_TRACE_FILE=user: trace ghi ra stdout).
+    """
+    env = trace_env("text")
+    env["WUMPUS_TRACE_FILE"] = "user"
+    with tempfile.TemporaryDirectory(prefix="wumpus_") as workdir:
+        with open(os.path.join(workdir, "init_data.txt"), "w", encoding="utf-8") as f:
+            f.write(format_init_data(world_map))
+        started = time.perf_counter()
+        process = subprocess.Popen(
+            build_command(script=script),
+            cwd=workdir,
+            env=env,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            stdin=subprocess.DEVNULL,
+            text=True,
+        )
+        elapsed = None
+        for line in process.stdout:
+            if "New Round:" in line:
+                elapsed = (time.perf_counter() - started) * 1000
+                break
+        process.kill()
+        process.wait()
+    if elapsed is None:
+        raise SystemExit(f"swipl không chơi được ván với {script}")
+    return elapsed
+
+
+def compare_startup(repeat, seed):
+    if agent_file() != AGENT_QLF:
+        compile_agent()
+    world_map = generate_map(8, random.Random(seed))
+    print(f"{'agent':<26}{'min ms':>9}{'trung vị ms':>13}")
+    for script in (PROLOG_SCRIPT, AGENT_QLF):
+        timings = sorted(first_round_ms(world_map, script) for _ in range(repeat))
+        name = os.path.basename(script)
+        print(f"{name:<26}{timings[0]:>9.1f}{timings[len(timings) // 2]:>13.1f}")
+
+
+def run_games(maps, script=PROLOG_SCRIPT, prolog_cmd=None):
+    """
+    Chơi các bản đồ trong một tiến trình swipl. Trả về [(vòng, inference,
+    cpu giây, kết quả won / lost / other / failed)] theo thứ tự maps; failed
+    là play_game thất bại. Agent ném lỗi (khác game_over) thì dừng hẳn.
+    """
+    requests = "".join(
+        f"game({size}, {wumpus}, {pits}, {gold}).\n" for size, wumpus, pits, gold in maps
+    )
+    result = run_swipl(["-g", BENCH_GOAL, "-t", "halt"], script, prolog_cmd, input=requests)
+    rows = []
+    for line in result.stdout.splitlines():
+        rounds, inferences, cpu, status = line.split()
+        rows.append((int(rounds), int(inferences), float(cpu), status))
+    if len(rows) != len(maps):
+        raise SystemExit(f"swipl chỉ trả về {len(rows)}/{len(maps)} ván: {result.stderr}")
+    return rows
+
+
+def game_traces(maps, script=PROLOG_SCRIPT, prolog_cmd=None):
+    """
+    Trace JSON của từng bản đồ (danh sách event, không có event cost), chơi
+    bằng `serve` của script trong một tiến trình swipl, không giới hạn thời
+    gian thực để trace không phụ thuộc tốc độ máy.
+    """
+    requests = "".join(
+        f"game({size}, {wumpus}, {pits}, {gold}).\n" for size, wumpus, pits, gold in maps
+    )
+    result = run_swipl(
+        ["-g", "serve", "-t", "halt"],
+        script,
+        prolog_cmd,
+        input=requests,
+        env=trace_env("json", verbosity="silent", budget=budget_env(max_seconds=None)),
+    )
+    traces = [[]]
+    for line in result.stdout.splitlines():
+        if line == END_MARKER:
+            traces.append([])
+        elif line.startswith("{"):
+            event = json.loads(line)
+            if event["e"] != "cost":
+                traces[-1].append(event)
+    traces.pop()  # phần sau END_MARKER cuối cùng
+    if len(traces) != len(maps):
+        raise SystemExit(f"swipl chỉ trả về {len(traces)}/{len(maps)} trace: {result.stderr}")
+    # serve nuốt lỗi của ván (ghi vào null stream khi trace JSON): ván hỏng không có event end
+    for i, trace in enumerate(traces):
+        if not any(event["e"] == "end" for event in trace):
+            raise SystemExit(f"Ván #{i} với {script} không kết thúc (agent lỗi?)")
+    return traces
+
+
+def first_difference(trace, other):
+    """Vòng của event khác nhau đầu tiên giữa hai trace, None nếu giống hệt."""
+    if trace == other:
+        return None
+    round_number = 0
+    for event, other_event in zip(trace, other):
+        if event != other_event:
+            return round_number
+        if event["e"] == "round":
+            round_number = event["n"]
+    return round_number
+
+
+def compare_traces(traces, others):
+    """
+    So trace từng bản đồ giữa hai agent. Trả về (số ván trace giống hệt, số
+    ván cùng chuỗi quyết định, (chỉ số bản đồ, vòng) khác đầu tiên).
+    """
+    identical = same_decisions = 0
+    first = None
+    for i, (trace, other) in enumerate(zip(traces, others)):
+        round_number = first_difference(trace, other)
+        if round_number is None:
+            identical += 1
+        elif first is None:
+            first = (i, round_number)
+        decisions = [e for e in trace if e["e"] in DECISION_EVENTS]
+        if decisions == [e for e in other if e["e"] in DECISION_EVENTS]:
+            same_decisions += 1
+    return identical, same_decisions, first
+
+
+def unsound_facts(world_map, trace):
+    """
+    Các fact chắc chắn của trace trái với bản đồ thật: [(vòng, event)].
+    Wumpus đã bị bắn chết không còn là hazard.
+    """
+    _, wumpus, pits, _ = world_map
+    wumpus = {tuple(cell) for cell in wumpus}
+    pits = {tuple(cell) for cell in pits}
+    wrong = []
+    round_number = 0
+    for event in trace:
+        if event["e"] == "round":
+            round_number = event["n"]
+        elif event["e"] == "kill":
+            wumpus.discard(tuple(event["at"]))
+        elif event["e"] == "kb":
+            at = tuple(event["at"])
+            fact = (event["f"], event["v"])
+            if (
+                (fact == ("ok", "yes") and (at in wumpus or at in pits))
+                or (fact == ("pit", "yes") and at not in pits)
+                or (fact == ("pit", "no") and at in pits)
+                or (fact == ("wumpus", "known") and at not in wumpus)
+                or (fact == ("wumpus", "no") and at in wumpus)
+            ):
+                wrong.append((round_number, event))
+    return wrong
+
+
+def check_soundness(maps, traces):
+    """
+    (số hazard được suy ra chắc chắn, [(chỉ số bản đồ, vòng, event)] các fact
+    sai) trên mọi ván.
+    """
+    promoted = 0
+    wrong = []
+    for i, (world_map, trace) in enumerate(zip(maps, traces)):
+        promoted += sum(
+            e["e"] == "kb" and (e["f"], e["v"]) in (("pit", "yes"), ("wumpus", "known"))
+            for e in trace
+        )
+        wrong.extend((i, n, event) for n, event in unsound_facts(world_map, trace))
+    return promoted, wrong
+
+
+def save_traces(directory, agent, maps, traces):
+    """Ghi kb.jsonl và init_data.txt của từng ván vào directory/agent/<size>_<i>/."""
+    for i, (world_map, trace) in enumerate(zip(maps, traces)):
+        game_dir = os.path.join(directory, safe_name(agent), f"{world_map[0]}_{i}")
+        os.makedirs(game_dir, exist_ok=True)
+        with open(os.path.join(game_dir, "init_data.txt"), "w", encoding="utf-8") as f:
+            f.write(format_init_data(world_map))
+        with open(os.path.join(game_dir, "kb.jsonl"), "w", encoding="utf-8") as f:
+            f.writelines(json.dumps(event, separators=(",", ":")) + "\n" for event in trace)
+
+
+def safe_name(rev):
+    """Tên revision dùng được làm tên file (HEAD~1, origin/main, ...)."""
+    return re.sub(r"[^\w.-]", "_", rev)
+
+
+def baseline_script(rev, workdir):
+    """Ghi wumpus_agent.pl của revision git rev vào workdir, trả về đường dẫn."""
+    source = subprocess.run(
+        ["git", "show", f"{rev}:./{os.path.basename(PROLOG_SCRIPT)}"],
+        cwd=os.path.dirname(PROLOG_SCRIPT),
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    path = os.path.join(workdir, f"wumpus_agent_{safe_name(rev)}.pl")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(source)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[4, 6, 8])
+    parser.add_argument("--count", type=int, default=50, help="số bản đồ mỗi kích thước")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--script", default=PROLOG_SCRIPT, help="file agent .pl cần đo")
+    parser.add_argument("--baseline", help="revision git của agent để so (vd. HEAD~1)")
+    parser.add_argument(
+        "--traces", action="store_true", help="với --baseline: so trace từng ván"
+    )
+    parser.add_argument(
+        "--soundness", action="store_true", help="kiểm tra các fact chắc chắn với bản đồ thật"
+    )
+    parser.add_argument("--save-traces", help="thư mục ghi trace JSON của từng ván")
+    parser.add_argument(
+        "--lookups",
+        type=int,
+        nargs="+",
+        help="chỉ đo tra KB của agent sau một ván trên các kích thước này",
+    )
+    parser.add_argument(
+        "--startup", action="store_true", help="chỉ đo thời gian tới vòng đầu: .pl so với .qlf"
+    )
+    parser.add_argument("--repeat", type=int, default=10, help="số lần chạy cho --startup")
+    args = parser.parse_args()
+
+    if args.startup:
+        compare_startup(args.repeat, args.seed)
+        return
+
+    with tempfile.TemporaryDirectory(prefix="wumpus_") as workdir:
+        agents = [("script", args.script)]
+        if args.baseline:
+            agents.append((args.baseline, baseline_script(args.baseline, workdir)))
+        for name, script in agents:
+            print(f"Agent {name}: {script}")
+
+        if args.lookups:
+            print(
+                f"{'agent':<10}{'kích thước':<12}{'predicate':<14}{'số fact':>9}{'ns/lần tra':>12}"
+            )
+            for size in args.lookups:
+                world_map = generate_map(size, random.Random(args.seed))
+                for name, script in agents:
+                    predicate, facts, ns = lookup_costs(world_map, script)
+                    print(
+                        f"{name:<10}{f'{size}x{size}':<12}{predicate:<14}{facts:>9}{ns:>12.1f}"
+                    )
+            return
+
+        print(
+            f"{'agent':<10}{'kích thước':<12}{'vòng TB':>9}{'thắng':>8}{'inference/vòng':>16}"
+            f"{'inference/ván':>15}{'ms/vòng':>9}"
+        )
+        for size in args.sizes:
+            rng = random.Random(args.seed)
+            maps = [generate_map(size, rng) for _ in range(args.count)]
+            for name, script in agents:
+                rows = run_games(maps, script)
+                rounds = sum(r[0] for r in rows)
+                inferences = sum(r[1] for r in rows)
+                cpu = sum(r[2] for r in rows)
+                won = sum(r[3] == "won" for r in rows)
+                print(
+                    f"{name:<10}{f'{size}x{size}':<12}{rounds / len(rows):>9.1f}"
+                    f"{won / len(rows):>8.1%}{inferences / max(rounds, 1):>16.0f}"
+                    f"{inferences / len(rows):>15.0f}{cpu * 1000 / max(rounds, 1):>9.3f}"
+                )
+                failed = sum(r[3] == "failed" for r in rows)
+                if failed:
+                    print(f"{name:<10}{f'{size}x{size}':<12}play_game thất bại ở {failed} ván")
+            if not (args.traces or args.soundness or args.save_traces):
+                continue
+            traces = {name: game_traces(maps, script) for name, script in agents}
+            if args.save_traces:
+                for name, _ in agents:
+                    save_traces(args.save_traces, name, maps, traces[name])
+            if args.soundness:
+                for name, _ in agents:
+                    promoted, wrong = check_soundness(maps, traces[name])
+                    message = (
+                        f"{name} {size}x{size}: {promoted} hazard suy ra chắc chắn, "
+                        f"{len(wrong)} fact sai"
+                    )
+                    if wrong:
+                        i, round_number, event = wrong[0]
+                        message += f"; đầu tiên: bản đồ #{i}, vòng {round_number}, {event}"
+                    print(message)
+            if args.baseline and args.traces:
+                identical, same_decisions, first = compare_traces(
+                    traces["script"], traces[args.baseline]
+                )
+                message = (
+                    f"{size}x{size}: trace giống hệt {identical}/{len(maps)}, "
+                    f"cùng quyết định {same_decisions}/{len(maps)}"
+                )
+                if first is not None:
+                    message += f"; khác đầu tiên: bản đồ #{first[0]}, vòng {first[1]}"
+                print(message)
+
+
+if __name__ == "__main__":
+    main()
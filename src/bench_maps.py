@@ -0,0 +1,41 @@
+"""
+Đo tốc độ sinh bản đồ của map_gen.generate_map theo kích thước, và kiểm tra
+một mẫu bản đồ bằng map_violations.
+
+    python bench_maps.py --sizes 4 8 16 32 64 --seconds 1
+"""
+import argparse
+import random
+import time
+
+from map_gen import generate_map, get_wumpus_pit_count, map_violations
+
+
+def maps_per_second(size, seconds, rng):
+    count = 0
+    started = time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        generate_map(size, rng)
+        count += 1
+    return count / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[4, 5, 6, 7, 8, 16, 32, 64])
+    parser.add_argument("--seconds", type=float, default=1.0)
+    parser.add_argument("--check", type=int, default=50, help="số bản đồ kiểm tra luật mỗi kích thước")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'kích thước':<12}{'wumpus':>8}{'pit':>8}{'bản đồ/s':>12}{'vi phạm':>10}")
+    for size in args.sizes:
+        rng = random.Random(args.seed)
+        rate = maps_per_second(size, args.seconds, rng)
+        bad = sum(bool(map_violations(generate_map(size, rng))) for _ in range(args.check))
+        wumpus, pits = get_wumpus_pit_count(size)
+        print(f"{f'{size}x{size}':<12}{wumpus:>8}{pits:>8}{rate:>12.0f}{bad:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Đo thời gian vẽ một khung hình của hai màn hình pygame trên bản đồ 8x8
+(không tính display.flip và clock.tick).
+
+    python bench_render.py --size 8 --frames 300
+
+Màn hình cấu hình vẽ bản đồ sinh ngẫu nhiên; màn hình mô phỏng vẽ bước cuối
+của một agent đi ngẫu nhiên (bench_steps.random_walk_steps) để có đủ ô bị
+làm mờ, ô an toàn và ô nghi ngờ.
+"""
+import argparse
+import os
+import random
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.chdir(os.path.dirname(os.path.abspath(__file__)))  # ảnh nằm ở ../image
+
+from bench_steps import random_walk_steps  # noqa: E402
+from map_gen import generate_map  # noqa: E402
+from step_store import StepStore  # noqa: E402
+
+
+def time_frames(draw_frame, frames):
+    draw_frame()  # khung đầu dựng bộ đệm
+    timings = []
+    for _ in range(frames):
+        started = time.perf_counter()
+        draw_frame()
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    return sum(timings) / len(timings), timings[int(0.95 * (len(timings) - 1))]
+
+
+def setup_config(size, seed):
+    import config
+
+    config.init_display()
+    random.seed(seed)
+    config.selected_size = str(size)
+    config.reset_map(size)
+    config.validate_and_update()
+
+    def frame():
+        config.screen.fill(config.WHITE)
+        config.draw_map()
+        config.draw_inputs()
+        config.draw_error()
+
+    return frame
+
+
+def setup_ui(size, seed, steps):
+    import wumpus_ui as ui
+
+    ui.init_display()
+    rng = random.Random(seed)
+    _, wumpus, pits, gold = generate_map(size, rng, max_tries=10000)
+    ui.WORLD_DIM = size
+    ui.wumpus_location_prolog, ui.pit_locations_prolog, ui.gold_location_prolog = wumpus, pits, gold
+    store = StepStore()
+    path = []
+    for step_info, kb in random_walk_steps(size, steps, rng):
+        store.append(step_info, kb)
+        path.append(step_info["start_location"])
+    ui.simulation_steps_data = store
+    ui.current_step_index = len(store) - 1
+    ui.simulation_agent_pos = list(path[-1])
+    ui.simulation_agent_path = path
+    ui.simulation_percepts_current = ["yes", "yes", "no"]
+    ui.simulation_game_status = "playing"
+
+    def frame():
+        ui.screen.fill(ui.WHITE)
+        ui.draw_grid()
+        ui.draw_world_elements()
+        ui.draw_agent_path()
+        ui.draw_action_effects()
+        ui.draw_agent()
+        ui.draw_percepts_at_agent_location()
+        ui.draw_ui_elements()
+
+    return frame
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size", type=int, default=8)
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--steps", type=int, default=40)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rows = [
+        ("config", setup_config(args.size, args.seed)),
+        ("wumpus_ui", setup_ui(args.size, args.seed, args.steps)),
+    ]
+    print(f"Bản đồ {args.size}x{args.size}, {args.frames} khung hình")
+    print(f"{'màn hình':<12}{'mean ms':>10}{'p95 ms':>10}")
+    for name, frame in rows:
+        mean, p95 = time_frames(frame, args.frames)
+        print(f"{name:<12}{mean * 1000:>10.3f}{p95 * 1000:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Đo độ trễ từ lúc bấm PLAY trong config.py tới khung hình đầu tiên của màn
+hình mô phỏng: chạy wumpus_ui trong một tiến trình python mới (cách cũ) so
+với chuyển cảnh trong cùng tiến trình (config.start_simulation).
+
+    python bench_scene.py --repeat 5
+    SDL_VIDEODRIVER=x11 python bench_scene.py   # đo với cửa sổ thật
+
+Cả hai cách đều làm đúng các bước trước khung hình đầu của wumpus_ui.main:
+start_scene() (đọc bản đồ, khởi chạy agent) rồi render_frame().
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))  # ảnh nằm ở ../image
+
+# Tiến trình mới: như `python wumpus_ui.py` tới khung hình đầu, rồi thoát
+SUBPROCESS_CODE = """
+import sys, time
+import wumpus_ui
+wumpus_ui.print = lambda *args, **kwargs: None
+wumpus_ui.start_scene()
+wumpus_ui.render_frame()
+print(time.time() - float(sys.argv[1]))
+wumpus_ui.stop_trace_stream()
+"""
+
+
+def new_process_ms():
+    started = time.time()
+    result = subprocess.run(
+        [sys.executable, "-c", SUBPROCESS_CODE, repr(started)],
+        cwd=SRC_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return float(result.stdout.strip().splitlines()[-1]) * 1000
+
+
+def in_process_ms(config, ui):
+    """Như config.start_simulation tới khung hình đầu, trên cửa sổ của config."""
+    config.init_display()
+    config.open_window()
+    config.draw_frame()
+    started = time.perf_counter()
+    ui.start_scene((config.map_size, config.wumpus_pos, config.pit_positions, config.gold_pos))
+    ui.render_frame()
+    elapsed = (time.perf_counter() - started) * 1000
+    ui.stop_trace_stream()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    os.chdir(SRC_DIR)
+
+    spawned = [new_process_ms() for _ in range(args.repeat)]
+
+    import config
+
+    config.init_display()
+    ui = config.simulation_scene()  # config nạp sẵn sau khung hình đầu của nó
+    ui.init_display()
+    ui.print = lambda *args, **kwargs: None
+    switched = [in_process_ms(config, ui) for _ in range(args.repeat)]
+
+    for name, timings in (("tiến trình mới", spawned), ("cùng tiến trình", switched)):
+        timings = sorted(timings)
+        print(
+            f"{name:<16} min {timings[0]:8.1f} ms   trung vị {timings[len(timings) // 2]:8.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Đo thời gian khởi động: import từng module trong một tiến trình python mới
+(và import có kéo theo pygame / mở cửa sổ hay không), cùng thời gian từ lúc
+chạy python tới khung hình đầu tiên của hai màn hình.
+
+    python bench_startup.py --repeat 5
+    python bench_startup.py --modules map_gen wumpus_ui --repeat 10
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))  # ảnh nằm ở ../image
+MODULES = [
+    "map_gen",
+    "kb_grid",
+    "step_store",
+    "world_engine",
+    "oracle",
+    "map_corpus",
+    "tournament",
+    "wumpus_ui",
+    "config",
+]
+
+IMPORT_CODE = """
+import sys, time
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+loaded = "pygame.base" in sys.modules
+display = loaded and sys.modules["pygame"].display.get_surface() is not None
+print(elapsed, int(loaded), int(display))
+"""
+
+# Như config.main / wumpus_ui.main tới khung hình đầu tiên
+FIRST_FRAME_CODE = {
+    "config": """
+import config
+config.init_display()
+config.draw_frame()
+config.pygame.display.flip()
+""",
+    "wumpus_ui": """
+import wumpus_ui
+wumpus_ui.print = lambda *args, **kwargs: None
+wumpus_ui.start_scene()
+wumpus_ui.render_frame()
+""",
+}
+
+
+def run_python(code, *args):
+    result = subprocess.run(
+        [sys.executable, "-c", code, *args],
+        cwd=SRC_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return result.stdout.strip().splitlines()[-1]
+
+
+def import_stats(module):
+    elapsed, loaded, display = run_python(IMPORT_CODE.format(module=module)).split()
+    return float(elapsed) * 1000, loaded == "1", display == "1"
+
+
+def first_frame_ms(screen):
+    """Từ lúc gọi python tới khi vẽ xong khung hình đầu (gồm khởi động trình thông dịch)."""
+    code = (
+        "import sys, time\n"
+        + FIRST_FRAME_CODE[screen]
+        + "print(time.time() - float(sys.argv[1]))\n"
+    )
+    if screen == "wumpus_ui":
+        code += "wumpus_ui.stop_trace_stream()\n"
+    return float(run_python(code, repr(time.time()))) * 1000
+
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--modules", nargs="+", default=MODULES)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'module':<14}{'import ms':>11}{'pygame':>8}{'cửa sổ':>8}")
+    for module in args.modules:
+        runs = [import_stats(module) for _ in range(args.repeat)]
+        elapsed = median([r[0] for r in runs])
+        loaded, display = runs[-1][1], runs[-1][2]
+        print(
+            f"{module:<14}{elapsed:>11.1f}{'có' if loaded else 'không':>8}"
+            f"{'có' if display else 'không':>8}"
+        )
+
+    print()
+    print(f"{'khung hình đầu':<14}{'trung vị ms':>13}{'min ms':>9}")
+    for screen in FIRST_FRAME_CODE:
+        timings = [first_frame_ms(screen) for _ in range(args.repeat)]
+        print(f"{screen:<14}{median(timings):>13.1f}{min(timings):>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
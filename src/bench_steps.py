@@ -0,0 +1,176 @@
+"""
+Đo bộ nhớ lịch sử bước: StepStore (delta bitmask + keyframe) so với cách cũ
+chép đủ các danh sách KB vào mỗi step_info, và chi phí tìm ô bị làm mờ của
+draw_grid (quét danh sách so với bitmask).
+
+    python bench_steps.py --kb kb.txt
+    python bench_steps.py --size 8 --steps 100
+
+Với --kb, các bước được phân tích từ trace thật. Không có --kb thì dùng một
+agent đi ngẫu nhiên trên bản đồ size x size: ô đã đi được thêm vào visited,
+ô kề vào safe / maybe_pit / no_pit, để các danh sách KB lớn dần như một ván thật.
+"""
+import argparse
+import os
+import random
+import time
+import tracemalloc
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+from kb_grid import KB_KEYS, KnowledgeGrid  # noqa: E402
+from step_store import StepStore  # noqa: E402
+
+KNOWN_KEYS = ("visited_locations", "safe_locations", "maybe_wumpus_locations", "maybe_pit_locations")
+
+
+def random_walk_steps(size, steps, rng):
+    """
+    Sinh (step_info, KnowledgeGrid) cho từng bước của một agent đi ngẫu nhiên.
+    """
+    kb = KnowledgeGrid(size)
+    pos = [1, 1]
+    for i in range(steps):
+        kb.add("visited_locations", pos)
+        for dx, dy in ((1, 0), (-1, 0), (0, 1), (0, -1)):
+            cell = [pos[0] + dx, pos[1] + dy]
+            if not (1 <= cell[0] <= size and 1 <= cell[1] <= size):
+                continue
+            key = rng.choice(("safe_locations", "maybe_pit_locations", "no_wumpus_locations"))
+            kb.add(key, cell)
+            if key == "safe_locations" and kb.has("maybe_pit_locations", cell):
+                kb.discard("maybe_pit_locations", cell)
+                kb.add("no_pit_locations", cell)
+        step_info = {
+            "round": i,
+            "start_location": list(pos),
+            "percepts": ["no", "no", "no"],
+            "action": {"type": "move", "target": list(pos)},
+            "next_location": list(pos),
+            "score": -i,
+            "time": i,
+            "end_status": "playing",
+            "wumpus_status": "alive",
+            "wumpus_location": [size, size],
+            "messages": [],
+        }
+        yield step_info, kb.copy()
+        dx, dy = rng.choice(((1, 0), (-1, 0), (0, 1), (0, -1)))
+        pos = [min(size, max(1, pos[0] + dx)), min(size, max(1, pos[1] + dy))]
+
+
+def full_copy_list(steps):
+    """Cách lưu cũ: mỗi bước giữ bản sao đầy đủ của mọi danh sách KB."""
+    full = []
+    for step_info, kb in steps:
+        step = dict(step_info)
+        for key in KB_KEYS:
+            step[key] = kb.cells(key)
+        full.append(step)
+    return full
+
+
+def delta_store(steps):
+    store = StepStore()
+    for step_info, kb in steps:
+        store.append(step_info, kb)
+    return store
+
+
+def measure(build, steps):
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = build(steps)
+    elapsed = time.perf_counter() - started
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current, elapsed
+
+
+def kb_steps_from_trace(path):
+    """
+    Phân tích kb.txt bằng bộ phân tích của wumpus_ui rồi trả lại (step_info, kb).
+    """
+    import wumpus_ui
+
+    wumpus_ui.add_message = lambda msg: None
+    wumpus_ui.load_init_data()
+    if not wumpus_ui.load_and_parse_kb_log(path):
+        raise SystemExit(f"Không đọc được {path}")
+    steps = []
+    for step in wumpus_ui.simulation_steps_data:
+        step = dict(step)
+        steps.append((step, step.pop("kb")))
+    return steps
+
+
+def dim_check_times(full, store, size):
+    """
+    Thời gian tìm ô bị làm mờ cho mọi bước: quét danh sách như draw_grid cũ,
+    so với một phép OR bitmask cho mỗi bước rồi thử bit từng ô.
+    """
+    cells = [[x, y] for y in range(1, size + 1) for x in range(1, size + 1)]
+    started = time.perf_counter()
+    for step in full:
+        known = step["safe_locations"] + step["maybe_wumpus_locations"] + step["maybe_pit_locations"]
+        dims = [c for c in cells if c not in step["visited_locations"] and c not in known]
+    lists = time.perf_counter() - started
+    started = time.perf_counter()
+    for i in range(len(store)):
+        kb = store[i]["kb"]
+        known_mask = kb.union(*KNOWN_KEYS)
+        masks = [c for c in cells if not known_mask & kb.bit(c)]
+    bitmask = time.perf_counter() - started
+    assert dims == masks
+    return lists, bitmask
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--kb", help="trace kb.txt thật")
+    parser.add_argument("--size", type=int, default=8)
+    parser.add_argument("--steps", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.kb:
+        steps = kb_steps_from_trace(args.kb)
+        print(f"Trace: {args.kb}, {len(steps)} bước")
+    else:
+        steps = list(random_walk_steps(args.size, args.steps, random.Random(args.seed)))
+        print(f"Đi ngẫu nhiên: {args.size}x{args.size}, {len(steps)} bước")
+    size = steps[-1][1].size
+    cells = sum(steps[-1][1].count(key) for key in KB_KEYS)
+    print(f"Số ô trong KB ở bước cuối: {cells}")
+
+    full, full_bytes, full_time = measure(full_copy_list, steps)
+    store, store_bytes, store_time = measure(delta_store, steps)
+
+    started = time.perf_counter()
+    for i in range(len(store)):
+        store[i]
+    sequential = time.perf_counter() - started
+    started = time.perf_counter()
+    for i in random.Random(args.seed).sample(range(len(store)), len(store)):
+        store.masks_at(i)
+    random_access = time.perf_counter() - started
+    for i, step in enumerate(full):
+        assert all(store[i]["kb"].cells(key) == step[key] for key in KB_KEYS), i
+    lists, bitmask = dim_check_times(full, store, size)
+
+    print(f"{'cách lưu':<12}{'KiB':>10}{'dựng ms':>10}")
+    print(f"{'full copy':<12}{full_bytes / 1024:>10.1f}{full_time * 1000:>10.2f}")
+    print(f"{'delta':<12}{store_bytes / 1024:>10.1f}{store_time * 1000:>10.2f}")
+    print(f"Tỉ lệ bộ nhớ: {full_bytes / store_bytes:.1f}x")
+    print(
+        f"Dựng lại bước: tuần tự {sequential / len(store) * 1e6:.1f} µs/bước, "
+        f"ngẫu nhiên {random_access / len(store) * 1e6:.1f} µs/bước"
+    )
+    print(
+        f"Tìm ô bị làm mờ ({size}x{size}, {len(full)} bước): "
+        f"quét list {lists * 1000:.2f} ms, bitmask {bitmask * 1000:.2f} ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+So sánh tốc độ đọc trace: load_and_parse_kb_log (regex trên kb.txt) với
+load_structured_trace (JSON lines trong kb.jsonl).
+
+    python bench_trace.py --size 8 --seed 3 --repeat 20
+    python bench_trace.py --text kb.txt --json kb.jsonl
+    python bench_trace.py --levels --size 7 --repeat 5
+
+Không truyền --text/--json thì agent được chạy hai lần trên cùng bản đồ
+(WUMPUS_TRACE=text và WUMPUS_TRACE=json) để tạo trace.
+
+--levels chạy agent trên cùng bản đồ với từng mức WUMPUS_VERBOSITY
+(silent / events / debug) và so kích thước trace, thời gian chạy agent và
+thời gian đọc bằng load_and_parse_kb_log.
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+from map_gen import generate_map  # noqa: E402
+from prolog_runner import VERBOSITY_LEVELS, run_agent_game  # noqa: E402
+
+
+def time_loader(loader, path, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        ok = loader(path)
+        timings.append(time.perf_counter() - started)
+        if not ok:
+            raise SystemExit(f"Không đọc được {path}")
+    return min(timings), sum(timings) / len(timings)
+
+
+def file_stats(path):
+    with open(path, "r") as f:
+        content = f.read()
+    return content.count("\n"), len(content.encode())
+
+
+def compare_levels(world_map, repeat):
+    import wumpus_ui
+
+    wumpus_ui.add_message = lambda msg: None
+    workdir = tempfile.mkdtemp(prefix="wumpus_bench_")
+    print(f"{'mức':<8}{'dòng':>8}{'bytes':>10}{'bước':>6}{'agent ms':>10}{'đọc ms':>9}")
+    for level in VERBOSITY_LEVELS:
+        runs = [run_agent_game(world_map, verbosity=level) for _ in range(repeat)]
+        if any(run["returncode"] != 0 for run in runs):
+            raise SystemExit(f"Agent lỗi ở mức {level}: {runs[0]['stderr']}")
+        agent_ms = min(run["wall_time"] for run in runs) * 1000
+        path = os.path.join(workdir, f"kb_{level}.txt")
+        with open(path, "w") as f:
+            f.write(runs[0]["trace"])
+        lines, size = file_stats(path)
+        steps, parse_ms = 0, 0.0
+        if level != "silent":
+            best, _ = time_loader(wumpus_ui.load_and_parse_kb_log, path, repeat)
+            steps, parse_ms = len(wumpus_ui.simulation_steps_data), best * 1000
+        print(f"{level:<8}{lines:>8}{size:>10}{steps:>6}{agent_ms:>10.1f}{parse_ms:>9.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--text", help="trace dạng chữ (kb.txt)")
+    parser.add_argument("--json", help="trace JSON lines (kb.jsonl)")
+    parser.add_argument("--size", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--levels", action="store_true", help="so các mức WUMPUS_VERBOSITY")
+    args = parser.parse_args()
+
+    if args.levels:
+        world_map = generate_map(args.size, random.Random(args.seed))
+        print(f"Bản đồ: {world_map}")
+        compare_levels(world_map, args.repeat)
+        return
+
+    workdir = tempfile.mkdtemp(prefix="wumpus_bench_")
+    text_path, json_path = args.text, args.json
+    if not (text_path and json_path):
+        world_map = generate_map(args.size, random.Random(args.seed))
+        print(f"Bản đồ: {world_map}")
+        for fmt, name in (("text", "kb.txt"), ("json", "kb.jsonl")):
+            run = run_agent_game(world_map, trace_format=fmt)
+            if not run["trace"]:
+                raise SystemExit(f"Agent không tạo trace {fmt}: {run['stderr']}")
+            with open(os.path.join(workdir, name), "w") as f:
+                f.write(run["trace"])
+            print(f"Agent ({fmt}): {run['wall_time']:.3f}s")
+        text_path = text_path or os.path.join(workdir, "kb.txt")
+        json_path = json_path or os.path.join(workdir, "kb.jsonl")
+
+    import wumpus_ui
+
+    wumpus_ui.add_message = lambda msg: None  # bỏ log UI khi đo
+    rows = [
+        ("regex", wumpus_ui.load_and_parse_kb_log, text_path),
+        ("json", wumpus_ui.load_structured_trace, json_path),
+    ]
+    print(f"{'loader':<8}{'dòng':>8}{'bytes':>10}{'bước':>6}{'best ms':>10}{'mean ms':>10}")
+    for name, loader, path in rows:
+        best, mean = time_loader(loader, path, args.repeat)
+        lines, size = file_stats(path)
+        steps = len(wumpus_ui.simulation_steps_data)
+        print(f"{name:<8}{lines:>8}{size:>10}{steps:>6}{best * 1000:>10.2f}{mean * 1000:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,28 @@
-import pygame
 import sys
 from collections import deque
-import subprocess
 import json
 import os
-import random
+import time
 
-pygame.init()
-FONT = pygame.font.SysFont("arial", 20)
-FONT_FAINT = pygame.font.SysFont("arial", 16)
+import render_cache
+import viewport
+from map_gen import format_init_data, generate_map
+
+pygame = render_cache.lazy_import("pygame")  # chỉ nạp trong init_display()
+
+# Font, cửa sổ và hình ảnh được tạo trong init_display()
+FONT = None
+FONT_FAINT = None
+screen = None
+agent_img = None
+wumpus_img = None
+pit_img = None
+gold_img = None
 
 CELL_SIZE = 80
-MAP_MAX_SIZE = 8
+MAP_MAX_SIZE = 128
+INPUT_ROWS = 12  # số dòng nhập hiện cùng lúc; nhiều hơn thì cuộn chuột để xem
+TILE_GRID_MIN_CELL = 8  # khi thu nhỏ, chỉ kẻ lưới nếu ô >= 8 pixel
 
 # Màu
 WHITE = (255, 255, 255)
@@ -23,6 +34,7 @@ GOLD_COLOR = (255, 215, 0)
 FAINT_GRAY = (180, 180, 180)
 BLUE = (0, 0, 255)
 LIGHT_BLUE = (173, 216, 230)
+PIT_COLOR = (139, 69, 19)
 
 # Mặc định
 map_size = 4
@@ -44,79 +56,194 @@ error_message = ""
 cursor_visible = True
 cursor_timer = 0
 show_dropdown = False
-map_sizes = ["4", "5", "6", "7", "8"]
+map_sizes = [str(s) for s in (4, 5, 6, 7, 8, 16, 32, 64, 128) if s <= MAP_MAX_SIZE]
 selected_size = "4"
-
-screen = pygame.display.set_mode((1100, 800))
-pygame.display.set_caption("Wumpus Map Config")
-pygame.display.set_mode((1100, 800), pygame.SHOWN)
-
-# Load images
-agent_img = pygame.image.load("../image/agent.png")
-wumpus_img = pygame.image.load("../image/wumpus.png")
-pit_img = pygame.image.load("../image/pit.png")
-gold_img = pygame.image.load("../image/gold.png")
+input_scroll = 0
+camera = None  # viewport.Camera của bản đồ, xem map_camera()
+
+WINDOW_SIZE = (1100, 800)
+
+
+def open_window():
+    """Cửa sổ của màn hình cấu hình (wumpus_ui đổi cỡ khi chuyển cảnh)."""
+    global screen
+    screen = pygame.display.set_mode(WINDOW_SIZE)
+    pygame.display.set_caption("Wumpus Map Config")
+    pygame.display.set_mode(WINDOW_SIZE, pygame.SHOWN)
+    return screen
+
+
+def init_display():
+    """
+    Khởi tạo pygame, font, cửa sổ và hình ảnh ở lần dùng đầu tiên; import
+    module (reset_map, validate_and_update, ...) không đụng tới pygame.
+    """
+    global FONT, FONT_FAINT, agent_img, wumpus_img, pit_img, gold_img
+    if FONT is not None:
+        return
+    pygame.init()
+    FONT = pygame.font.SysFont("arial", 20)
+    FONT_FAINT = pygame.font.SysFont("arial", 16)
+    open_window()
+
+    # Load images
+    agent_img = pygame.image.load("../image/agent.png")
+    wumpus_img = pygame.image.load("../image/wumpus.png")
+    pit_img = pygame.image.load("../image/pit.png")
+    gold_img = pygame.image.load("../image/gold.png")
+
+
+def map_camera():
+    """
+    Camera của bản đồ; tạo lại (nhìn về ô xuất phát) khi đổi kích thước.
+    """
+    global camera
+    if camera is None or camera.world_dim != map_size:
+        camera = viewport.Camera.for_grid((50, 50), map_size, CELL_SIZE)
+        camera.follow([1, 1])
+    return camera
+
+
+PAN_KEYS = {"left": (-1, 0), "right": (1, 0), "up": (0, -1), "down": (0, 1)}  # pygame.key.name
+
+
+def handle_view_event(event):
+    """
+    Cuộn chuột trên bản đồ: zoom quanh ô dưới con trỏ, trên cột nhập: cuộn
+    danh sách; +/-: zoom; mũi tên: kéo khung. Khi đang nhập một ô tọa độ
+    (active_field) các phím thuộc về ô nhập, chỉ còn cuộn chuột.
+    """
+    global input_scroll
+    cam = map_camera()
+    if event.type == pygame.MOUSEWHEEL and event.y:
+        mouse_pos = pygame.mouse.get_pos()
+        if mouse_pos[0] >= 700:
+            input_scroll -= event.y
+        else:
+            cam.zoom_step(1 if event.y > 0 else -1, cam.cell_at(mouse_pos) or [1, 1])
+    elif event.type != pygame.KEYDOWN or active_field:
+        return
+    elif event.key in (pygame.K_PLUS, pygame.K_EQUALS, pygame.K_KP_PLUS):
+        cam.zoom_step(1)
+    elif event.key in (pygame.K_MINUS, pygame.K_KP_MINUS):
+        cam.zoom_step(-1)
+    elif pygame.key.name(event.key) in PAN_KEYS:
+        dcol, drow = PAN_KEYS[pygame.key.name(event.key)]
+        step = max(1, cam.cols // 4)
+        cam.pan(dcol * step, drow * step)
+
+
+def build_map_layer():
+    """
+    Lưới và tọa độ các ô đang hiện, vẽ sẵn trên một surface (gốc tại (50, 50)).
+    """
+    cam = map_camera()
+    width, height = cam.rect.size
+    layer = pygame.Surface((width, height))
+    layer.fill(WHITE)
+    pygame.draw.rect(layer, BLACK, (0, 0, width, height), 2)
+    for loc in cam.visible_cells():
+        rect = cam.cell_rect(loc).move(-cam.view.x, -cam.view.y)
+        pygame.draw.rect(layer, GRAY, rect, 1)
+        if cam.labels:
+            coord_text = FONT_FAINT.render(f"({loc[0]},{loc[1]})", True, FAINT_GRAY)
+            layer.blit(coord_text, (rect.x + 3, rect.y + 3))
+    return layer
+
+
+def build_tile_layer():
+    """
+    Ô màu cho mức thu nhỏ: mỗi ô một pixel.
+    """
+    layers = [
+        (viewport.cells_mask(map_size, pit_positions), PIT_COLOR),
+        (viewport.cells_mask(map_size, wumpus_pos), RED),
+        (viewport.cells_mask(map_size, [gold_pos]), GOLD_COLOR),
+        (viewport.cells_mask(map_size, [[1, 1]]), BLUE),
+    ]
+    return viewport.tile_surface(map_size, layers, WHITE)
 
 
 def draw_map():
-    pygame.draw.rect(
-        screen, BLACK, (50, 50, CELL_SIZE * map_size, CELL_SIZE * map_size), 2
-    )
-    for row in range(map_size):
-        for col in range(map_size):
-            rect = pygame.Rect(
-                50 + col * CELL_SIZE, 50 + row * CELL_SIZE, CELL_SIZE, CELL_SIZE
-            )
-            pygame.draw.rect(screen, GRAY, rect, 1)
-            coord_text = FONT_FAINT.render(
-                f"({col+1},{map_size-row})", True, FAINT_GRAY
-            )
-            screen.blit(coord_text, (rect.x + 3, rect.y + 3))
-
-    def draw_image(pos, img):
-        x, y = pos
-        gx, gy = x - 1, map_size - y
-        px = 50 + gx * CELL_SIZE + 5
-        py = 50 + gy * CELL_SIZE + 5
-        scaled = pygame.transform.scale(img, (CELL_SIZE - 10, CELL_SIZE - 10))
-        screen.blit(scaled, (px, py))
-
-    draw_image([1, 1], agent_img)
+    cam = map_camera()
+    if not cam.detailed:
+        key = (map_size, str(wumpus_pos), str(pit_positions), str(gold_pos))
+        cam.blit_tiles(screen, render_cache.layer("config_tiles", key, build_tile_layer))
+        if cam.zoom >= TILE_GRID_MIN_CELL:
+            cam.blit_grid_lines(screen, GRAY)
+        pygame.draw.rect(screen, BLACK, cam.rect, 2)
+        return
+
+    # Lớp lưới chỉ dựng lại khi đổi bản đồ hoặc khung nhìn
+    screen.blit(render_cache.layer("config_map", cam.state(), build_map_layer), cam.rect.topleft)
+
+    inset = max(1, cam.zoom // 16)
+
+    def draw_image(pos, name, img):
+        if not cam.is_visible(pos):
+            return
+        rect = cam.cell_rect(pos)
+        size = (cam.zoom - 2 * inset, cam.zoom - 2 * inset)
+        # Tên riêng: wumpus_ui cũng lưu "wumpus", "pit", ... trong cùng bộ đệm
+        scaled = render_cache.sprite(f"config_{name}", img, size)
+        screen.blit(scaled, (rect.x + inset, rect.y + inset))
+
+    draw_image([1, 1], "agent", agent_img)
     for w in wumpus_pos:
-        draw_image(w, wumpus_img)
+        draw_image(w, "wumpus", wumpus_img)
     for p in pit_positions:
-        draw_image(p, pit_img)
-    draw_image(gold_pos, gold_img)
+        draw_image(p, "pit", pit_img)
+    draw_image(gold_pos, "gold", gold_img)
+
+
+def input_rows():
+    """
+    Các dòng nhập (key) đang hiện, theo thứ tự vẽ từ trên xuống.
+    """
+    global input_scroll
+    keys = [
+        key
+        for key in sorted(input_fields.keys(), key=lambda x: (x.split("t")[0], x))
+        if isinstance(input_fields[key], dict)
+    ]
+    input_scroll = max(0, min(input_scroll, len(keys) - INPUT_ROWS))
+    return keys[input_scroll:input_scroll + INPUT_ROWS]
+
+
+def input_rect(idx, j):
+    return pygame.Rect(700 + 110 + j * 60, 50 + idx * 40, 50, 25)
+
+
+def size_dropdown_rect():
+    dropdown_y = 50 + len(input_rows()) * 40 + 20  # Position below other inputs
+    return pygame.Rect(700 + 110, dropdown_y, 50, 25)
 
 
 def draw_inputs():
     x0, y0 = 700, 50
-    idx = 0
 
     # Draw other input fields first
-    for key in sorted(input_fields.keys(), key=lambda x: (x.split("t")[0], x)):
-        if isinstance(input_fields[key], dict):
-            key_text = FONT.render(f"{key}:", True, BLACK)
-            screen.blit(key_text, (x0, y0 + idx * 40))
-            for j, subkey in enumerate(["X", "Y"]):
-                cursor = "|" if active_field == (key, subkey) and cursor_visible else ""
-                val_text = FONT.render(input_fields[key][subkey] + cursor, True, BLACK)
-                rect = pygame.Rect(x0 + 110 + j * 60, y0 + idx * 40, 50, 25)
-                border_color = RED if active_field == (key, subkey) else BLACK
-                if key in invalid_fields:
-                    border_color = RED
-                pygame.draw.rect(screen, border_color, rect, 2)
-
-                screen.blit(val_text, (rect.x + 5, rect.y + 3))
-            idx += 1
+    for idx, key in enumerate(input_rows()):
+        key_text = FONT.render(f"{key}:", True, BLACK)
+        screen.blit(key_text, (x0, y0 + idx * 40))
+        for j, subkey in enumerate(["X", "Y"]):
+            cursor = "|" if active_field == (key, subkey) and cursor_visible else ""
+            val_text = FONT.render(input_fields[key][subkey] + cursor, True, BLACK)
+            rect = input_rect(idx, j)
+            border_color = RED if active_field == (key, subkey) else BLACK
+            if key in invalid_fields:
+                border_color = RED
+            pygame.draw.rect(screen, border_color, rect, 2)
+
+            screen.blit(val_text, (rect.x + 5, rect.y + 3))
 
     # Draw map size dropdown at the bottom
-    dropdown_y = 50 + idx * 40 + 20  # Position below other inputs
+    dropdown_rect = size_dropdown_rect()
+    dropdown_y = dropdown_rect.y
     size_text = FONT.render("Map Size:", True, BLACK)
     screen.blit(size_text, (x0, dropdown_y))
 
     # Draw dropdown box
-    dropdown_rect = pygame.Rect(x0 + 110, dropdown_y, 50, 25)
     pygame.draw.rect(screen, LIGHT_BLUE if show_dropdown else WHITE, dropdown_rect)
     pygame.draw.rect(screen, BLUE, dropdown_rect, 2)
 
@@ -142,94 +269,19 @@ def draw_inputs():
             screen.blit(option_text, (option_rect.x + 5, option_rect.y + 3))
 
 
-def get_wumpus_pit_count(size):
-    return {4: (1, 2), 5: (2, 3), 6: (3, 4), 7: (4, 5), 8: (5, 6)}.get(size, (1, 2))
-
-
-def is_near(pos1, pos2):
-    return (abs(pos1[0] - pos2[0]) == 1 and pos1[1] == pos2[1]) or (
-        abs(pos1[1] - pos2[1]) == 1 and pos1[0] == pos2[0]
-    )
-
-
-def is_duplicate_or_near(pos, positions):
-    return any(p == pos or is_near(p, pos) for p in positions)
-
-
-def euclidean_distance(p1, p2):
-    return ((p1[0] - p2[0]) ** 2 + (p1[1] - p2[1]) ** 2) ** 0.5
-
-
-def generate_new_positions(
-    count, existing, blocked, size, min_distance_from=None, min_dist=0
-):
-    positions = []
-    while len(positions) < count:
-        new_pos = [random.randint(1, size), random.randint(1, size)]
-        if (
-            new_pos == [1, 1]
-            or new_pos == [1, 2]
-            or new_pos == [2, 1]
-            or new_pos == [2, 2]
-            or new_pos == [1, 3]
-            or new_pos == [3, 1]
-        ):
-            continue
-        if is_duplicate_or_near(new_pos, existing + blocked + positions):
-            continue
-        if min_distance_from:
-            if any(
-                euclidean_distance(new_pos, p) < min_dist for p in min_distance_from
-            ):
-                continue
-        positions.append(new_pos)
-    return positions
-
-
 def reset_map(ms):
     global map_size, input_fields, wumpus_pos, pit_positions, gold_pos
 
     input_fields.clear()
     map_size = ms
 
-    req_w, req_p = get_wumpus_pit_count(ms)
-
-    player_start = [1, 1]
-
-    # Sinh vàng: cách người chơi đúng map_size - 1
-    while True:
-        g = [random.randint(1, ms), random.randint(1, ms)]
-        if g != player_start and euclidean_distance(g, player_start) == ms - 1:
-            gold_pos = g
-            input_fields["Gold"] = {"X": str(g[0]), "Y": str(g[1])}
-            break
-
-    blocked = [player_start, gold_pos]
-
-    # Sinh wumpus: từng con phải cách xa các con trước đó >= 2
-    wumpus_pos = []
-    for i in range(req_w):
-        new_w = generate_new_positions(
-            1, [], blocked + wumpus_pos, ms, min_distance_from=wumpus_pos, min_dist=2
-        )[0]
-        wumpus_pos.append(new_w)
-        input_fields[f"Wumpus{i+1}"] = {"X": str(new_w[0]), "Y": str(new_w[1])}
-        blocked.append(new_w)
-
-    # Sinh pit: cũng cách xa pit khác >= 2
-    pit_positions = []
-    for i in range(req_p):
-        new_p = generate_new_positions(
-            1,
-            [],
-            blocked + pit_positions,
-            ms,
-            min_distance_from=pit_positions,
-            min_dist=2,
-        )[0]
-        pit_positions.append(new_p)
-        input_fields[f"Pit{i+1}"] = {"X": str(new_p[0]), "Y": str(new_p[1])}
-        blocked.append(new_p)
+    _, wumpus_pos, pit_positions, gold_pos = generate_map(ms)
+
+    input_fields["Gold"] = {"X": str(gold_pos[0]), "Y": str(gold_pos[1])}
+    for i, w in enumerate(wumpus_pos):
+        input_fields[f"Wumpus{i+1}"] = {"X": str(w[0]), "Y": str(w[1])}
+    for i, p in enumerate(pit_positions):
+        input_fields[f"Pit{i+1}"] = {"X": str(p[0]), "Y": str(p[1])}
 
 
 def validate_and_update():
@@ -281,46 +333,113 @@ def draw_error():
         screen.blit(err_text, (50, 20))
 
 
+def button_rects():
+    # Move buttons to left side below the map
+    buttons_y = map_camera().view.bottom + 20
+    update_btn = pygame.Rect(50, buttons_y, 120, 40)
+    play_btn = pygame.Rect(200, buttons_y, 120, 40)
+    return update_btn, play_btn
+
+
+def draw_frame():
+    screen.fill(WHITE)
+    draw_map()
+    draw_inputs()
+    draw_error()
+
+    update_btn, play_btn = button_rects()
+    pygame.draw.rect(screen, GREEN, update_btn)
+    pygame.draw.rect(screen, RED, play_btn)
+    screen.blit(
+        FONT.render("UPDATE", True, BLACK), (update_btn.x + 10, update_btn.y + 8)
+    )
+    screen.blit(FONT.render("PLAY", True, BLACK), (play_btn.x + 30, play_btn.y + 8))
+
+
+def active_field_rect():
+    """Ô nhập đang được chọn (vùng duy nhất đổi khi con trỏ nhấp nháy)."""
+    for idx, key in enumerate(input_rows()):
+        for j, subkey in enumerate(["X", "Y"]):
+            if active_field == (key, subkey):
+                return input_rect(idx, j)
+    return None
+
+
+def simulation_scene():
+    """
+    Màn hình mô phỏng (wumpus_ui) chạy trong cùng tiến trình, dùng chung cửa
+    sổ, font và bộ đệm hình. Lần gọi đầu mới import (tải hình ảnh).
+    """
+    import wumpus_ui
+
+    return wumpus_ui
+
+
+def start_simulation():
+    """
+    Chuyển sang màn hình mô phỏng với bản đồ đang cấu hình. init_data.txt
+    vẫn được ghi để agent chạy bằng swipl -g start (không có worker) đọc.
+    """
+    import asyncio
+
+    play_pressed = time.perf_counter()
+    world_map = (map_size, wumpus_pos, pit_positions, gold_pos)
+    init_data_path = os.path.join(os.path.dirname(__file__), "init_data.txt")
+    with open(init_data_path, "w", encoding="utf-8") as f:
+        f.write(format_init_data(world_map))
+    asyncio.run(simulation_scene().main(world_map, play_pressed))
+
+
 def main():
     global active_field, cursor_visible, cursor_timer, show_dropdown, selected_size, map_size
+    init_display()
     clock = pygame.time.Clock()
     running = True
+    needs_redraw = True
+    preloaded = False
     while running:
-        screen.fill(WHITE)
-        draw_map()
-        draw_inputs()
-        draw_error()
-
-        # Move buttons to left side below the map
-        buttons_y = 50 + CELL_SIZE * map_size + 20
-        update_btn = pygame.Rect(50, buttons_y, 120, 40)
-        play_btn = pygame.Rect(200, buttons_y, 120, 40)
-        pygame.draw.rect(screen, GREEN, update_btn)
-        pygame.draw.rect(screen, RED, play_btn)
-        screen.blit(
-            FONT.render("UPDATE", True, BLACK), (update_btn.x + 10, update_btn.y + 8)
+        update_btn, play_btn = button_rects()
+        if needs_redraw:
+            draw_frame()
+            pygame.display.flip()
+            needs_redraw = False
+        if not preloaded:
+            # Nạp sẵn màn hình mô phỏng (font, hình) sau khung hình đầu
+            simulation_scene().init_display()
+            preloaded = True
+
+        # Chỉ thức dậy khi có sự kiện hoặc tới lúc con trỏ nhấp nháy
+        events = render_cache.wait_for_events(
+            500 - cursor_timer if active_field else None
         )
-        screen.blit(FONT.render("PLAY", True, BLACK), (play_btn.x + 30, play_btn.y + 8))
-
-        pygame.display.flip()
-
-        cursor_timer += clock.get_time()
+        cursor_timer += clock.tick()
         if cursor_timer >= 500:
             cursor_visible = not cursor_visible
             cursor_timer = 0
-
-        for event in pygame.event.get():
+            field_rect = active_field_rect()
+            if field_rect:
+                draw_frame()
+                pygame.display.update(field_rect)
+
+        for event in events:
+            if event.type in (
+                pygame.QUIT,
+                pygame.MOUSEBUTTONDOWN,
+                pygame.KEYDOWN,
+                pygame.MOUSEWHEEL,
+            ):
+                needs_redraw = True
+            handle_view_event(event)
             if event.type == pygame.QUIT:
                 running = False
                 break
-            elif event.type == pygame.MOUSEBUTTONDOWN:
-                x0, y0 = 700, 50
+            elif event.type == pygame.MOUSEBUTTONDOWN and event.button not in (4, 5):
+                x0 = 700
 
                 # Check if clicked on map size dropdown
-                # Calculate dropdown position based on number of input fields
-                num_fields = len(input_fields)
-                dropdown_y = 50 + num_fields * 40 + 20
-                dropdown_rect = pygame.Rect(x0 + 110, dropdown_y, 50, 25)
+                # (position depends on the number of visible input rows)
+                dropdown_rect = size_dropdown_rect()
+                dropdown_y = dropdown_rect.y
 
                 if dropdown_rect.collidepoint(event.pos):
                     show_dropdown = not show_dropdown
@@ -347,37 +466,15 @@ def main():
                     validate_and_update()
                 elif play_btn.collidepoint(event.pos):
                     if validate_and_update():
-                        init_data_path = os.path.join(
-                            os.path.dirname(__file__), "init_data.txt"
-                        )
-                        with open(init_data_path, "w", encoding="utf-8") as f:
-                            f.write(f"{map_size}.\n")
-                            f.write(f"{wumpus_pos}.\n")
-                            f.write(f"{pit_positions}.\n")
-                            f.write(f"{gold_pos}.\n")
-                        args = [
-                            "python",
-                            os.path.join(os.path.dirname(__file__), "wumpus_ui.py"),
-                            str(map_size),
-                            str(wumpus_pos),
-                            str(pit_positions),
-                            str(gold_pos),
-                        ]
-                        subprocess.Popen(args)
+                        start_simulation()
                         pygame.quit()
                         sys.exit()
 
                 # Check other input fields
-                idx = 0
-                for key in sorted(
-                    input_fields.keys(), key=lambda x: (x.split("t")[0], x)
-                ):
-                    if isinstance(input_fields[key], dict):
-                        for j, subkey in enumerate(["X", "Y"]):
-                            rect = pygame.Rect(x0 + 110 + j * 60, y0 + idx * 40, 50, 25)
-                            if rect.collidepoint(event.pos):
-                                active_field = (key, subkey)
-                        idx += 1
+                for idx, key in enumerate(input_rows()):
+                    for j, subkey in enumerate(["X", "Y"]):
+                        if input_rect(idx, j).collidepoint(event.pos):
+                            active_field = (key, subkey)
             elif event.type == pygame.KEYDOWN and active_field:
                 key, subkey = active_field
                 if event.key == pygame.K_BACKSPACE:
@@ -387,8 +484,6 @@ def main():
                 elif event.unicode.isdigit():
                     input_fields[key][subkey] += event.unicode
 
-        clock.tick(30)
-
     pygame.quit()
     sys.exit()
 
@@ -0,0 +1,86 @@
+"""
+Trạng thái KB của agent theo ô: mỗi loại (visited, safe, known/maybe/no
+wumpus, known/maybe/no pit) là một bitmask int, bit (y - 1) * size + (x - 1) ứng với ô [x, y].
+
+Kiểm tra thuộc về là O(1); hợp / giao / hiệu giữa các loại là phép bit trên
+int, và delta giữa hai bước chỉ là XOR.
+"""
+
+KB_KEYS = (
+    "safe_locations",
+    "known_wumpus_locations",
+    "maybe_wumpus_locations",
+    "no_wumpus_locations",
+    "known_pit_locations",
+    "maybe_pit_locations",
+    "no_pit_locations",
+    "visited_locations",
+)
+
+
+class KnowledgeGrid:
+    """
+    Các tập ô của KB trên bản đồ size x size.
+    """
+
+    __slots__ = ("size", "masks")
+
+    def __init__(self, size, masks=None):
+        self.size = size
+        self.masks = dict(masks) if masks else dict.fromkeys(KB_KEYS, 0)
+
+    def bit(self, loc):
+        return 1 << ((loc[1] - 1) * self.size + (loc[0] - 1))
+
+    def has(self, key, loc):
+        return bool(self.masks[key] & self.bit(loc))
+
+    def add(self, key, loc):
+        """Thêm ô; True nếu ô chưa có trong tập."""
+        bit = self.bit(loc)
+        if self.masks[key] & bit:
+            return False
+        self.masks[key] |= bit
+        return True
+
+    def discard(self, key, loc):
+        self.masks[key] &= ~self.bit(loc)
+
+    def clear(self, key):
+        self.masks[key] = 0
+
+    def union(self, *keys):
+        mask = 0
+        for key in keys:
+            mask |= self.masks[key]
+        return mask
+
+    def count(self, key):
+        return bin(self.masks[key]).count("1")
+
+    def cells(self, key):
+        """Các ô [x, y] của tập, theo thứ tự bit."""
+        return self.mask_cells(self.masks[key])
+
+    def mask_cells(self, mask):
+        cells = []
+        while mask:
+            low = mask & -mask
+            index = low.bit_length() - 1
+            cells.append([index % self.size + 1, index // self.size + 1])
+            mask ^= low
+        return cells
+
+    def copy(self):
+        return KnowledgeGrid(self.size, self.masks)
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, KnowledgeGrid)
+            and self.size == other.size
+            and self.masks == other.masks
+        )
+
+    def __repr__(self):
+        counts = ", ".join(f"{key}={self.count(key)}" for key in KB_KEYS)
+        return f"KnowledgeGrid({self.size}, {counts})"
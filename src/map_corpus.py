@@ -0,0 +1,321 @@
+"""
+Kho bản đồ trên đĩa thay cho một bản đồ duy nhất trong init_data.txt.
+
+Một kho là một thư mục gồm các mảng NumPy (.npy, mở bằng mmap nên kho hàng
+triệu bản đồ không phải đọc hết vào RAM):
+
+- index.npy: mỗi bản đồ một bản ghi INDEX_DTYPE (luồng, seed, kích thước,
+  số wumpus / pit, vàng, vị trí trong cells.npy, mật độ), sắp theo
+  (kích thước, mật độ, luồng) để lọc theo kích thước chỉ là một đoạn liền;
+- cells.npy: toạ độ Prolog (x, y) của mọi wumpus rồi mọi pit, bản đồ nối tiếp
+  nhau;
+- seed_order.npy: thứ tự index theo seed, để tìm bản đồ theo seed;
+- meta.json: seed gốc, các kích thước / mật độ và số bản đồ mỗi loại.
+
+Mỗi bản đồ có luồng ngẫu nhiên riêng: seed = SeedSequence(seed gốc,
+spawn_key=(kích thước, mật độ, luồng)), rồi map_gen.generate_map với
+random.Random(seed). Bản đồ chỉ phụ thuộc vào khoá của nó nên sinh song
+song với bao nhiêu tiến trình cũng ra cùng một kho. tournament.seeded_map
+sinh lại đúng bản đồ từ seed, kích thước và số wumpus / pit ghi trong index
+(counts=(wumpus, pits)); chỉ với densities=(None,) thì seed và kích thước là
+đủ, vì số wumpus / pit khi đó là get_wumpus_pit_count. Bản đồ bế tắc sau MAP_RESTARTS lần thử (mật
+độ quá cao) bị bỏ qua và được đếm trong meta.json.
+
+    python map_corpus.py build corpus --sizes 4 5 6 7 8 --count 100000 --seed 0
+    python map_corpus.py info corpus
+    python map_corpus.py export corpus 12345 init_data.txt
+"""
+import argparse
+import json
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from map_gen import PIT_DENSITY, WUMPUS_DENSITY, format_init_data, generate_map
+from world_engine import BatchWorld
+
+INDEX_NAME = "index.npy"
+CELLS_NAME = "cells.npy"
+SEED_ORDER_NAME = "seed_order.npy"
+META_NAME = "meta.json"
+CORPUS_VERSION = 1
+BUILD_CHUNK = 20000  # số bản đồ mỗi phần việc giao cho tiến trình con
+
+INDEX_DTYPE = np.dtype(
+    [
+        ("stream", "<u4"),  # số thứ tự trong luồng (kích thước, mật độ)
+        ("seed", "<u8"),
+        ("size", "<u2"),
+        ("wumpus", "<u2"),
+        ("pits", "<u2"),
+        ("gold", "<u2", (2,)),
+        ("offset", "<u8"),  # dòng đầu tiên của bản đồ trong cells.npy
+        ("density", "<f4"),  # (wumpus + pit) / số ô
+    ]
+)
+
+
+def map_seed(root_seed, size, density_id, stream):
+    """Seed 64 bit của một bản đồ, độc lập với mọi bản đồ khác."""
+    sequence = np.random.SeedSequence(root_seed, spawn_key=(size, density_id, stream))
+    return int(sequence.generate_state(1, np.uint64)[0])
+
+
+def density_counts(size, density):
+    """
+    (số wumpus, số pit) khi density phần ô có nguy hiểm, chia theo tỉ lệ
+    WUMPUS_DENSITY : PIT_DENSITY của map_gen; None: get_wumpus_pit_count.
+    """
+    if density is None:
+        return None
+    hazards = density * size * size
+    wumpus = max(1, round(hazards * WUMPUS_DENSITY / (WUMPUS_DENSITY + PIT_DENSITY)))
+    return wumpus, max(1, round(hazards) - wumpus)
+
+
+def build_chunk(task):
+    """
+    Chạy trong tiến trình con: sinh các bản đồ luồng [start, stop) của một
+    (kích thước, mật độ). Trả về (bản ghi index, toạ độ, số bản đồ bế tắc).
+    """
+    root_seed, size, density_id, density, start, stop = task
+    counts = density_counts(size, density)
+    records = np.zeros(stop - start, dtype=INDEX_DTYPE)
+    cells = []
+    kept = 0
+    for stream in range(start, stop):
+        seed = map_seed(root_seed, size, density_id, stream)
+        try:
+            _, wumpus, pits, gold = generate_map(size, random.Random(seed), counts=counts)
+        except RuntimeError:
+            continue
+        record = records[kept]
+        record["stream"] = stream
+        record["seed"] = seed
+        record["size"] = size
+        record["wumpus"] = len(wumpus)
+        record["pits"] = len(pits)
+        record["gold"] = gold
+        record["density"] = (len(wumpus) + len(pits)) / (size * size)
+        cells.extend(wumpus)
+        cells.extend(pits)
+        kept += 1
+    cells = np.array(cells, dtype=np.uint16).reshape(-1, 2)
+    return records[:kept], cells, (stop - start) - kept
+
+
+def build_corpus(path, sizes, count, root_seed=0, densities=(None,), workers=None):
+    """
+    Sinh count bản đồ cho mỗi (kích thước, mật độ) rồi ghi kho vào thư mục
+    path. Trả về số bản đồ bế tắc bị bỏ qua.
+    """
+    sizes = sorted(set(sizes))  # size_range tìm nhị phân trên kích thước
+    tasks = []
+    for size in sizes:
+        for density_id, density in enumerate(densities):
+            for start in range(0, count, BUILD_CHUNK):
+                stop = min(count, start + BUILD_CHUNK)
+                tasks.append((root_seed, size, density_id, density, start, stop))
+
+    parts, skipped = [], 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for records, cells, failed in pool.map(build_chunk, tasks):
+            parts.append((records, cells))
+            skipped += failed
+
+    # Nối các phần theo thứ tự task = (kích thước, mật độ, luồng)
+    offset = 0
+    for records, cells in parts:
+        counts = records["wumpus"].astype(np.uint64) + records["pits"]
+        records["offset"] = offset + np.concatenate(([0], np.cumsum(counts)[:-1]))
+        offset += len(cells)
+    index = np.concatenate([records for records, _ in parts])
+    cells = np.concatenate([cells for _, cells in parts])
+
+    os.makedirs(path, exist_ok=True)
+    np.save(os.path.join(path, INDEX_NAME), index)
+    np.save(os.path.join(path, CELLS_NAME), cells)
+    np.save(os.path.join(path, SEED_ORDER_NAME), np.argsort(index["seed"], kind="stable"))
+    meta = {
+        "version": CORPUS_VERSION,
+        "root_seed": root_seed,
+        "sizes": list(sizes),
+        "densities": list(densities),
+        "count": count,
+        "maps": len(index),
+        "skipped": skipped,
+    }
+    with open(os.path.join(path, META_NAME), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    return skipped
+
+
+class MapCorpus:
+    """
+    Kho bản đồ đã ghi bởi build_corpus, mở bằng mmap (chỉ đọc). Chỉ số bản
+    đồ là vị trí trong index.npy; select() trả về mảng chỉ số để truyền cho
+    maps() (agent Prolog) hoặc batch_world() (world_engine, oracle).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, META_NAME), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        if self.meta.get("version") != CORPUS_VERSION:
+            raise ValueError(f"Kho bản đồ {path} có phiên bản {self.meta.get('version')}")
+        self.index = np.load(os.path.join(path, INDEX_NAME), mmap_mode="r")
+        self.cells = np.load(os.path.join(path, CELLS_NAME), mmap_mode="r")
+        self.seed_order = np.load(os.path.join(path, SEED_ORDER_NAME), mmap_mode="r")
+
+    def __len__(self):
+        return len(self.index)
+
+    def size_range(self, size):
+        """Đoạn [start, stop) của các bản đồ kích thước size (index sắp theo kích thước)."""
+        sizes = self.index["size"]
+        return (
+            int(np.searchsorted(sizes, size, side="left")),
+            int(np.searchsorted(sizes, size, side="right")),
+        )
+
+    def find_seed(self, seed):
+        """Chỉ số của bản đồ có seed, None nếu không có."""
+        seeds = self.index["seed"]
+        k = int(np.searchsorted(seeds[self.seed_order], np.uint64(seed)))
+        if k < len(self.seed_order) and seeds[self.seed_order[k]] == seed:
+            return int(self.seed_order[k])
+        return None
+
+    def select(self, size=None, min_density=None, max_density=None, limit=None):
+        """
+        Chỉ số các bản đồ thoả bộ lọc, theo thứ tự trong kho; limit: lấy tối
+        đa bấy nhiêu bản đồ đầu tiên.
+        """
+        start, stop = self.size_range(size) if size is not None else (0, len(self))
+        chosen = np.arange(start, stop)
+        if min_density is not None or max_density is not None:
+            density = self.index["density"][start:stop]
+            keep = np.ones(stop - start, dtype=bool)
+            if min_density is not None:
+                keep &= density >= min_density
+            if max_density is not None:
+                keep &= density <= max_density
+            chosen = chosen[keep]
+        return chosen[:limit] if limit is not None else chosen
+
+    def _items(self, records):
+        """
+        Toạ độ wumpus / pit của các bản ghi: (chủ, toạ độ, là wumpus), mỗi
+        vật một dòng, chủ là vị trí bản ghi trong records.
+        """
+        counts = records["wumpus"].astype(np.int64) + records["pits"]
+        total = int(counts.sum())
+        owner = np.repeat(np.arange(len(records)), counts)
+        first = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        rank = np.arange(total) - np.repeat(first, counts)  # thứ tự trong bản đồ
+        rows = np.repeat(records["offset"].astype(np.int64), counts) + rank
+        return owner, np.asarray(self.cells[rows]), rank < np.repeat(records["wumpus"], counts)
+
+    def maps(self, indices):
+        """
+        Các bản đồ (world_dim, wumpus_list, pit_list, gold) như init_data.txt,
+        dùng cho prolog_runner / PrologWorkerPool / BatchWorld(maps).
+        """
+        records = self.index[np.asarray(indices)]
+        _, cells, _ = self._items(records)
+        cells = cells.tolist()
+        result = []
+        first = 0
+        for record in records:
+            wumpus_end = first + int(record["wumpus"])
+            pits_end = wumpus_end + int(record["pits"])
+            result.append(
+                (
+                    int(record["size"]),
+                    cells[first:wumpus_end],
+                    cells[wumpus_end:pits_end],
+                    record["gold"].tolist(),
+                )
+            )
+            first = pits_end
+        return result
+
+    def batch_world(self, indices, **kwargs):
+        """BatchWorld của các bản đồ, dựng thẳng từ mảng."""
+        records = self.index[np.asarray(indices)]
+        n = len(records)
+        side = int(records["size"].max()) if n else 0
+        wumpus = np.zeros((n, side, side), dtype=bool)
+        pit = np.zeros((n, side, side), dtype=bool)
+        owner, cells, is_wumpus = self._items(records)
+        x, y = cells[:, 0].astype(np.intp) - 1, cells[:, 1].astype(np.intp) - 1
+        wumpus[owner[is_wumpus], x[is_wumpus], y[is_wumpus]] = True
+        pit[owner[~is_wumpus], x[~is_wumpus], y[~is_wumpus]] = True
+        return BatchWorld.from_grids(records["size"], wumpus, pit, records["gold"], **kwargs)
+
+
+def print_info(corpus):
+    meta = corpus.meta
+    print(f"Kho {corpus.path}: {len(corpus)} bản đồ, seed gốc {meta['root_seed']}")
+    if meta["skipped"]:
+        print(f"  {meta['skipped']} bản đồ bế tắc khi sinh đã bị bỏ qua")
+    print(f"{'kích thước':<12}{'mật độ':>10}{'bản đồ':>12}")
+    index = corpus.index
+    for size in np.unique(index["size"]):
+        start, stop = corpus.size_range(size)
+        densities, counts = np.unique(index["density"][start:stop], return_counts=True)
+        for density, count in zip(densities, counts):
+            print(f"{f'{size}x{size}':<12}{density:>10.3f}{count:>12}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="sinh kho bản đồ")
+    build.add_argument("path")
+    build.add_argument("--sizes", type=int, nargs="+", default=[4, 5, 6, 7, 8])
+    build.add_argument("--count", type=int, default=10000, help="số bản đồ mỗi kích thước / mật độ")
+    build.add_argument("--seed", type=int, default=0)
+    build.add_argument(
+        "--densities",
+        type=float,
+        nargs="+",
+        help="phần ô có wumpus / pit; mặc định số lượng của map_gen",
+    )
+    build.add_argument("--workers", type=int, default=os.cpu_count())
+    info = commands.add_parser("info", help="thống kê kho theo kích thước và mật độ")
+    info.add_argument("path")
+    export = commands.add_parser("export", help="ghi một bản đồ ra init_data.txt")
+    export.add_argument("path")
+    export.add_argument("seed", type=int)
+    export.add_argument("out", nargs="?", default="init_data.txt")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        started = time.perf_counter()
+        skipped = build_corpus(
+            args.path, args.sizes, args.count, args.seed, args.densities or (None,), args.workers
+        )
+        elapsed = time.perf_counter() - started
+        corpus = MapCorpus(args.path)
+        print(
+            f"Đã ghi {len(corpus)} bản đồ vào {args.path} trong {elapsed:.2f}s "
+            f"({len(corpus) / elapsed:.0f} bản đồ/s, bỏ qua {skipped})"
+        )
+    elif args.command == "info":
+        print_info(MapCorpus(args.path))
+    else:
+        corpus = MapCorpus(args.path)
+        found = corpus.find_seed(args.seed)
+        if found is None:
+            raise SystemExit(f"Không có bản đồ seed {args.seed} trong {args.path}")
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(format_init_data(corpus.maps([found])[0]))
+        print(f"Đã ghi bản đồ seed {args.seed} vào {args.out}")
+
+
+if __name__ == "__main__":
+    main()
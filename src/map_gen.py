@@ -0,0 +1,208 @@
+"""
+Sinh bản đồ Wumpus World theo luật của config.reset_map:
+
+- vàng cách ô xuất phát [1, 1] đúng map_size - 1 (khoảng cách Euclid);
+- không đặt gì ở [1, 1], [1, 2], [2, 1], [2, 2], [1, 3], [3, 1];
+- wumpus / pit không trùng và không kề (4 hướng) với ô xuất phát, vàng và
+  những thứ đã đặt; hai wumpus (hai pit) cách nhau >= 2.
+
+Thay vì thử ngẫu nhiên rồi quét lại danh sách ở mỗi lần thử, mỗi loại giữ
+một chỉ mục các ô còn hợp lệ; đặt xong một vật thì xoá các ô lân cận của nó
+khỏi chỉ mục. Hết ô hợp lệ nghĩa là ràng buộc không thoả được (RuntimeError),
+không quay vòng mãi.
+"""
+import random
+
+MAP_COUNTS = {4: (1, 2), 5: (2, 3), 6: (3, 4), 7: (4, 5), 8: (5, 6)}
+# Bản đồ ngoài bảng trên: số wumpus / pit theo mật độ của bản đồ 8x8
+WUMPUS_DENSITY = 5 / 64
+PIT_DENSITY = 6 / 64
+START_CELLS = ([1, 1], [1, 2], [2, 1], [2, 2], [1, 3], [3, 1])
+MAP_RESTARTS = 100  # số lần sinh lại cả bản đồ khi đặt ngẫu nhiên bị bế tắc
+CHOICE_MISSES = 8  # số lần bốc trượt liên tiếp trước khi dồn danh sách ứng viên
+
+_layouts = {}
+
+
+def get_wumpus_pit_count(size):
+    if size in MAP_COUNTS:
+        return MAP_COUNTS[size]
+    cells = size * size
+    return max(1, round(WUMPUS_DENSITY * cells)), max(1, round(PIT_DENSITY * cells))
+
+
+def is_near(pos1, pos2):
+    return (abs(pos1[0] - pos2[0]) == 1 and pos1[1] == pos2[1]) or (
+        abs(pos1[1] - pos2[1]) == 1 and pos1[0] == pos2[0]
+    )
+
+
+def is_duplicate_or_near(pos, positions):
+    return any(p == pos or is_near(p, pos) for p in positions)
+
+
+def euclidean_distance(p1, p2):
+    return ((p1[0] - p2[0]) ** 2 + (p1[1] - p2[1]) ** 2) ** 0.5
+
+
+class CellPool:
+    """
+    Tập ô còn hợp lệ: ô bị loại chỉ được đánh dấu trong blocked (bytearray
+    theo chỉ số ô, người gọi ghi trực tiếp); choice()
+    bốc ngẫu nhiên trong danh sách ứng viên và bỏ qua ô đã bị đánh dấu,
+    khi bốc trượt quá nhiều thì dồn danh sách lại (hết ứng viên: None).
+    """
+
+    def __init__(self, cells, blocked):
+        self.cells = cells
+        self.blocked = blocked
+
+    def choice(self, rng):
+        cells, blocked = self.cells, self.blocked
+        while cells:
+            for _ in range(CHOICE_MISSES):
+                cell = cells[int(rng.random() * len(cells))]
+                if not blocked[cell]:
+                    return cell
+            cells = self.cells = [c for c in cells if not blocked[c]]
+        return None
+
+
+def map_layout(size):
+    """
+    Dữ liệu dùng lại cho mọi bản đồ cùng kích thước: ô có thể đặt wumpus/pit,
+    ô có thể đặt vàng, và lân cận 4 hướng / 8 hướng của từng ô (ô đánh số
+    (y - 1) * size + (x - 1) như kb_grid).
+    """
+    layout = _layouts.get(size)
+    if layout is not None:
+        return layout
+    cells = [(x, y) for y in range(1, size + 1) for x in range(1, size + 1)]
+    cell_id = {cell: i for i, cell in enumerate(cells)}
+
+    def around(cell, diagonal):
+        x, y = cell
+        result = [cell_id[cell]]
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                if (dx or dy) and (diagonal or not (dx and dy)) and (x + dx, y + dy) in cell_id:
+                    result.append(cell_id[(x + dx, y + dy)])
+        return result
+
+    start = {tuple(c) for c in START_CELLS}
+    layout = {
+        "free": [cell_id[c] for c in cells if c not in start],
+        "blocked": bytearray(c in start for c in cells),
+        "gold": [
+            cell_id[c]
+            for c in cells
+            if c != (1, 1) and (c[0] - 1) ** 2 + (c[1] - 1) ** 2 == (size - 1) ** 2
+        ],
+        "near": [around(c, False) for c in cells],  # chính ô đó + 4 hướng
+        "around": [around(c, True) for c in cells],  # chính ô đó + 8 hướng (Euclid < 2)
+        "cells": [list(c) for c in cells],
+    }
+    _layouts[size] = layout
+    return layout
+
+
+def place_items(layout, rng, req_w, req_p):
+    """
+    Một lần đặt vàng, wumpus, pit; None nếu bế tắc giữa chừng.
+    """
+    near, around = layout["near"], layout["around"]
+    gold = rng.choice(layout["gold"])
+    wumpus_blocked = bytearray(layout["blocked"])
+    for cell in near[gold] + near[0]:
+        wumpus_blocked[cell] = 1
+    pit_blocked = bytearray(wumpus_blocked)
+    wumpus_pool = CellPool(layout["free"], wumpus_blocked)
+    pit_pool = CellPool(layout["free"], pit_blocked)
+
+    wumpus = []
+    for _ in range(req_w):
+        w = wumpus_pool.choice(rng)
+        if w is None:
+            return None
+        wumpus.append(w)
+        for cell in around[w]:
+            wumpus_blocked[cell] = 1
+        for cell in near[w]:
+            pit_blocked[cell] = 1
+
+    pits = []
+    for _ in range(req_p):
+        p = pit_pool.choice(rng)
+        if p is None:
+            return None
+        pits.append(p)
+        for cell in around[p]:
+            pit_blocked[cell] = 1
+    return gold, wumpus, pits
+
+
+def generate_map(ms, rng=random, max_tries=MAP_RESTARTS, counts=None):
+    """
+    Sinh một bản đồ ngẫu nhiên kích thước ms theo luật của config.reset_map.
+    Trả về (ms, wumpus_pos, pit_positions, gold_pos) như init_data.txt.
+    Truyền rng=random.Random(seed) để sinh lại đúng bản đồ; counts =
+    (số wumpus, số pit) thay cho get_wumpus_pit_count(ms). Đặt ngẫu nhiên bị
+    bế tắc thì sinh lại từ đầu, tối đa max_tries lần, rồi RuntimeError.
+    """
+    req_w, req_p = counts or get_wumpus_pit_count(ms)
+    layout = map_layout(ms)
+    if not layout["gold"]:
+        raise RuntimeError(f"Bản đồ {ms}x{ms} không có ô nào đặt được vàng")
+    free = len(layout["free"])
+    if req_w > free or req_p > free:
+        raise RuntimeError(
+            f"Không đủ ô cho {req_w} wumpus và {req_p} pit trên bản đồ {ms}x{ms}"
+        )
+
+    max_tries = max_tries or MAP_RESTARTS
+    for _ in range(max_tries):
+        placed = place_items(layout, rng, req_w, req_p)
+        if placed is not None:
+            gold, wumpus, pits = placed
+            cells = layout["cells"]
+            return (
+                ms,
+                [list(cells[w]) for w in wumpus],
+                [list(cells[p]) for p in pits],
+                list(cells[gold]),
+            )
+    raise RuntimeError(
+        f"Không đặt được {req_w} wumpus và {req_p} pit trên bản đồ {ms}x{ms} "
+        f"sau {max_tries} lần thử"
+    )
+
+
+def map_violations(world_map):
+    """
+    Các luật mà bản đồ vi phạm (kiểm tra trực tiếp, không dùng chỉ mục).
+    """
+    ms, wumpus_pos, pit_positions, gold_pos = world_map
+    problems = []
+    if euclidean_distance(gold_pos, [1, 1]) != ms - 1:
+        problems.append(f"vàng {gold_pos} không cách [1, 1] đúng {ms - 1}")
+    placed = [[1, 1], gold_pos]
+    for kind, positions in (("wumpus", wumpus_pos), ("pit", pit_positions)):
+        same_kind = []
+        for pos in positions:
+            if not (1 <= pos[0] <= ms and 1 <= pos[1] <= ms) or pos in START_CELLS:
+                problems.append(f"{kind} {pos} nằm ngoài vùng được đặt")
+            if is_duplicate_or_near(pos, placed):
+                problems.append(f"{kind} {pos} trùng hoặc kề vật khác")
+            if any(euclidean_distance(pos, p) < 2 for p in same_kind):
+                problems.append(f"{kind} {pos} quá gần {kind} khác")
+            same_kind.append(pos)
+            placed.append(pos)
+    return problems
+
+
+def format_init_data(world_map):
+    """
+    Chuỗi nội dung init_data.txt (các term Prolog) cho một bản đồ.
+    """
+    ms, wumpus_pos, pit_positions, gold_pos = world_map
+    return f"{ms}.\n{wumpus_pos}.\n{pit_positions}.\n{gold_pos}.\n"
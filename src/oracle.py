@@ -0,0 +1,224 @@
+"""
+Lời giải "biết hết" cho bản đồ Wumpus: dùng vị trí thật của pit và wumpus để
+biết bản đồ có thắng được mà không phải mạo hiểm hay không, đường an toàn
+ngắn nhất tới vàng, bắn tên có giúp gì không và điểm tốt nhất có thể đạt.
+
+- Ô an toàn: trong bản đồ, không có pit, không có wumpus còn sống.
+- Bắn tên như agent (ask_KB): đứng ở ô kề wumpus, bắn một lần (arrows(0)),
+  mất một vòng và 10 điểm; ô wumpus chết trở thành an toàn.
+- Nhặt vàng mất một vòng và thắng ngay (+1000); không cần quay về.
+- Cả ván không quá MAX_ROUNDS vòng.
+
+BFS chạy trên cả batch cùng lúc bằng mảng NumPy (N, S, S) như BatchWorld:
+mỗi bước mở rộng toàn bộ biên bằng _adjacent_any.
+
+    python oracle.py [init_data.txt]
+    python oracle.py --sizes 4 5 6 7 8 --count 10000 --seed 0
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+
+from world_engine import (
+    INIT_DATA_PATH,
+    MAX_ROUNDS,
+    START_POS,
+    BatchWorld,
+    _adjacent_any,
+    read_init_data,
+)
+
+GOLD_REWARD = 1000
+ARROW_COST = 10
+UNREACHABLE = -1
+FAR = 1 << 30  # "vô cùng" khi lấy min trên khoảng cách
+
+
+def bfs_distances(passable, sources):
+    """
+    BFS nhiều nguồn cho mọi bản đồ của batch. passable, sources: mảng bool
+    (N, S, S). Trả về số bước đi từ nguồn gần nhất tới từng ô (int32),
+    UNREACHABLE nếu không tới được.
+    """
+    dist = np.full(passable.shape, UNREACHABLE, dtype=np.int32)
+    frontier = sources & passable
+    seen = frontier.copy()
+    step = 0
+    while frontier.any():
+        dist[frontier] = step
+        step += 1
+        frontier = _adjacent_any(frontier) & passable & ~seen
+        seen |= frontier
+    return dist
+
+
+def inside_mask(world):
+    """Ô nằm trong bản đồ (batch được đệm tới bản đồ lớn nhất)."""
+    axis = np.arange(world.pit.shape[1])
+    inside_x = axis[None, :, None] < world.sizes[:, None, None]
+    inside_y = axis[None, None, :] < world.sizes[:, None, None]
+    return inside_x & inside_y
+
+
+def _adjacent_min(dist):
+    """
+    Khoảng cách nhỏ nhất trong các ô kề (4 hướng) của từng ô; FAR nếu không
+    ô kề nào tới được. dist dạng (N, S, S) như bfs_distances.
+    """
+    far = np.where(dist >= 0, dist, FAR).astype(np.int64)
+    out = np.full_like(far, FAR)
+    np.minimum(out[:, 1:, :], far[:, :-1, :], out=out[:, 1:, :])
+    np.minimum(out[:, :-1, :], far[:, 1:, :], out=out[:, :-1, :])
+    np.minimum(out[:, :, 1:], far[:, :, :-1], out=out[:, :, 1:])
+    np.minimum(out[:, :, :-1], far[:, :, 1:], out=out[:, :, :-1])
+    return out
+
+
+def solve_batch(world):
+    """
+    Giải mọi bản đồ của BatchWorld. Trả về dict các mảng (N,):
+
+    - safe_path: số bước đi an toàn ngắn nhất từ [1, 1] tới vàng, không bắn;
+    - shot_path: số bước đi ngắn nhất của đường đi qua ô một wumpus đã bị
+      bắn (không tính vòng bắn);
+    - shoot_helps: bắn cho điểm cao hơn (kể cả khi không bắn thì không tới
+      được vàng);
+    - rounds: số vòng của cách chơi tốt nhất (đi + bắn + nhặt);
+    - solvable: thắng được mà không mạo hiểm, trong MAX_ROUNDS vòng;
+    - best_score: điểm tốt nhất (0 nếu không thắng được).
+
+    Chỉ có một mũi tên nên đường có bắn đi qua đúng một ô wumpus W: tới ô kề
+    W, bắn, bước vào W rồi tới vàng bằng ô an toàn. Vì vậy chỉ cần hai lần
+    BFS cho cả batch (từ [1, 1] và từ vàng) thay vì một lần cho mỗi wumpus.
+    Đường có bắn mà không đi qua W thì không ngắn hơn safe_path.
+    """
+    n = world.n
+    idx = np.arange(n)
+    gx, gy = world.gold[:, 0] - 1, world.gold[:, 1] - 1
+    inside = inside_mask(world)
+    safe = inside & ~world.pit & ~world.wumpus
+    start = np.zeros_like(safe)
+    start[:, START_POS[0] - 1, START_POS[1] - 1] = True
+    goal = np.zeros_like(safe)
+    goal[idx, gx, gy] = True
+
+    from_start = bfs_distances(safe, start)
+    from_gold = bfs_distances(safe, goal)
+    safe_path = from_start[idx, gx, gy]
+
+    # Qua ô wumpus W: (ô kề W gần [1, 1] nhất) + 1 + (W tới vàng)
+    shootable = world.wumpus & ~world.pit
+    into_w = _adjacent_min(from_start) + 1
+    out_of_w = np.where(goal, 0, _adjacent_min(from_gold) + 1)
+    via_w = np.where(shootable, into_w + out_of_w, FAR).reshape(n, -1).min(axis=1)
+    shot_path = np.where(via_w < FAR, via_w, UNREACHABLE).astype(np.int32)
+
+    # Điểm = 1000 - số vòng (- 10 nếu bắn); vòng nhặt vàng cũng được tính
+    safe_rounds = np.where(safe_path >= 0, safe_path + 1, 0)
+    shot_rounds = np.where(shot_path >= 0, shot_path + 2, 0)
+    safe_ok = (safe_path >= 0) & (safe_rounds <= world.max_rounds)
+    shot_ok = (shot_path >= 0) & (shot_rounds <= world.max_rounds)
+    safe_score = np.where(safe_ok, GOLD_REWARD - safe_rounds, -FAR)
+    shot_score = np.where(shot_ok, GOLD_REWARD - shot_rounds - ARROW_COST, -FAR)
+    shoot_helps = shot_ok & (shot_score > safe_score)
+    solvable = safe_ok | shot_ok
+    return {
+        "safe_path": safe_path,
+        "shot_path": shot_path,
+        "shoot_helps": shoot_helps,
+        "rounds": np.where(shoot_helps, shot_rounds, np.where(safe_ok, safe_rounds, 0)),
+        "solvable": solvable,
+        "best_score": np.where(solvable, np.maximum(safe_score, shot_score), 0),
+    }
+
+
+def solve_maps(maps, max_rounds=MAX_ROUNDS):
+    """
+    Giải danh sách bản đồ (world_dim, wumpus_list, pit_list, gold) như
+    init_data.txt; mỗi bản đồ một dict (giá trị Python, None khi không có).
+    """
+    if not maps:
+        return []
+    result = solve_batch(BatchWorld(maps, max_rounds=max_rounds))
+    rows = []
+    for i in range(len(maps)):
+        solvable = bool(result["solvable"][i])
+        safe_path = int(result["safe_path"][i])
+        shot_path = int(result["shot_path"][i])
+        rows.append(
+            {
+                "solvable": solvable,
+                "safe_path": safe_path if safe_path >= 0 else None,
+                "shot_path": shot_path if shot_path >= 0 else None,
+                "shoot_helps": bool(result["shoot_helps"][i]),
+                "rounds": int(result["rounds"][i]) if solvable else None,
+                "best_score": int(result["best_score"][i]) if solvable else None,
+            }
+        )
+    return rows
+
+
+def regret(best_score, score):
+    """
+    Điểm agent còn thiếu so với lời giải tốt nhất; None nếu không so được
+    (bản đồ không thắng được hoặc ván không có điểm).
+    """
+    if best_score is None or score is None:
+        return None
+    return best_score - score
+
+
+def solvable_maps(maps, max_rounds=MAX_ROUNDS):
+    """Lọc bỏ những bản đồ không thắng được mà không mạo hiểm."""
+    if not maps:
+        return []
+    solvable = solve_batch(BatchWorld(maps, max_rounds=max_rounds))["solvable"]
+    return [m for m, ok in zip(maps, solvable) if ok]
+
+
+def print_map_result(path):
+    world_map = read_init_data(path)
+    result = solve_maps([world_map])[0]
+    print(f"Bản đồ {path} ({world_map[0]}x{world_map[0]})")
+    for key, value in result.items():
+        print(f"  {key}: {value}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("init_data", nargs="?", help="giải một bản đồ init_data.txt")
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", help="sinh bản đồ ngẫu nhiên theo kích thước"
+    )
+    parser.add_argument("--count", type=int, default=10000, help="số bản đồ mỗi kích thước")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if not args.sizes:
+        print_map_result(args.init_data or INIT_DATA_PATH)
+        return
+
+    from map_gen import generate_map
+
+    print(
+        f"{'kích thước':<12}{'thắng được':>12}{'bắn có ích':>12}"
+        f"{'điểm TB':>10}{'bản đồ/s':>12}"
+    )
+    for size in args.sizes:
+        rng = random.Random(args.seed)
+        maps = [generate_map(size, rng) for _ in range(args.count)]
+        started = time.perf_counter()
+        result = solve_batch(BatchWorld(maps))
+        elapsed = time.perf_counter() - started
+        solvable = result["solvable"]
+        mean_score = result["best_score"][solvable].mean() if solvable.any() else 0
+        print(
+            f"{f'{size}x{size}':<12}{solvable.mean():>12.1%}{result['shoot_helps'].mean():>12.1%}"
+            f"{mean_score:>10.1f}{len(maps) / elapsed:>12.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
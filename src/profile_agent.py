@@ -0,0 +1,145 @@
+"""
+Chạy một ván của agent Prolog dưới profiler của SWI-Prolog và ghi báo cáo
+JSON: các predicate tốn nhiều thời gian nhất và chi phí (inference, ms CPU)
+của từng vòng.
+
+    python profile_agent.py --size 8 --seed 0 --out profile.json
+    python profile_agent.py --init init_data.txt --top 30
+    python profile_agent.py --size 12 --predicates ask_KB/2 update_KB/2 planned_move/3
+
+Báo cáo gồm map, result, wall_time, totals (vòng, inference, ms CPU, số mẫu
+của profiler), rounds ([{n, inferences, cpu_ms}]) và predicates: top
+predicate theo thời gian riêng (self_ms, không tính predicate con), kèm
+total_ms (tính cả predicate con), số lần call / redo / exit. Thời gian của
+predicate suy từ số tick của profiler nên chỉ đáng tin khi ván đủ dài.
+"""
+import argparse
+import json
+import random
+
+from map_gen import generate_map
+from prolog_runner import MAX_ROUNDS, PROLOG_TIMEOUT, run_agent_game
+from world_engine import read_init_data
+
+
+def read_events(text):
+    """Các object JSON (mỗi dòng một object) trong trace hoặc file profile."""
+    return [json.loads(line) for line in text.splitlines() if line.strip().startswith("{")]
+
+
+def profile_report(world_map, run, top=20, predicates=()):
+    """
+    Báo cáo của ván run (run_agent_game(..., trace_format="json", profile=True)).
+    predicates: tên predicate (vd. "ask_KB/2") luôn có trong báo cáo dù
+    không nằm trong top.
+    """
+    events = read_events(run["trace"])
+    rounds = [
+        {"n": e["n"], "inferences": e["inferences"], "cpu_ms": e["cpu"]}
+        for e in events
+        if e["e"] == "cost"
+    ]
+    ends = [e for e in events if e["e"] == "end"]
+    if run["timed_out"]:
+        result = "timeout"
+    elif ends:
+        result = ends[0]["status"]
+    else:
+        result = "unfinished" if rounds else "error"
+
+    profile = read_events(run.get("profile", ""))
+    summary = next((e for e in profile if e["e"] == "summary"), {})
+    ticks = summary.get("ticks", 0)
+    tick_ms = summary.get("time", 0.0) * 1000 / ticks if ticks else 0.0
+    nodes = sorted(
+        (e for e in profile if e["e"] == "pred"), key=lambda e: (-e["self"], -e["total"])
+    )
+    chosen = nodes[:top] + [e for e in nodes[top:] if e["name"] in predicates]
+
+    size, wumpus, pits, gold = world_map
+    return {
+        "map": {"size": size, "wumpus": wumpus, "pits": pits, "gold": gold},
+        "result": result,
+        "wall_time": round(run["wall_time"], 4),
+        "totals": {
+            "rounds": len(rounds),
+            "inferences": sum(r["inferences"] for r in rounds),
+            "cpu_ms": round(sum(r["cpu_ms"] for r in rounds), 3),
+            "samples": summary.get("samples", 0),
+            "ticks": ticks,
+        },
+        "rounds": rounds,
+        "predicates": [
+            {
+                "name": e["name"],
+                "calls": e["call"],
+                "redo": e["redo"],
+                "exit": e["exit"],
+                "self_ms": round(e["self"] * tick_ms, 3),
+                "total_ms": round(e["total"] * tick_ms, 3),
+                "self_pct": round(100 * e["self"] / ticks, 1) if ticks else 0.0,
+                "total_pct": round(100 * e["total"] / ticks, 1) if ticks else 0.0,
+            }
+            for e in chosen
+        ],
+    }
+
+
+def print_report(report):
+    totals = report["totals"]
+    print(
+        f"Kết quả: {report['result']}, {totals['rounds']} vòng, "
+        f"{totals['inferences']} inference, {totals['cpu_ms']:.1f} ms CPU, "
+        f"{totals['samples']} mẫu profiler"
+    )
+    if report["rounds"]:
+        costliest = max(report["rounds"], key=lambda r: r["inferences"])
+        print(
+            f"Vòng tốn nhất: {costliest['n']} ({costliest['inferences']} inference, "
+            f"{costliest['cpu_ms']:.3f} ms)"
+        )
+    print(f"{'predicate':<36}{'call':>9}{'self ms':>10}{'self %':>8}{'total ms':>10}{'total %':>9}")
+    for p in report["predicates"]:
+        print(
+            f"{p['name']:<36}{p['calls']:>9}{p['self_ms']:>10.1f}{p['self_pct']:>8.1f}"
+            f"{p['total_ms']:>10.1f}{p['total_pct']:>9.1f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--init", help="đọc bản đồ từ init_data.txt thay vì sinh từ --seed")
+    parser.add_argument("--top", type=int, default=20, help="số predicate tốn nhất")
+    parser.add_argument("--predicates", nargs="+", default=[], help="luôn báo cáo các predicate này")
+    parser.add_argument("--timeout", type=float, default=PROLOG_TIMEOUT)
+    parser.add_argument("--max-rounds", type=int, default=MAX_ROUNDS)
+    parser.add_argument("--max-inferences", type=int)
+    parser.add_argument("--out", default="profile.json")
+    args = parser.parse_args()
+
+    if args.init:
+        world_map = read_init_data(args.init)
+    else:
+        world_map = generate_map(args.size, random.Random(args.seed))
+    run = run_agent_game(
+        world_map,
+        timeout=args.timeout,
+        trace_format="json",
+        max_rounds=args.max_rounds,
+        max_inferences=args.max_inferences,
+        profile=True,
+    )
+    if run["returncode"] is None and not run["timed_out"]:
+        raise SystemExit(f"Không chạy được swipl: {run['stderr']}")
+
+    report = profile_report(world_map, run, args.top, args.predicates)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print_report(report)
+    print(f"Đã ghi {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+"""
+Pool các tiến trình SWI-Prolog chạy sẵn (chế độ `serve` của wumpus_agent.pl).
+
+Mỗi worker chỉ consult agent một lần rồi nhận bản đồ qua stdin dưới dạng
+term game(Size, Wumpus, Pits, Gold). Trace của ván được trả về qua stdout,
+kết thúc bằng dòng END_MARKER. Worker bị treo hoặc chết sẽ được khởi động lại.
+
+    with PrologWorkerPool(size=4) as pool:
+        results = pool.map(maps)
+        print(pool.stats())
+"""
+import os
+import queue
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from prolog_runner import (
+    MAX_ROUNDS,
+    PROLOG_TIMEOUT,
+    agent_file,
+    budget_env,
+    build_command,
+    find_prolog_executable,
+    kill_timeout,
+    trace_env,
+)
+
+END_MARKER = "%%END_GAME%%"
+
+
+def read_lines_into(stream, lines):
+    """
+    Chạy trong luồng riêng: chuyển từng dòng stdout vào hàng đợi, None khi EOF.
+    """
+    for line in stream:
+        lines.put(line)
+    lines.put(None)  # EOF: tiến trình đã thoát
+
+
+class PrologWorker:
+    """
+    Một tiến trình swipl chạy `serve`, chơi lần lượt từng ván, mỗi ván với
+    ngân sách budget (budget_env, None: mặc định). round_cost: trace có chi
+    phí từng vòng (WUMPUS_ROUND_COST).
+    """
+
+    def __init__(self, prolog_cmd=None, trace_format="text", budget=None, round_cost=False):
+        self.prolog_cmd = prolog_cmd or find_prolog_executable()
+        self.trace_format = trace_format
+        self.budget = budget
+        self.round_cost = round_cost
+        self.process = None
+        self._lines = None
+        self.start()
+
+    def start(self):
+        self.process = subprocess.Popen(
+            [self.prolog_cmd, "-q", "-s", agent_file(), "-g", "serve", "-t", "halt"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            bufsize=1,
+            env=trace_env(self.trace_format, budget=self.budget, round_cost=self.round_cost),
+        )
+        # Đọc stdout trong luồng riêng để có thể đặt timeout cho mỗi ván
+        self._lines = queue.Queue()
+        threading.Thread(
+            target=read_lines_into, args=(self.process.stdout, self._lines), daemon=True
+        ).start()
+
+    def is_alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def stop(self):
+        if self.process is None:
+            return
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass
+        try:
+            self.process.wait(timeout=1)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+        self.process = None
+
+    def restart(self):
+        if self.process is not None:
+            self.process.kill()
+            self.process.wait()
+            self.process = None
+        self.start()
+
+    def send(self, world_map):
+        """
+        Gửi bản đồ cho worker; trace được đọc dần bằng read_line().
+        """
+        size, wumpus_pos, pit_positions, gold_pos = world_map
+        self.process.stdin.write(f"game({size}, {wumpus_pos}, {pit_positions}, {gold_pos}).\n")
+        self.process.stdin.flush()
+
+    def read_line(self, timeout=None):
+        """
+        Dòng trace tiếp theo (END_MARKER khi hết ván, None khi worker chết).
+        timeout=0 không chờ; ném queue.Empty nếu chưa có dòng mới.
+        """
+        if timeout == 0:
+            return self._lines.get_nowait()
+        return self._lines.get(timeout=timeout)
+
+    def play(self, world_map, timeout=PROLOG_TIMEOUT):
+        """
+        Chơi một ván. Trả về dict cùng dạng với prolog_runner.run_agent_game,
+        thêm khoá crashed khi worker chết giữa chừng. timeout là ngân sách
+        thời gian của worker; chỉ sau kill_timeout(timeout) mới coi là treo.
+        timeout=None chờ tới khi ván kết thúc.
+        """
+        started = time.perf_counter()
+        trace_lines = []
+        timed_out = crashed = False
+        try:
+            self.send(world_map)
+            limit = kill_timeout(timeout)
+            deadline = None if limit is None else started + limit
+            while True:
+                wait = None if deadline is None else max(0.0, deadline - time.perf_counter())
+                line = self.read_line(timeout=wait)
+                if line is None:
+                    crashed = True
+                    break
+                if line.rstrip("\n") == END_MARKER:
+                    break
+                trace_lines.append(line)
+        except queue.Empty:
+            timed_out = True
+        except (BrokenPipeError, OSError):
+            crashed = True
+        return {
+            "returncode": None if (timed_out or crashed) else 0,
+            "trace": "".join(trace_lines),
+            "stdout": "",
+            "stderr": "",
+            "wall_time": time.perf_counter() - started,
+            "timed_out": timed_out,
+            "crashed": crashed,
+        }
+
+
+class PrologGameProcess:
+    """
+    Một lần chạy `swipl -g start.` với trace ghi thẳng ra stdout
+    (WUMPUS_TRACE_FILE=user), đọc được từng dòng khi agent đang chơi.
+    Cùng giao diện read_line() với PrologWorker; None khi ván kết thúc.
+    """
+
+    def __init__(
+        self, prolog_cmd=None, trace_format="text", cwd=None, budget=None, round_cost=False
+    ):
+        env = trace_env(trace_format, budget=budget, round_cost=round_cost)
+        env["WUMPUS_TRACE_FILE"] = "user"
+        self.process = subprocess.Popen(
+            build_command(prolog_cmd),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            stdin=subprocess.DEVNULL,
+            text=True,
+            bufsize=1,
+            cwd=cwd,
+            env=env,
+        )
+        self._lines = queue.Queue()
+        threading.Thread(
+            target=read_lines_into, args=(self.process.stdout, self._lines), daemon=True
+        ).start()
+
+    def read_line(self, timeout=None):
+        if timeout == 0:
+            return self._lines.get_nowait()
+        return self._lines.get(timeout=timeout)
+
+    def is_alive(self):
+        return self.process.poll() is None
+
+    def stop(self):
+        if self.process.poll() is None:
+            self.process.kill()
+        self.process.wait()
+
+
+class PrologWorkerPool:
+    """
+    Quản lý size worker: phân phối ván cho worker rảnh, khởi động lại worker
+    lỗi, và thống kê độ dài hàng đợi cùng độ trễ từng ván. Mỗi ván có ngân
+    sách timeout giây, max_rounds vòng và max_inferences inference.
+    """
+
+    def __init__(
+        self,
+        size=None,
+        timeout=PROLOG_TIMEOUT,
+        prolog_cmd=None,
+        trace_format="text",
+        max_rounds=MAX_ROUNDS,
+        max_inferences=None,
+    ):
+        self.size = size or os.cpu_count()
+        self.timeout = timeout
+        budget = budget_env(max_rounds, max_inferences, timeout)
+        self._idle = queue.Queue()
+        for _ in range(self.size):
+            self._idle.put(PrologWorker(prolog_cmd, trace_format, budget))
+        self._executor = ThreadPoolExecutor(max_workers=self.size)
+        self._lock = threading.Lock()
+        self._queued = 0
+        self.latencies = []
+        self.restarts = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def submit(self, world_map):
+        with self._lock:
+            self._queued += 1
+        return self._executor.submit(self._play, world_map)
+
+    def map(self, maps):
+        futures = [self.submit(m) for m in maps]
+        return [f.result() for f in futures]
+
+    def _play(self, world_map):
+        worker = self._idle.get()
+        with self._lock:
+            self._queued -= 1
+        try:
+            if not worker.is_alive():
+                worker.restart()
+                with self._lock:
+                    self.restarts += 1
+            result = worker.play(world_map, self.timeout)
+            if result["timed_out"] or result["crashed"]:
+                worker.restart()
+                with self._lock:
+                    self.restarts += 1
+        finally:
+            self._idle.put(worker)
+        with self._lock:
+            self.latencies.append(result["wall_time"])
+        return result
+
+    def queue_depth(self):
+        """Số ván đang chờ worker rảnh."""
+        with self._lock:
+            return self._queued
+
+    def stats(self):
+        with self._lock:
+            latencies = sorted(self.latencies)
+            queued = self._queued
+            restarts = self.restarts
+
+        def pct(q):
+            if not latencies:
+                return 0.0
+            return latencies[min(len(latencies) - 1, int(q / 100 * len(latencies)))]
+
+        return {
+            "workers": self.size,
+            "queue_depth": queued,
+            "games": len(latencies),
+            "restarts": restarts,
+            "latency_mean": sum(latencies) / len(latencies) if latencies else 0.0,
+            "latency_p50": pct(50),
+            "latency_p95": pct(95),
+            "latency_max": latencies[-1] if latencies else 0.0,
+        }
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        while not self._idle.empty():
+            self._idle.get().stop()
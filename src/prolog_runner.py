@@ -0,0 +1,218 @@
+"""
+Chạy agent Prolog không cần giao diện: mỗi ván dùng một thư mục làm việc
+riêng (init_data.txt + kb.txt) để nhiều ván có thể chạy song song.
+
+Biên dịch sẵn agent (wumpus_agent.qlf) để swipl không phải consult lại mã
+nguồn mỗi ván; bản .qlf chỉ được dùng khi mới hơn wumpus_agent.pl:
+
+    python prolog_runner.py
+
+Mỗi ván có ngân sách (budget_env): số vòng tối đa, số inference tối đa và
+thời gian thực tối đa (mặc định PROLOG_TIMEOUT giây). Agent tự dừng khi hết
+ngân sách và ghi vào trace ngân sách nào đã hết, đã dùng bao nhiêu (kết quả
+budget_exceeded); tiến trình chỉ bị kill nếu quá thêm BUDGET_GRACE giây.
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+
+from map_gen import format_init_data
+
+PROLOG_EXECUTABLE = "swipl"
+PROLOG_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "wumpus_agent.pl")
+AGENT_QLF = os.path.splitext(PROLOG_SCRIPT)[0] + ".qlf"
+PROLOG_TIMEOUT = 15  # ngân sách thời gian thực mặc định của một ván (giây)
+BUDGET_GRACE = 5  # thời gian cho swipl khởi động và ghi kết thúc ván
+MAX_ROUNDS = 100
+BUDGET_ENV = {
+    "max_rounds": "WUMPUS_MAX_ROUNDS",
+    "max_inferences": "WUMPUS_MAX_INFERENCES",
+    "max_seconds": "WUMPUS_MAX_SECONDS",
+}
+TRACE_FILES = {"text": "kb.txt", "json": "kb.jsonl"}
+PROFILE_FILE = "profile.jsonl"  # bảng predicate của WUMPUS_PROFILE
+VERBOSITY_LEVELS = ("silent", "events", "debug")
+# Mức chi tiết đủ cho trình đọc trace: load_and_parse_kb_log / parse_trace_rounds
+# chỉ cần các dòng sự kiện, trace JSON thì không cần dòng chữ nào
+TRACE_VERBOSITY = {"text": "events", "json": "silent"}
+
+
+def budget_env(max_rounds=MAX_ROUNDS, max_inferences=None, max_seconds=PROLOG_TIMEOUT):
+    """
+    Biến môi trường đặt ngân sách một ván cho agent; giới hạn None là không
+    giới hạn (riêng max_rounds None: mặc định của agent).
+    """
+    limits = {
+        "max_rounds": max_rounds,
+        "max_inferences": max_inferences,
+        "max_seconds": max_seconds,
+    }
+    return {BUDGET_ENV[key]: str(value) for key, value in limits.items() if value is not None}
+
+
+def kill_timeout(max_seconds):
+    """Thời gian chờ trước khi kill swipl khi agent không tự dừng (None: chờ mãi)."""
+    return None if max_seconds is None else max_seconds + BUDGET_GRACE
+
+
+def trace_env(trace_format="text", verbosity=None, budget=None, round_cost=False):
+    """
+    Biến môi trường chọn định dạng trace (WUMPUS_TRACE) và mức chi tiết của
+    phần chữ (WUMPUS_VERBOSITY: silent / events / debug). verbosity None thì
+    lấy WUMPUS_VERBOSITY đang đặt, nếu không có thì TRACE_VERBOSITY.
+    budget: kết quả của budget_env, None là ngân sách mặc định.
+    round_cost: agent ghi số inference / ms CPU của từng vòng vào trace.
+    """
+    env = dict(os.environ)
+    env["WUMPUS_TRACE"] = trace_format
+    env["WUMPUS_VERBOSITY"] = (
+        verbosity or os.environ.get("WUMPUS_VERBOSITY") or TRACE_VERBOSITY[trace_format]
+    )
+    for name in BUDGET_ENV.values():
+        env.pop(name, None)
+    env.update(budget_env() if budget is None else budget)
+    if round_cost:
+        env["WUMPUS_ROUND_COST"] = "true"
+    return env
+
+
+def find_prolog_executable(name=PROLOG_EXECUTABLE):
+    return shutil.which(name) or name
+
+
+def agent_file():
+    """
+    File agent cho swipl nạp: AGENT_QLF nếu có và mới hơn mã nguồn, nếu
+    không thì chính wumpus_agent.pl.
+    """
+    try:
+        if os.path.getmtime(AGENT_QLF) >= os.path.getmtime(PROLOG_SCRIPT):
+            return AGENT_QLF
+    except OSError:
+        pass
+    return PROLOG_SCRIPT
+
+
+def compile_agent(prolog_cmd=None):
+    """
+    Biên dịch wumpus_agent.pl thành AGENT_QLF (qcompile/1). Lỗi biên dịch
+    ném subprocess.CalledProcessError.
+    """
+    source = PROLOG_SCRIPT.replace("\\", "\\\\").replace("'", "\\'")
+    subprocess.run(
+        [prolog_cmd or find_prolog_executable(), "-q", "-g", f"qcompile('{source}')", "-t", "halt"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return AGENT_QLF
+
+
+def build_command(prolog_cmd=None, script=None):
+    return [
+        prolog_cmd or find_prolog_executable(),
+        "-s",
+        script or agent_file(),
+        "-g",
+        "start.",
+        "-t",
+        "halt.",
+    ]
+
+
+def _decode(output):
+    # TimeoutExpired giữ stdout/stderr dạng bytes kể cả khi text=True
+    if isinstance(output, bytes):
+        return output.decode(errors="replace")
+    return output or ""
+
+
+def run_agent_game(
+    world_map,
+    timeout=PROLOG_TIMEOUT,
+    prolog_cmd=None,
+    trace_format="text",
+    verbosity=None,
+    max_rounds=MAX_ROUNDS,
+    max_inferences=None,
+    profile=False,
+):
+    """
+    Chạy một ván cho bản đồ world_map = (size, wumpus, pits, gold), với
+    ngân sách timeout giây thời gian thực, max_rounds vòng và max_inferences
+    inference. Trả về dict gồm returncode, trace (nội dung kb.txt hoặc
+    kb.jsonl tuỳ trace_format), stdout, stderr, wall_time (giây) và
+    timed_out (swipl bị kill vì không tự dừng khi hết ngân sách).
+
+    profile=True chơi ván dưới profiler của SWI-Prolog (WUMPUS_PROFILE), trace
+    có thêm chi phí từng vòng và dict có thêm profile (nội dung PROFILE_FILE).
+    """
+    budget = budget_env(max_rounds, max_inferences, timeout)
+    env = trace_env(trace_format, verbosity, budget, round_cost=profile)
+    if profile:
+        env["WUMPUS_PROFILE"] = PROFILE_FILE
+    with tempfile.TemporaryDirectory(prefix="wumpus_") as workdir:
+        with open(os.path.join(workdir, "init_data.txt"), "w", encoding="utf-8") as f:
+            f.write(format_init_data(world_map))
+        started = time.perf_counter()
+        try:
+            result = subprocess.run(
+                build_command(prolog_cmd),
+                cwd=workdir,
+                env=env,
+                capture_output=True,
+                text=True,
+                timeout=kill_timeout(timeout),
+                check=False,
+            )
+            returncode, stdout, stderr, timed_out = (
+                result.returncode, result.stdout, result.stderr, False
+            )
+        except subprocess.TimeoutExpired as e:
+            returncode, stdout, stderr, timed_out = (
+                None, _decode(e.stdout), _decode(e.stderr), True
+            )
+        except FileNotFoundError as e:
+            returncode, stdout, stderr, timed_out = None, "", str(e), False
+        wall_time = time.perf_counter() - started
+
+        kb_path = os.path.join(workdir, TRACE_FILES[trace_format])
+        trace = ""
+        if os.path.exists(kb_path):
+            with open(kb_path, "r") as f:
+                trace = f.read()
+        extra = {}
+        if profile:
+            profile_path = os.path.join(workdir, PROFILE_FILE)
+            extra["profile"] = ""
+            if os.path.exists(profile_path):
+                with open(profile_path, "r") as f:
+                    extra["profile"] = f.read()
+
+    return {
+        "returncode": returncode,
+        "trace": trace,
+        "stdout": stdout,
+        "stderr": stderr,
+        "wall_time": wall_time,
+        "timed_out": timed_out,
+        **extra,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Biên dịch sẵn agent Prolog thành file .qlf")
+    parser.parse_args()
+    started = time.perf_counter()
+    try:
+        path = compile_agent()
+    except (OSError, subprocess.CalledProcessError) as e:
+        raise SystemExit(f"Không biên dịch được {PROLOG_SCRIPT}: {getattr(e, 'stderr', None) or e}")
+    print(f"Đã ghi {path} trong {time.perf_counter() - started:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""
+Vẽ lại các ván đã chơi ra ảnh PNG mà không cần cửa sổ (SDL dummy driver),
+dùng đúng các hàm draw_* của wumpus_ui.
+
+    python render_batch.py runs/game1 runs/game2 --out frames
+    python render_batch.py runs/*/kb.jsonl --sheet --workers 8
+
+Mỗi ván là một thư mục giống thư mục làm việc của prolog_runner (init_data.txt
+cùng kb.txt hoặc kb.jsonl), hoặc đường dẫn trực tiếp tới file trace với
+init_data.txt nằm cạnh. Mặc định ghi mỗi bước một ảnh
+OUT/<ván>/step_0000.png; với --sheet thì ghép mọi bước thành một ảnh
+OUT/<ván>.png. Các ván được vẽ song song trong các tiến trình con.
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import pygame  # noqa: E402
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))  # ảnh nằm ở ../image
+INIT_DATA_NAME = "init_data.txt"
+TRACE_NAMES = ("kb.jsonl", "kb.txt")
+SHEET_COLUMNS = 6
+SHEET_SCALE = 0.4
+
+
+def resolve_game(path):
+    """
+    (trace, init_data) của một ván từ thư mục ván hoặc file trace.
+    """
+    path = os.path.abspath(path)
+    if os.path.isdir(path):
+        for name in TRACE_NAMES:
+            if os.path.exists(os.path.join(path, name)):
+                return os.path.join(path, name), os.path.join(path, INIT_DATA_NAME)
+        raise SystemExit(f"Không tìm thấy {' / '.join(TRACE_NAMES)} trong {path}")
+    return path, os.path.join(os.path.dirname(path), INIT_DATA_NAME)
+
+
+def game_name(trace_path):
+    parent = os.path.basename(os.path.dirname(trace_path))
+    stem = os.path.splitext(os.path.basename(trace_path))[0]
+    return f"{parent}_{stem}" if parent else stem
+
+
+def load_game(ui, trace_path, init_path):
+    """
+    Đặt lại trạng thái mô phỏng của wumpus_ui và phân tích trace của một ván.
+    """
+    ui.INIT_DATA_PATH = init_path
+    if not ui.load_init_data():
+        return False
+    ui.message_log = []
+    ui.simulation_wumpus_location = list(ui.wumpus_location_prolog)
+    ui.simulation_agent_pos = list(ui.initial_agent_pos_prolog)
+    ui.simulation_agent_path = [list(ui.initial_agent_pos_prolog)]
+    ui.simulation_running = False
+    ui.step_by_step_mode = True
+    if trace_path.endswith(".jsonl"):
+        parsed = ui.load_structured_trace(trace_path)
+    else:
+        parsed = ui.load_and_parse_kb_log(trace_path)
+    if not parsed:
+        return False
+    ui.simulation_game_status = "ready"
+    return True
+
+
+def render_steps(ui):
+    """
+    Phát lại ván như khi bấm 'Start Sim' rồi 'Next Step' tới vòng kết thúc
+    đầu tiên; trả về từng khung hình (Surface vẽ ngoài màn hình).
+    """
+    canvas = pygame.Surface((ui.SCREEN_WIDTH, ui.SCREEN_HEIGHT))
+    ui.screen = canvas
+    ui.handle_start_press()
+    while True:
+        ui.draw_scene(canvas.get_rect())
+        yield canvas
+        if ui.simulation_game_status != "playing":
+            break
+        if ui.current_step_index + 1 >= len(ui.simulation_steps_data):
+            break
+        ui.advance_simulation_step()
+
+
+def contact_sheet(frames, columns=SHEET_COLUMNS, scale=SHEET_SCALE):
+    """
+    Ghép các khung hình thu nhỏ thành lưới, đánh số bước ở góc mỗi ô.
+    """
+    width, height = frames[0].get_size()
+    thumb = (int(width * scale), int(height * scale))
+    rows = (len(frames) + columns - 1) // columns
+    sheet = pygame.Surface((thumb[0] * min(columns, len(frames)), thumb[1] * rows))
+    sheet.fill((255, 255, 255))
+    font = pygame.font.SysFont("arial", 16)
+    for i, frame in enumerate(frames):
+        x, y = (i % columns) * thumb[0], (i // columns) * thumb[1]
+        sheet.blit(pygame.transform.smoothscale(frame, thumb), (x, y))
+        pygame.draw.rect(sheet, (200, 200, 200), (x, y, thumb[0], thumb[1]), 1)
+        sheet.blit(font.render(str(i), True, (255, 0, 0)), (x + 4, y + 2))
+    return sheet
+
+
+def render_game(task):
+    """
+    Chạy trong tiến trình con: vẽ một ván ra PNG. Trả về (tên, số khung, lỗi).
+    """
+    import wumpus_ui as ui
+
+    trace_path, init_path, out_dir, sheet = task
+    name = game_name(trace_path)
+    ui.print = lambda *args, **kwargs: None  # log phân tích của UI không cần ở đây
+    ui.init_display()
+    if not load_game(ui, trace_path, init_path):
+        errors = [msg for msg in ui.message_log if "LỖI" in msg or "Lỗi" in msg]
+        return name, 0, errors[-1] if errors else "không đọc được ván"
+
+    if sheet:
+        frames = [frame.copy() for frame in render_steps(ui)]
+        pygame.image.save(contact_sheet(frames), os.path.join(out_dir, f"{name}.png"))
+        return name, len(frames), None
+
+    game_dir = os.path.join(out_dir, name)
+    os.makedirs(game_dir, exist_ok=True)
+    count = 0
+    for count, frame in enumerate(render_steps(ui), 1):
+        pygame.image.save(frame, os.path.join(game_dir, f"step_{count - 1:04d}.png"))
+    return name, count, None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("games", nargs="+", help="thư mục ván hoặc file kb.txt / kb.jsonl")
+    parser.add_argument("--out", default="frames")
+    parser.add_argument("--sheet", action="store_true", help="một ảnh ghép cho mỗi ván")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    out_dir = os.path.abspath(args.out)
+    os.makedirs(out_dir, exist_ok=True)
+    tasks = [(*resolve_game(path), out_dir, args.sheet) for path in args.games]
+    # Đường dẫn đã tuyệt đối; wumpus_ui tải ảnh theo đường dẫn tương đối
+    os.chdir(SRC_DIR)
+
+    started = time.perf_counter()
+    total = 0
+    with ProcessPoolExecutor(max_workers=min(args.workers, len(tasks))) as pool:
+        for name, count, error in pool.map(render_game, tasks):
+            if error:
+                print(f"{name}: bỏ qua ({error})")
+            else:
+                print(f"{name}: {count} khung hình")
+                total += count
+    elapsed = time.perf_counter() - started
+    print(f"Đã ghi {total} khung hình của {len(tasks)} ván vào {out_dir} trong {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Bộ đệm hình vẽ và tiện ích vòng lặp vẽ dùng chung cho màn hình cấu hình
+(config.py) và màn hình mô phỏng (wumpus_ui.py).
+
+- sprite(): hình đã scale sẵn và convert_alpha(), theo khoá (tên, kích thước)
+  và độ trong suốt, để không phải transform.scale / copy mỗi khung hình.
+- layer(): lớp nền tĩnh (lưới, tọa độ ô) dựng một lần; chỉ dựng lại khi khoá
+  (kích thước bản đồ, kích thước ô, ...) thay đổi.
+- wait_for_events(): chờ sự kiện khi không có gì chuyển động, thay cho
+  clock.tick() vẽ lại liên tục.
+- lazy_import(): module chỉ thực sự được import ở lần dùng đầu tiên, để các
+  module có phần logic thuần (phân tích trace, kiểm tra bản đồ) import rẻ
+  trong tiến trình xử lý hàng loạt mà không kéo theo pygame.
+"""
+import importlib.util
+import sys
+
+
+def lazy_import(name):
+    """
+    Module name, nạp thật khi truy cập thuộc tính đầu tiên (LazyLoader).
+    """
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    spec = importlib.util.find_spec(name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+pygame = lazy_import("pygame")
+
+_sprites = {}
+_layers = {}
+
+
+def sprite(name, image, size, alpha=None):
+    """
+    image scale về size (và set_alpha(alpha) nếu có), lưu theo (name, size, alpha).
+    """
+    key = (name, tuple(size), alpha)
+    surface = _sprites.get(key)
+    if surface is None:
+        if alpha is None:
+            surface = image if image.get_size() == tuple(size) else pygame.transform.scale(image, size)
+            surface = surface.convert_alpha()
+        else:
+            surface = sprite(name, image, size).copy()
+            surface.set_alpha(alpha)
+        _sprites[key] = surface
+    return surface
+
+
+def fill_surface(size, color):
+    """
+    Ô màu (có kênh alpha) kích thước size, ví dụ lớp làm mờ ô chưa biết.
+    """
+    key = ("fill", tuple(size), tuple(color))
+    surface = _sprites.get(key)
+    if surface is None:
+        surface = pygame.Surface(size, pygame.SRCALPHA)
+        surface.fill(color)
+        _sprites[key] = surface
+    return surface
+
+
+def layer(name, key, build):
+    """
+    Lớp tĩnh name; build() chỉ được gọi lại khi key khác lần trước.
+    """
+    cached = _layers.get(name)
+    if cached is None or cached[0] != key:
+        cached = (key, build())
+        _layers[name] = cached
+    return cached[1]
+
+
+def clear():
+    _sprites.clear()
+    _layers.clear()
+
+
+def wait_for_events(timeout_ms=None):
+    """
+    Chờ sự kiện thay vì quay vòng vẽ lại: chặn tới khi có sự kiện hoặc hết
+    timeout_ms (None: chờ đến khi có sự kiện). Trả về các sự kiện đang chờ.
+    """
+    if timeout_ms is not None and timeout_ms <= 0:
+        return pygame.event.get()
+    if timeout_ms is None:
+        event = pygame.event.wait()
+    else:
+        event = pygame.event.wait(max(1, int(timeout_ms)))
+    events = [] if event.type == pygame.NOEVENT else [event]
+    return events + pygame.event.get()
@@ -0,0 +1,108 @@
+"""
+Lưu lịch sử các bước mô phỏng dưới dạng delta thay vì chép đủ trạng thái KB
+(safe / maybe_wumpus / ... / visited) ở mỗi bước.
+
+Trạng thái KB là các bitmask của kb_grid.KnowledgeGrid, nên delta của một
+bước chỉ là XOR với bước trước cho các loại có thay đổi; cứ KEYFRAME_INTERVAL
+bước lại lưu một keyframe đầy đủ. Trạng thái ở bước bất kỳ được dựng lại từ
+keyframe gần nhất, hoặc từ bước vừa truy cập khi phát lại tuần tự.
+
+    store = StepStore()
+    store.append(step_info, grid)   # grid: KnowledgeGrid sau vòng đó
+    step = store[i]                 # step_info cũ, thêm khoá "kb" (KnowledgeGrid)
+"""
+from kb_grid import KB_KEYS, KnowledgeGrid
+
+KEYFRAME_INTERVAL = 16
+
+
+class StepStore:
+    """
+    Danh sách bước chỉ-thêm, truy cập theo chỉ số như list step_info cũ.
+    """
+
+    def __init__(self, keyframe_interval=KEYFRAME_INTERVAL):
+        self.keyframe_interval = keyframe_interval
+        self.size = None
+        self._steps = []  # các trường không thuộc KB của từng bước
+        self._deltas = []  # mỗi bước: {key: XOR với bước trước}, chỉ các key thay đổi
+        self._keyframes = {}  # chỉ số bước -> {key: mask}
+        self._last = dict.fromkeys(KB_KEYS, 0)
+        self._cache_index = None
+        self._cache_masks = None
+        self._cache_step = None
+
+    def __len__(self):
+        return len(self._steps)
+
+    def __iter__(self):
+        for i in range(len(self._steps)):
+            yield self[i]
+
+    def append(self, step_info, grid):
+        """
+        Thêm một bước. step_info có thể mang "kb_snapshot" ({key: mask}) để
+        ghi đè trạng thái của grid cho riêng vòng đó.
+        """
+        step = dict(step_info)
+        masks = dict(grid.masks)
+        masks.update(step.pop("kb_snapshot", None) or {})
+        self.size = grid.size
+
+        index = len(self._steps)
+        self._deltas.append(
+            {key: masks[key] ^ self._last[key] for key in KB_KEYS if masks[key] != self._last[key]}
+        )
+        if index % self.keyframe_interval == 0:
+            self._keyframes[index] = masks
+        self._steps.append(step)
+        self._last = masks
+
+    def field(self, key, stop=None):
+        """
+        Giá trị trường key (không thuộc KB) của các bước trước stop, không
+        dựng lại KB từng bước như __getitem__.
+        """
+        return [step.get(key) for step in self._steps[:stop]]
+
+    def set_fields(self, index, **fields):
+        """
+        Đổi các trường không thuộc KB của bước index (vd. end_status).
+        """
+        index = self._index(index)
+        self._steps[index].update(fields)
+        if index == self._cache_index:
+            self._cache_step.update(fields)
+
+    def _index(self, index):
+        if index < 0:
+            index += len(self._steps)
+        if not 0 <= index < len(self._steps):
+            raise IndexError(index)
+        return index
+
+    def masks_at(self, index):
+        """
+        Các bitmask KB tại bước index.
+        """
+        index = self._index(index)
+        keyframe = index - index % self.keyframe_interval
+        if self._cache_index is not None and keyframe <= self._cache_index <= index:
+            start, masks = self._cache_index, self._cache_masks
+        else:
+            start, masks = keyframe, self._keyframes[keyframe]
+        masks = dict(masks)
+        for i in range(start + 1, index + 1):
+            for key, change in self._deltas[i].items():
+                masks[key] ^= change
+        return masks
+
+    def __getitem__(self, index):
+        index = self._index(index)
+        if index == self._cache_index:
+            return self._cache_step
+        masks = self.masks_at(index)
+        step = dict(self._steps[index])
+        step["kb"] = KnowledgeGrid(self.size, masks)
+        self._cache_index, self._cache_masks, self._cache_step = index, masks, step
+        return step
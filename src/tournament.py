@@ -0,0 +1,294 @@
+"""
+Chấm điểm agent Prolog trên nhiều bản đồ sinh ngẫu nhiên, không cần giao diện.
+
+    python tournament.py --games-per-size 2000 --sizes 4 5 6 7 8 --seed 0 --out tournament.csv
+
+Mỗi dòng CSV là một bản đồ: seed, kích thước, kết quả (won / lost_wumpus /
+lost_pit / max_rounds / budget_exceeded / unfinished / timeout / error / bad_map /
+unsolvable),
+điểm, thời gian, số vòng, thời gian chạy thực, điểm tốt nhất theo oracle.py
+và regret (điểm tốt nhất - điểm agent). Với --solvable-only, bản đồ mà oracle
+cho là không thắng được mà không mạo hiểm thì không chơi (kết quả unsolvable).
+Cuối cùng in throughput (ván/giây), các phân vị độ trễ và regret trung bình.
+
+Với --corpus, bản đồ lấy từ kho map_corpus (games-per-size bản đồ đầu tiên
+của mỗi kích thước) thay vì sinh từ --seed.
+
+Mỗi ván có ngân sách --timeout giây, --max-rounds vòng và --max-inferences
+inference; hết ngân sách thì agent tự dừng (budget_exceeded, hoặc max_rounds
+khi hết vòng) thay vì làm treo cả giải:
+
+    python tournament.py --sizes 16 --timeout 5 --max-inferences 50000000
+"""
+import argparse
+import csv
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from map_corpus import MapCorpus
+from map_gen import generate_map
+from oracle import regret, solve_maps
+from prolog_pool import PrologWorkerPool
+from prolog_runner import MAX_ROUNDS, PROLOG_TIMEOUT, run_agent_game
+from world_engine import parse_trace_rounds
+
+MAP_MAX_TRIES = 10000
+CSV_FIELDS = [
+    "seed",
+    "size",
+    "result",
+    "score",
+    "time",
+    "steps",
+    "wall_time",
+    "best_score",
+    "regret",
+]
+
+
+def summarize_trace(trace):
+    """
+    Kết quả của một ván từ nội dung kb.txt: dừng ở vòng kết thúc đầu tiên
+    (sau khi thua, Prolog quay lui và có thể in thêm vòng).
+    """
+    rounds = parse_trace_rounds(trace)
+    if not rounds:
+        return {"result": "error", "score": None, "time": None, "steps": 0}
+    for i, info in enumerate(rounds):
+        if info["end_status"] != "playing":
+            # Hết ngân sách giữa vòng: điểm và thời gian là của vòng trước
+            scored = info if info["score"] is not None or i == 0 else rounds[i - 1]
+            return {
+                "result": info["end_status"],
+                "score": scored["score"],
+                "time": scored["time"],
+                "steps": i + 1,
+            }
+    last = rounds[-1]
+    return {
+        "result": "unfinished",
+        "score": last["score"],
+        "time": last["time"],
+        "steps": len(rounds),
+    }
+
+
+def seeded_map(seed, size, counts=None):
+    """
+    Sinh lại bản đồ từ (seed, size); None nếu bộ sinh bế tắc. counts =
+    (số wumpus, số pit) như generate_map, vd. lấy từ index của map_corpus.
+    """
+    try:
+        return generate_map(size, random.Random(seed), max_tries=MAP_MAX_TRIES, counts=counts)
+    except RuntimeError:
+        # Bộ sinh bản đồ gốc có thể bế tắc (hết ô hợp lệ); ghi nhận và bỏ qua
+        return None
+
+
+def game_row(seed, size, run):
+    if run is None:
+        summary = {"result": "bad_map", "score": None, "time": None, "steps": 0}
+        wall_time = 0.0
+    elif run["timed_out"]:
+        summary = {"result": "timeout", "score": None, "time": None, "steps": 0}
+        wall_time = run["wall_time"]
+    else:
+        summary = summarize_trace(run["trace"])
+        wall_time = run["wall_time"]
+    return {"seed": seed, "size": size, **summary, "wall_time": round(wall_time, 4)}
+
+
+def task_map(task):
+    """
+    Bản đồ của một ván: lấy sẵn từ kho, hoặc sinh lại từ (seed, size).
+    """
+    seed, size, _, world_map = task
+    return world_map if world_map is not None else seeded_map(seed, size)
+
+
+def corpus_tasks(path, sizes, games_per_size, timeout):
+    corpus = MapCorpus(path)
+    tasks = []
+    for size in sizes:
+        indices = corpus.select(size=size, limit=games_per_size)
+        seeds = corpus.index["seed"][indices].tolist()
+        for seed, world_map in zip(seeds, corpus.maps(indices)):
+            tasks.append((seed, size, timeout, world_map))
+    return tasks
+
+
+def oracle_scores(tasks, max_rounds=MAX_ROUNDS):
+    """
+    {seed: kết quả oracle} cho các bản đồ của giải, giải theo lô trong tiến
+    trình chính (bản đồ sinh lại được từ seed nên tiến trình con không cần).
+    """
+    seeds, maps = [], []
+    for task in tasks:
+        world_map = task_map(task)
+        if world_map:
+            seeds.append(task[0])
+            maps.append(world_map)
+    return dict(zip(seeds, solve_maps(maps, max_rounds)))
+
+
+def unsolvable_row(seed, size):
+    return {
+        "seed": seed,
+        "size": size,
+        "result": "unsolvable",
+        "score": None,
+        "time": None,
+        "steps": 0,
+        "wall_time": 0.0,
+    }
+
+
+def with_oracle(row, oracle):
+    best = oracle["best_score"] if oracle else None
+    row["best_score"] = best
+    row["regret"] = regret(best, row["score"])
+    return row
+
+
+def play_seeded_game(task, max_rounds=MAX_ROUNDS, max_inferences=None):
+    """
+    Chạy trong tiến trình con: lấy bản đồ của ván rồi cho agent chơi.
+    """
+    seed, size, timeout, _ = task
+    world_map = task_map(task)
+    run = (
+        run_agent_game(
+            world_map, timeout=timeout, max_rounds=max_rounds, max_inferences=max_inferences
+        )
+        if world_map
+        else None
+    )
+    return game_row(seed, size, run)
+
+
+def play_warm(tasks, workers, timeout, max_rounds=MAX_ROUNDS, max_inferences=None):
+    """
+    Chơi các ván trên pool worker Prolog chạy sẵn thay vì mỗi ván một swipl.
+    """
+    with PrologWorkerPool(
+        size=workers, timeout=timeout, max_rounds=max_rounds, max_inferences=max_inferences
+    ) as pool:
+        pending = []
+        for task in tasks:
+            seed, size = task[:2]
+            world_map = task_map(task)
+            future = pool.submit(world_map) if world_map else None
+            pending.append((seed, size, future))
+        for seed, size, future in pending:
+            yield game_row(seed, size, future.result() if future else None)
+        stats = pool.stats()
+    print(
+        f"Pool: {stats['workers']} worker, {stats['restarts']} lần khởi động lại, "
+        f"độ trễ trung bình {stats['latency_mean']:.3f}s"
+    )
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    k = min(len(sorted_values) - 1, max(0, int(round(q / 100 * (len(sorted_values) - 1)))))
+    return sorted_values[k]
+
+
+def print_summary(rows, elapsed):
+    latencies = sorted(r["wall_time"] for r in rows)
+    print(f"Tổng số ván: {len(rows)} trong {elapsed:.2f}s")
+    print(f"Throughput: {len(rows) / elapsed if elapsed > 0 else 0:.1f} ván/giây")
+    print(
+        "Độ trễ (s): "
+        + ", ".join(f"p{q}={percentile(latencies, q):.3f}" for q in (50, 90, 95, 99))
+        + f", max={latencies[-1] if latencies else 0:.3f}"
+    )
+    for size in sorted({r["size"] for r in rows}):
+        size_rows = [r for r in rows if r["size"] == size]
+        counts = {}
+        for r in size_rows:
+            counts[r["result"]] = counts.get(r["result"], 0) + 1
+        results = ", ".join(f"{k}={v}" for k, v in sorted(counts.items()))
+        regrets = [r["regret"] for r in size_rows if r["regret"] is not None]
+        if regrets:
+            results += f"; regret TB={sum(regrets) / len(regrets):.1f}"
+        print(f"  {size}x{size}: {results}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--games-per-size", type=int, default=100)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[4, 5, 6, 7, 8])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument(
+        "--timeout", type=float, default=PROLOG_TIMEOUT, help="giây thời gian thực mỗi ván"
+    )
+    parser.add_argument("--max-rounds", type=int, default=MAX_ROUNDS)
+    parser.add_argument(
+        "--max-inferences", type=int, help="số inference tối đa mỗi ván (mặc định không giới hạn)"
+    )
+    parser.add_argument("--out", default="tournament.csv")
+    parser.add_argument(
+        "--warm", action="store_true", help="dùng pool worker Prolog chạy sẵn"
+    )
+    parser.add_argument("--corpus", help="thư mục kho bản đồ (map_corpus.py build)")
+    parser.add_argument(
+        "--solvable-only",
+        action="store_true",
+        help="bỏ qua bản đồ oracle cho là không thắng được mà không mạo hiểm",
+    )
+    args = parser.parse_args()
+
+    if args.corpus:
+        tasks = corpus_tasks(args.corpus, args.sizes, args.games_per_size, args.timeout)
+    else:
+        tasks = []
+        for size in args.sizes:
+            for i in range(args.games_per_size):
+                tasks.append((args.seed + len(tasks), size, args.timeout, None))
+
+    started = time.perf_counter()
+    oracle = oracle_scores(tasks, args.max_rounds)
+    skipped = []
+    if args.solvable_only:
+        skipped = [t for t in tasks if t[0] in oracle and not oracle[t[0]]["solvable"]]
+        tasks = [t for t in tasks if t[0] not in oracle or oracle[t[0]]["solvable"]]
+
+    rows = []
+    with open(args.out, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+        writer.writeheader()
+
+        def record(row):
+            row = with_oracle(row, oracle.get(row["seed"]))
+            writer.writerow(row)
+            rows.append(row)
+
+        for seed, size, *_ in skipped:
+            record(unsolvable_row(seed, size))
+        if args.warm:
+            for row in play_warm(
+                tasks, args.workers, args.timeout, args.max_rounds, args.max_inferences
+            ):
+                record(row)
+        elif tasks:
+            play = partial(
+                play_seeded_game, max_rounds=args.max_rounds, max_inferences=args.max_inferences
+            )
+            with ProcessPoolExecutor(max_workers=args.workers) as pool:
+                chunksize = max(1, len(tasks) // (args.workers * 8))
+                for row in pool.map(play, tasks, chunksize=chunksize):
+                    record(row)
+    elapsed = time.perf_counter() - started
+
+    print(f"Đã ghi {args.out}")
+    print_summary(rows, elapsed)
+
+
+if __name__ == "__main__":
+    main()
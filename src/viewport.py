@@ -0,0 +1,209 @@
+"""
+Khung nhìn (camera) lên lưới bản đồ, dùng chung cho màn hình cấu hình
+(config.py) và màn hình mô phỏng (wumpus_ui.py).
+
+- Camera chỉ hiện trọn ô: góc trên trái là ô (col0, row0) của lưới Pygame,
+  mỗi ô zoom pixel. Các hàm vẽ chỉ duyệt ô nằm trong khung (visible_mask).
+- Camera theo agent (follow) cho tới khi người dùng tự kéo khung (pan).
+- Thu nhỏ dưới SPRITE_MIN_CELL pixel / ô thì vẽ ô màu (tile_surface) thay
+  cho hình PNG; dưới LABEL_MIN_CELL thì bỏ nhãn tọa độ.
+
+Tọa độ Prolog [x, y] (y hướng lên) ứng với cột x - 1, hàng world_dim - y.
+"""
+from render_cache import lazy_import
+
+pygame = lazy_import("pygame")
+
+ZOOM_LEVELS = (4, 6, 8, 12, 16, 24, 32, 40, 48, 56, 70, 80, 96)
+SPRITE_MIN_CELL = 24
+LABEL_MIN_CELL = 48
+VIEW_CELLS = 8  # khung nhìn rộng tối đa 8 ô ở mức zoom mặc định
+FOLLOW_MARGIN = 1  # số ô giữ giữa agent và mép khung khi theo agent
+
+
+class Camera:
+    """
+    Khung nhìn world_dim x world_dim ô vào vùng màn hình view (pygame.Rect).
+    """
+
+    def __init__(self, view, world_dim, zoom):
+        self.view = pygame.Rect(view)
+        self.world_dim = world_dim
+        self.col0 = 0
+        self.row0 = 0
+        self.following = True
+        self._visible = None
+        self.set_zoom(zoom)
+
+    @classmethod
+    def for_grid(cls, origin, world_dim, cell_size):
+        """
+        Camera có khung rộng min(world_dim, VIEW_CELLS) ô cell_size pixel,
+        nên bản đồ nhỏ vẫn hiện đủ như trước.
+        """
+        side = min(world_dim, VIEW_CELLS) * cell_size
+        return cls((origin[0], origin[1], side, side), world_dim, cell_size)
+
+    @property
+    def detailed(self):
+        return self.zoom >= SPRITE_MIN_CELL
+
+    @property
+    def labels(self):
+        return self.zoom >= LABEL_MIN_CELL
+
+    @property
+    def rect(self):
+        """Vùng màn hình của các ô đang hiện."""
+        return pygame.Rect(self.view.x, self.view.y, self.cols * self.zoom, self.rows * self.zoom)
+
+    def state(self):
+        return (self.world_dim, self.zoom, self.col0, self.row0)
+
+    def _clamp(self):
+        self.col0 = max(0, min(self.col0, self.world_dim - self.cols))
+        self.row0 = max(0, min(self.row0, self.world_dim - self.rows))
+
+    def set_zoom(self, zoom, anchor=None):
+        """
+        Đổi cỡ ô; ô anchor (Prolog) giữ gần vị trí tương đối cũ trong khung.
+        """
+        if anchor is not None:
+            col, row = self.grid_pos(anchor)
+            frac_x = (col - self.col0 + 0.5) / self.cols
+            frac_y = (row - self.row0 + 0.5) / self.rows
+        self.zoom = zoom
+        self.cols = max(1, min(self.world_dim, self.view.w // zoom))
+        self.rows = max(1, min(self.world_dim, self.view.h // zoom))
+        if anchor is not None:
+            self.col0 = col - int(frac_x * self.cols)
+            self.row0 = row - int(frac_y * self.rows)
+        self._clamp()
+
+    def zoom_step(self, steps, anchor=None):
+        """
+        Lên / xuống steps mức trong ZOOM_LEVELS; False nếu đã ở mức cuối.
+        """
+        levels = sorted(set(ZOOM_LEVELS) | {self.zoom})
+        index = max(0, min(len(levels) - 1, levels.index(self.zoom) + steps))
+        if levels[index] == self.zoom:
+            return False
+        self.set_zoom(levels[index], anchor)
+        return True
+
+    def pan(self, dcol, drow):
+        """Người dùng tự kéo khung: dừng theo agent."""
+        self.following = False
+        self.col0 += dcol
+        self.row0 += drow
+        self._clamp()
+
+    def center_on(self, loc):
+        col, row = self.grid_pos(loc)
+        self.col0 = col - self.cols // 2
+        self.row0 = row - self.rows // 2
+        self._clamp()
+
+    def follow(self, loc, margin=FOLLOW_MARGIN):
+        """
+        Dời khung ít nhất có thể để ô loc cách mép khung >= margin ô.
+        """
+        if not self.following or not loc:
+            return
+        col, row = self.grid_pos(loc)
+        margin_x = min(margin, (self.cols - 1) // 2)
+        margin_y = min(margin, (self.rows - 1) // 2)
+        self.col0 = min(max(self.col0, col + margin_x - self.cols + 1), col - margin_x)
+        self.row0 = min(max(self.row0, row + margin_y - self.rows + 1), row - margin_y)
+        self._clamp()
+
+    def grid_pos(self, loc):
+        return loc[0] - 1, self.world_dim - loc[1]
+
+    def is_visible(self, loc):
+        col, row = self.grid_pos(loc)
+        return (
+            self.col0 <= col < self.col0 + self.cols
+            and self.row0 <= row < self.row0 + self.rows
+        )
+
+    def cell_rect(self, loc):
+        col, row = self.grid_pos(loc)
+        return pygame.Rect(
+            self.view.x + (col - self.col0) * self.zoom,
+            self.view.y + (row - self.row0) * self.zoom,
+            self.zoom,
+            self.zoom,
+        )
+
+    def cell_at(self, pos):
+        """Ô Prolog [x, y] dưới điểm pos trên màn hình, None nếu ngoài lưới."""
+        if not self.rect.collidepoint(pos):
+            return None
+        col = self.col0 + (pos[0] - self.view.x) // self.zoom
+        row = self.row0 + (pos[1] - self.view.y) // self.zoom
+        return [col + 1, self.world_dim - row]
+
+    def visible_cells(self):
+        """Các ô Prolog đang hiện, theo hàng từ trên xuống."""
+        for row in range(self.row0, self.row0 + self.rows):
+            for col in range(self.col0, self.col0 + self.cols):
+                yield [col + 1, self.world_dim - row]
+
+    def visible_mask(self):
+        """
+        Bitmask (bit (y - 1) * world_dim + (x - 1) như kb_grid) của các ô đang hiện.
+        """
+        if self._visible is None or self._visible[0] != self.state():
+            size = self.world_dim
+            row_bits = ((1 << self.cols) - 1) << self.col0
+            mask = 0
+            for row in range(self.row0, self.row0 + self.rows):
+                mask |= row_bits << ((size - 1 - row) * size)
+            self._visible = (self.state(), mask)
+        return self._visible[1]
+
+    def blit_tiles(self, surface, tiles):
+        """
+        Vẽ phần đang hiện của tiles (1 pixel / ô, xem tile_surface) phóng to
+        theo zoom vào camera.rect.
+        """
+        part = tiles.subsurface((self.col0, self.row0, self.cols, self.rows))
+        surface.blit(pygame.transform.scale(part, self.rect.size), self.rect.topleft)
+
+    def blit_grid_lines(self, surface, color):
+        rect = self.rect
+        for i in range(self.cols + 1):
+            x = min(rect.right - 1, rect.x + i * self.zoom)
+            pygame.draw.line(surface, color, (x, rect.y), (x, rect.bottom - 1))
+        for i in range(self.rows + 1):
+            y = min(rect.bottom - 1, rect.y + i * self.zoom)
+            pygame.draw.line(surface, color, (rect.x, y), (rect.right - 1, y))
+
+
+def tile_surface(world_dim, layers, background):
+    """
+    Ảnh world_dim x world_dim pixel, mỗi pixel là màu của một ô (hàng trên
+    cùng là y = world_dim). layers: [(bitmask, màu)], lớp sau đè lớp trước.
+    """
+    cells = world_dim * world_dim
+    tiles = pygame.Surface((world_dim, world_dim))
+    tiles.fill(background)
+    for mask, color in layers:
+        if not mask:
+            continue
+        # Chuỗi nhị phân đảo ngược: byte thứ i là "1" nếu bit i bật
+        bits = format(mask, "b").zfill(cells)[::-1].encode()
+        layer = pygame.image.frombuffer(bits, (world_dim, world_dim), "P")
+        layer.set_palette_at(ord("1"), color)
+        layer.set_colorkey(ord("0"))
+        tiles.blit(layer, (0, 0))
+    # Bit đầu là hàng y = 1, nằm dưới cùng trên màn hình
+    return pygame.transform.flip(tiles, False, True)
+
+
+def cells_mask(world_dim, cells):
+    mask = 0
+    for x, y in cells:
+        mask |= 1 << ((y - 1) * world_dim + (x - 1))
+    return mask
@@ -0,0 +1,328 @@
+"""
+Engine thế giới Wumpus viết bằng NumPy, giữ N bản đồ cùng lúc.
+
+Tái hiện đúng luật của wumpus_agent.pl:
+- isSmelly / isBreezy / isGlittering -> percept_grids() / percepts()
+- update_score: -1 mỗi vòng, -10 khi bắn tên, +1000 khi nhặt vàng
+- điều kiện thắng/thua trong step_pre và giới hạn 100 vòng của take_steps
+
+Chạy trực tiếp để đối chiếu với trace Prolog:
+    python world_engine.py [init_data.txt] [kb.txt]
+"""
+import ast
+import os
+import re
+import sys
+
+import numpy as np
+
+from prolog_runner import MAX_ROUNDS  # số vòng tối đa mặc định của agent
+
+INIT_DATA_PATH = os.path.join(os.path.dirname(__file__), "init_data.txt")
+KB_FILE_PATH = os.path.join(os.path.dirname(__file__), "kb.txt")
+
+START_ARROWS = 10  # arrows(10) trong init_game
+START_POS = (1, 1)
+
+ACTION_MOVE = 0
+ACTION_SHOOT = 1
+ACTION_GRAB = 2
+
+STATUS_PLAYING = 0
+STATUS_WON = 1
+STATUS_LOST_WUMPUS = 2
+STATUS_LOST_PIT = 3
+STATUS_MAX_ROUNDS = 4
+STATUS_NAMES = ("playing", "won", "lost_wumpus", "lost_pit", "max_rounds")
+
+
+def read_init_data(filepath=INIT_DATA_PATH):
+    """
+    Đọc init_data.txt, trả về (world_dim, wumpus_list, pit_list, gold).
+    """
+    with open(filepath, "r", encoding="utf-8") as f:
+        lines = [line.strip().rstrip(".") for line in f if line.strip()]
+    if len(lines) != 4:
+        raise ValueError(f"init_data.txt phải có đúng 4 dòng, nhận được {len(lines)} dòng")
+    return (
+        int(lines[0]),
+        ast.literal_eval(lines[1]),
+        ast.literal_eval(lines[2]),
+        ast.literal_eval(lines[3]),
+    )
+
+
+def _adjacent_any(mask):
+    """
+    Ô nào có ít nhất một ô kề (trên/dưới/trái/phải) thuộc mask.
+    mask có dạng (N, S, S), chỉ số [n, x-1, y-1].
+    """
+    out = np.zeros_like(mask)
+    out[:, 1:, :] |= mask[:, :-1, :]
+    out[:, :-1, :] |= mask[:, 1:, :]
+    out[:, :, 1:] |= mask[:, :, :-1]
+    out[:, :, :-1] |= mask[:, :, 1:]
+    return out
+
+
+class BatchWorld:
+    """
+    N thế giới Wumpus dạng mảng NumPy. Toạ độ dùng quy ước Prolog [X, Y]
+    (bắt đầu từ 1); các mảng lưới được đánh chỉ số [n, X-1, Y-1] và đệm tới
+    kích thước lớn nhất trong batch.
+    """
+
+    def __init__(self, maps, max_rounds=MAX_ROUNDS):
+        """
+        maps: danh sách (world_dim, wumpus_list, pit_list, gold) như init_data.txt.
+        """
+        n = len(maps)
+        sizes = np.array([m[0] for m in maps], dtype=np.int16)
+        side = int(sizes.max()) if n else 0
+        pit = np.zeros((n, side, side), dtype=bool)
+        wumpus = np.zeros((n, side, side), dtype=bool)
+        gold = np.zeros((n, 2), dtype=np.int16)
+        for i, (_, wumpus_list, pit_list, gold_pos) in enumerate(maps):
+            for x, y in wumpus_list:
+                wumpus[i, x - 1, y - 1] = True
+            for x, y in pit_list:
+                pit[i, x - 1, y - 1] = True
+            gold[i] = gold_pos
+        self._setup(sizes, wumpus, pit, gold, max_rounds)
+
+    @classmethod
+    def from_grids(cls, sizes, wumpus, pit, gold, max_rounds=MAX_ROUNDS):
+        """
+        Dựng thẳng từ mảng: sizes (N,), wumpus / pit (N, S, S) bool, gold (N, 2)
+        toạ độ Prolog; không đi qua danh sách Python (xem map_corpus).
+        """
+        world = cls.__new__(cls)
+        world._setup(
+            np.asarray(sizes, dtype=np.int16),
+            np.asarray(wumpus, dtype=bool),
+            np.asarray(pit, dtype=bool),
+            np.asarray(gold, dtype=np.int16),
+            max_rounds,
+        )
+        return world
+
+    def _setup(self, sizes, wumpus, pit, gold, max_rounds):
+        self.n = len(sizes)
+        self.max_rounds = max_rounds
+        self.sizes = sizes
+        self.pit = pit
+        self.wumpus = wumpus
+        self.gold = gold
+        self.breeze = _adjacent_any(self.pit)  # hố không đổi trong cả ván
+        self.reset()
+
+    @classmethod
+    def from_init_data(cls, filepath=INIT_DATA_PATH, **kwargs):
+        return cls([read_init_data(filepath)], **kwargs)
+
+    def reset(self):
+        """
+        Đưa mọi thế giới về trạng thái sau init_game / init_agent.
+        """
+        n = self.n
+        self.agent = np.tile(np.array(START_POS, dtype=np.int16), (n, 1))
+        self.wumpus_alive = self.wumpus.copy()
+        self.stench = _adjacent_any(self.wumpus_alive)
+        self.gold_present = np.ones(n, dtype=bool)
+        self.arrows = np.full(n, START_ARROWS, dtype=np.int16)
+        self.score = np.zeros(n, dtype=np.int32)
+        self.time = np.zeros(n, dtype=np.int32)
+        self.status = np.full(n, STATUS_PLAYING, dtype=np.int8)
+
+    def percept_grids(self):
+        """
+        Lưới (stench, breeze, glitter) cho mọi ô của mọi thế giới, dạng (N, S, S).
+        """
+        glitter = np.zeros_like(self.pit)
+        present = np.nonzero(self.gold_present)[0]
+        glitter[present, self.gold[present, 0] - 1, self.gold[present, 1] - 1] = True
+        return self.stench, self.breeze, glitter
+
+    def percepts(self):
+        """
+        Tri giác [Stench, Breeze, Glitter] tại vị trí agent của từng thế giới,
+        mỗi phần là mảng bool (N,).
+        """
+        idx = np.arange(self.n)
+        ax = self.agent[:, 0] - 1
+        ay = self.agent[:, 1] - 1
+        glitter = self.gold_present & np.all(self.agent == self.gold, axis=1)
+        return self.stench[idx, ax, ay], self.breeze[idx, ax, ay], glitter
+
+    def step(self, actions, targets=None):
+        """
+        Thực hiện một vòng take_steps cho mọi thế giới đang chơi.
+        actions: mảng (N,) gồm ACTION_MOVE / ACTION_SHOOT / ACTION_GRAB.
+        targets: mảng (N, 2) ô đích khi di chuyển hoặc bắn.
+        Trả về mảng status sau vòng.
+        """
+        actions = np.asarray(actions)
+        if targets is None:
+            targets = self.agent
+        targets = np.asarray(targets, dtype=np.int16)
+        idx = np.arange(self.n)
+        active = self.status == STATUS_PLAYING
+
+        move = active & (actions == ACTION_MOVE)
+        self.agent[move] = targets[move]
+
+        # shoot_arrow: giết Wumpus tại ô đích, arrows(0), -10 điểm
+        shoot = active & (actions == ACTION_SHOOT) & (self.arrows > 0)
+        if shoot.any():
+            tx = np.clip(targets[:, 0] - 1, 0, self.pit.shape[1] - 1)
+            ty = np.clip(targets[:, 1] - 1, 0, self.pit.shape[2] - 1)
+            hit = shoot & self.wumpus_alive[idx, tx, ty]
+            self.wumpus_alive[idx[hit], tx[hit], ty[hit]] = False
+            self.arrows[shoot] = 0
+            self.score[shoot] -= 10
+            if hit.any():
+                self.stench[hit] = _adjacent_any(self.wumpus_alive[hit])
+
+        # grab_gold: chỉ thành công khi đứng đúng ô vàng
+        grab = (
+            active
+            & (actions == ACTION_GRAB)
+            & self.gold_present
+            & np.all(self.agent == self.gold, axis=1)
+        )
+        self.gold_present[grab] = False
+        self.score[grab] += 1000
+
+        # update_time, update_score
+        self.time[active] += 1
+        self.score[active] -= 1
+
+        # Kiểm tra thắng/thua theo thứ tự của step_pre
+        ax = self.agent[:, 0] - 1
+        ay = self.agent[:, 1] - 1
+        on_wumpus = self.wumpus_alive[idx, ax, ay]
+        on_pit = self.pit[idx, ax, ay]
+        status = self.status
+        status[active & grab] = STATUS_WON
+        playing = status == STATUS_PLAYING
+        status[playing & on_wumpus] = STATUS_LOST_WUMPUS
+        playing = status == STATUS_PLAYING
+        status[playing & on_pit] = STATUS_LOST_PIT
+        playing = status == STATUS_PLAYING
+        status[playing & (self.time >= self.max_rounds)] = STATUS_MAX_ROUNDS
+        return status
+
+    def status_names(self):
+        return [STATUS_NAMES[s] for s in self.status]
+
+
+# --- Đối chiếu với trace Prolog ---
+def read_trace_rounds(filepath=KB_FILE_PATH):
+    with open(filepath, "r") as f:
+        return parse_trace_rounds(f.read())
+
+
+def parse_trace_rounds(content):
+    """
+    Rút gọn nội dung kb.txt thành các vòng: vị trí đầu vòng, tri giác, hành
+    động, điểm, thời gian và trạng thái kết thúc. Chỉ đọc những dòng cần để
+    đối chiếu, không dựng lại KB như load_and_parse_kb_log.
+    """
+    rounds = []
+    for block in content.split("New Round:")[1:]:
+        info = {
+            "start_location": None,
+            "percepts": None,
+            "action": None,
+            "target": None,
+            "score": None,
+            "time": None,
+            "end_status": "playing",
+        }
+        for line in block.strip().split("\n"):
+            line = line.strip()
+            m = re.match(r"I am at \[(\d+),(\d+)\]", line)
+            if m:
+                info["start_location"] = [int(m.group(1)), int(m.group(2))]
+                continue
+            m = re.search(r"seeing: \[(yes|no),(yes|no),(yes|no)\]", line)
+            if m:
+                info["percepts"] = [g == "yes" for g in m.groups()]
+                continue
+            m = re.match(r"I'm going to: \[(\d+),(\d+)\]", line)
+            if m:
+                info["action"] = ACTION_MOVE
+                info["target"] = [int(m.group(1)), int(m.group(2))]
+                continue
+            m = re.match(r"I shoot an arrow at \[(\d+),(\d+)\]!", line)
+            if m:
+                info["action"] = ACTION_SHOOT
+                info["target"] = [int(m.group(1)), int(m.group(2))]
+                continue
+            if line.startswith("I grab the gold!"):
+                info["action"] = ACTION_GRAB
+            elif line == "WON!" or "GOT THE GOLD" in line:
+                info["end_status"] = "won"
+            elif "Lost: Wumpus eats you!" in line or "eaten by the wumpus!" in line:
+                info["end_status"] = "lost_wumpus"
+            elif "Lost: you fell into the pit!" in line or "fallen into a pit!" in line:
+                info["end_status"] = "lost_pit"
+            elif line.startswith("Error: Maximum steps"):
+                info["end_status"] = "max_rounds"
+            elif line.startswith("Error: Budget exceeded"):
+                info["end_status"] = "budget_exceeded"
+            elif line.startswith("New time:"):
+                info["time"] = int(line.split(":")[1])
+            elif line.startswith("New score:"):
+                info["score"] = int(line.split(":")[1])
+        rounds.append(info)
+    return rounds
+
+
+def verify_trace(init_path=INIT_DATA_PATH, kb_path=KB_FILE_PATH):
+    """
+    Chạy lại các hành động trong kb.txt trên BatchWorld và so sánh tri giác,
+    vị trí, điểm, thời gian và kết quả. Trả về danh sách các điểm sai lệch
+    (rỗng nếu khớp hoàn toàn).
+    """
+    world = BatchWorld.from_init_data(init_path)
+    mismatches = []
+    rounds = read_trace_rounds(kb_path)
+    for i, info in enumerate(rounds):
+        if info["end_status"] == "budget_exceeded":
+            break  # agent hết ngân sách, BatchWorld không có gì để so
+        if info["action"] is None:
+            mismatches.append(f"Vòng {i}: không có hành động trong trace")
+            break
+        pos = world.agent[0].tolist()
+        if info["start_location"] != pos:
+            mismatches.append(f"Vòng {i}: vị trí {info['start_location']} != {pos}")
+        percepts = [bool(p[0]) for p in world.percepts()]
+        if info["percepts"] != percepts:
+            mismatches.append(f"Vòng {i}: tri giác {info['percepts']} != {percepts}")
+
+        target = [info["target"] or pos]
+        world.step([info["action"]], target)
+
+        if info["score"] != int(world.score[0]):
+            mismatches.append(f"Vòng {i}: điểm {info['score']} != {int(world.score[0])}")
+        if info["time"] != int(world.time[0]):
+            mismatches.append(f"Vòng {i}: thời gian {info['time']} != {int(world.time[0])}")
+        status = STATUS_NAMES[world.status[0]]
+        # Khi thua, Prolog quay lui và in lại vòng; chỉ so tới vòng kết thúc đầu tiên
+        if info["end_status"] != "playing" or status != "playing":
+            if info["end_status"] != status:
+                mismatches.append(f"Vòng {i}: kết quả {info['end_status']} != {status}")
+            break
+    return mismatches
+
+
+if __name__ == "__main__":
+    init_path = sys.argv[1] if len(sys.argv) > 1 else INIT_DATA_PATH
+    kb_path = sys.argv[2] if len(sys.argv) > 2 else KB_FILE_PATH
+    problems = verify_trace(init_path, kb_path)
+    if problems:
+        for p in problems:
+            print(p)
+        sys.exit(1)
+    print(f"Khớp với trace Prolog: {kb_path}")
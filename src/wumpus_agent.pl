@@ -6,6 +6,10 @@
 % Prolog program for the Wumpus World
 %------------------------------------------------------------------------------
 % Declaring dynamic methods
+% The agent's knowledge kb_ok/2, kb_pit/2, kb_wumpus/2 and kb_gold/2 is kept
+% location first, e.g. kb_pit([2,1], maybe) with status yes/no/maybe, so a
+% lookup by cell hits the first-argument index (SWI descends into the
+% [X,Y] list) instead of scanning every fact.
 :- dynamic ([
     agent_location/1,
     gold_location/1,
@@ -15,33 +19,351 @@
     visited_cells/1,
     world_size/1,
     wumpus_location/1,
-    isPit/2,
-    isWumpus/2,
-    isGold/2,
-    isOK/2,
+    kb_pit/2,
+    kb_wumpus/2,
+    kb_gold/2,
+    kb_ok/2,
     arrows/1,
     wumpus_status/2,
     known_wumpus_location/1,
-    gold_status/1
+    gold_status/1,
+    hazard_constraint/3,
+    constraint_watch/3
 ]).
 
+:- use_module(library(assoc)).
+:- use_module(library(time)).
+:- use_module(library(statistics)).
+
 %------------------------------------------------------------------------------
 % To start the game
 
 start :-
-    format('DEBUG: Starting...~n', []),
+    begin_verbosity,
+    begin_budget,
+    begin_round_cost,
+    log_debug('DEBUG: Starting...~n', []),
     clear_kb,
-    (tell('kb.txt') ->
-        format('DEBUG: kb.txt opened~n', []),
+    trace_format(Format),
+    trace_file(Format, TraceFile),
+    (tell(TraceFile) ->
+        begin_trace(Format),
+        log_debug('DEBUG: ~w opened~n', [TraceFile]),
         init,
-        format('DEBUG: Initialization complete~n', []),
-        take_steps([], 0),
+        log_debug('DEBUG: Initialization complete~n', []),
+        empty_visits(Visits),
+        play_profiled(play_budgeted(take_steps(Visits, 0))),
+        end_trace,
         told,
-        format('DEBUG: Finished successfully~n', [])
-    ; format('ERROR: Failed to open kb.txt~n', []),
+        log_debug('DEBUG: Finished successfully~n', [])
+    ; format('ERROR: Failed to open ~w~n', [TraceFile]),
       fail
     ).
 
+%------------------------------------------------------------------------------
+% Trace output
+% text (default): English debug prose in kb.txt
+% json (WUMPUS_TRACE=json): one JSON object per event in kb.jsonl, e.g.
+%   {"e":"round","n":0,"at":[1,1]}
+%   {"e":"kb","f":"pit","v":"maybe","at":[2,1]}
+% The prose is then written to a null stream.
+% WUMPUS_TRACE_FILE overrides the file name; 'user' streams the trace to
+% stdout so a reader can follow the game round by round.
+
+trace_format(Format) :-
+    ( getenv('WUMPUS_TRACE', json) -> Format = json ; Format = text ).
+
+trace_file(Format, File) :-
+    ( getenv('WUMPUS_TRACE_FILE', File) -> true
+    ; default_trace_file(Format, File)
+    ).
+
+default_trace_file(text, 'kb.txt').
+default_trace_file(json, 'kb.jsonl').
+
+begin_trace(text) :-
+    nb_setval(trace_stream, none).
+begin_trace(json) :-
+    current_output(Out),
+    nb_setval(trace_stream, Out),
+    open_null_stream(Null),
+    set_output(Null).
+
+end_trace :-
+    nb_getval(trace_stream, Out),
+    ( Out == none ->
+        true
+    ; current_output(Null),
+      set_output(Out),
+      close(Null),
+      nb_setval(trace_stream, none)
+    ).
+
+flush_trace :-
+    flush_output,
+    ( nb_current(trace_stream, S), S \== none -> flush_output(S) ; true ).
+
+emit(Event, Fields) :-
+    ( nb_current(trace_stream, S), S \== none ->
+        emit_to(S, Event, Fields)
+    ; true
+    ).
+
+emit_to(S, Event, Fields) :-
+    format(S, '{"e":"~w"', [Event]),
+    forall(member(K-V, Fields), emit_field(S, K, V)),
+    format(S, '}~n', []).
+
+emit_field(S, K, V) :-
+    ( atom(V) ->
+        json_escape(V, Escaped),
+        format(S, ',"~w":"~w"', [K, Escaped])
+    ; format(S, ',"~w":~w', [K, V])
+    ).
+
+% Atom values can be anything (profiler node names such as \+/1), so
+% backslashes, quotes and control characters are escaped for JSON
+json_escape(Atom, Escaped) :-
+    atom_codes(Atom, Codes),
+    maplist(json_char, Codes, Parts),
+    atomic_list_concat(Parts, Escaped).
+
+json_char(0'", '\\"') :- !.
+json_char(0'\\, '\\\\') :- !.
+json_char(C, Part) :-
+    C < 0x20,
+    !,
+    format(atom(Part), '\\u~|~`0t~16r~4+', [C]).
+json_char(C, Part) :-
+    char_code(Part, C).
+
+%------------------------------------------------------------------------------
+% Trace verbosity (WUMPUS_VERBOSITY)
+% silent: no prose at all (the JSON events of WUMPUS_TRACE=json still go out)
+% events: only the lines the trace readers parse (rounds, percepts, actions,
+%         KB facts they show, time, score and how the game ended)
+% debug (default): every line, as the agent always wrote
+% Below debug the debug lines are not formatted at all.
+
+verbosity_level(silent, 0).
+verbosity_level(events, 1).
+verbosity_level(debug, 2).
+
+begin_verbosity :-
+    ( getenv('WUMPUS_VERBOSITY', Name), verbosity_level(Name, Level) -> true
+    ; verbosity_level(debug, Level)
+    ),
+    nb_setval(wumpus_verbosity, Level).
+
+verbosity(Level) :-
+    ( nb_current(wumpus_verbosity, Current) -> Level = Current
+    ; verbosity_level(debug, Level)
+    ).
+
+log_event(Format, Args) :-
+    ( verbosity(Level), Level >= 1 -> format(Format, Args) ; true ).
+
+log_debug(Format, Args) :-
+    ( verbosity(2) -> format(Format, Args) ; true ).
+
+%------------------------------------------------------------------------------
+% Resource budgets of one game
+% WUMPUS_MAX_ROUNDS    rounds before the game ends as max_rounds (default 100)
+% WUMPUS_MAX_INFERENCES inferences (call_with_inference_limit/3)
+% WUMPUS_MAX_SECONDS   wall-clock seconds (call_with_time_limit/2)
+% The last two are unlimited when unset. Running out of one of them ends the
+% game as budget_exceeded; the trace names the budget and how much was used:
+%   Error: Budget exceeded: inferences (used 1000012 of 1000000)
+%   {"e":"end","status":"budget_exceeded","budget":"inferences",...}
+
+begin_budget :-
+    budget_value('WUMPUS_MAX_ROUNDS', 100, Rounds),
+    budget_value('WUMPUS_MAX_INFERENCES', inf, Inferences),
+    budget_value('WUMPUS_MAX_SECONDS', inf, Seconds),
+    nb_setval(wumpus_budget, budget(Rounds, Inferences, Seconds)).
+
+budget_value(Name, Default, Value) :-
+    ( getenv(Name, Text), atom_number(Text, N), N > 0 ->
+        ( Name == 'WUMPUS_MAX_SECONDS' -> Value = N ; Value is ceiling(N) )
+    ; Value = Default
+    ).
+
+game_budget(Budget) :-
+    ( nb_current(wumpus_budget, Current) -> Budget = Current
+    ; Budget = budget(100, inf, inf)
+    ).
+
+max_rounds(Rounds) :-
+    game_budget(budget(Rounds, _, _)).
+
+play_budgeted(Goal) :-
+    game_budget(budget(_, MaxInferences, MaxSeconds)),
+    statistics(inferences, I0),
+    get_time(T0),
+    catch(within_seconds(MaxSeconds, within_inferences(MaxInferences, Goal, Result)),
+          time_limit_exceeded,
+          Result = time_limit_exceeded),
+    ( Result == inference_limit_exceeded ->
+        statistics(inferences, I1),
+        Used is I1 - I0,
+        budget_exceeded(inferences, Used, MaxInferences)
+    ; Result == time_limit_exceeded ->
+        get_time(T1),
+        Used is round((T1 - T0) * 1000) / 1000,
+        budget_exceeded(seconds, Used, MaxSeconds)
+    ; true
+    ).
+
+within_seconds(inf, Goal) :- !,
+    call(Goal).
+within_seconds(Seconds, Goal) :-
+    call_with_time_limit(Seconds, Goal).
+
+within_inferences(inf, Goal, true) :- !,
+    call(Goal).
+within_inferences(Limit, Goal, Result) :-
+    call_with_inference_limit(Goal, Limit, Result).
+
+budget_exceeded(Budget, Used, Limit) :-
+    log_event('Error: Budget exceeded: ~w (used ~w of ~w)~n', [Budget, Used, Limit]),
+    score(S),
+    time_taken(T),
+    log_debug('Score: ~p,~n Time: ~p~n', [S,T]),
+    emit(end, [status-budget_exceeded, budget-Budget, used-Used, limit-Limit, score-S, time-T]),
+    end_game.
+
+%------------------------------------------------------------------------------
+% Profiling
+% WUMPUS_ROUND_COST=true: every round ends with what it cost the agent
+%   Round cost: 5321 inferences, 1.204 ms
+%   {"e":"cost","n":3,"inferences":5321,"cpu":1.204}
+% WUMPUS_PROFILE=File (start only): the game is also played under the SWI
+% profiler and File gets one JSON object per predicate after a summary, e.g.
+%   {"e":"summary","samples":120,"ticks":130,"time":0.13}
+%   {"e":"pred","name":"ask_KB/2","call":41,"redo":0,"exit":41,"self":4,"total":37}
+% self / total are profiler ticks spent in the predicate alone / with its
+% callees.
+
+begin_round_cost :-
+    ( ( getenv('WUMPUS_ROUND_COST', true) ; getenv('WUMPUS_PROFILE', _) ) ->
+        nb_setval(round_cost, true)
+    ; nb_setval(round_cost, false)
+    ).
+
+round_cost_start :-
+    ( nb_current(round_cost, true) ->
+        statistics(inferences, I),
+        statistics(cputime, T),
+        nb_setval(round_cost_start, I-T)
+    ; true
+    ).
+
+round_cost_end(Steps) :-
+    ( nb_current(round_cost, true), nb_current(round_cost_start, I0-T0) ->
+        statistics(inferences, I1),
+        statistics(cputime, T1),
+        Inferences is I1 - I0,
+        Ms is round((T1 - T0) * 1000000) / 1000,
+        log_event('Round cost: ~w inferences, ~3f ms~n', [Inferences, Ms]),
+        emit(cost, [n-Steps, inferences-Inferences, cpu-Ms])
+    ; true
+    ).
+
+% end_game throws game_over instead of halting, so the profile is written
+play_profiled(Goal) :-
+    ( getenv('WUMPUS_PROFILE', File) ->
+        nb_setval(wumpus_serving, true),
+        ( setup_call_cleanup(
+              ( reset_profiler, profiler(_, cputime) ),
+              catch(Goal, game_over, true),
+              profiler(_, false))
+        -> Played = true
+        ; Played = false
+        ),
+        write_profile(File),
+        Played == true
+    ; call(Goal)
+    ).
+
+write_profile(File) :-
+    profile_data(Data),
+    get_dict(summary, Data, Summary),
+    get_dict(nodes, Data, Nodes),
+    setup_call_cleanup(
+        open(File, write, S),
+        ( profile_fields(Summary, [samples-samples, ticks-ticks, time-time], SummaryFields),
+          emit_to(S, summary, SummaryFields),
+          forall(member(Node, Nodes), write_profile_node(S, Node))
+        ),
+        close(S)).
+
+write_profile_node(S, Node) :-
+    get_dict(predicate, Node, Pred),
+    ( Pred = user:PI -> true ; PI = Pred ),
+    format(atom(Name), '~w', [PI]),
+    profile_fields(Node, [call-call, redo-redo, exit-exit, self-ticks_self], Fields),
+    node_value(Node, ticks_self, Self),
+    node_value(Node, ticks_siblings, Siblings),
+    Total is Self + Siblings,
+    append([name-Name|Fields], [total-Total], AllFields),
+    emit_to(S, pred, AllFields).
+
+profile_fields(Dict, Keys, Fields) :-
+    findall(Field-V, (member(Field-Key, Keys), node_value(Dict, Key, V)), Fields).
+
+node_value(Dict, Key, Value) :-
+    ( get_dict(Key, Dict, V) -> Value = V ; Value = 0 ).
+
+%------------------------------------------------------------------------------
+% Worker mode: consult once, play many games read from stdin
+%   swipl -q -s wumpus_agent.pl -g serve -t halt
+% Each request is a term game(WorldSize, WumpusList, PitList, GoldPos).
+% The trace of the game is streamed to stdout (flushed every round) and
+% followed by '%%END_GAME%%'.
+
+serve :-
+    nb_setval(wumpus_serving, true),
+    prompt(_, ''),
+    repeat,
+    read(user_input, Request),
+    ( Request == end_of_file ->
+        !
+    ; serve_request(Request),
+      fail
+    ).
+
+serve_request(game(WorldSize, WumpusList, PitList, GoldPos)) :-
+    !,
+    clear_kb,
+    begin_verbosity,
+    begin_budget,
+    begin_round_cost,
+    trace_format(Format),
+    begin_trace(Format),
+    ( catch(play_game(WorldSize, WumpusList, PitList, GoldPos), E,
+            ( E == game_over -> true ; format('ERROR: ~q~n', [E]) ))
+    -> true
+    ; format('Error: Game failed~n', [])
+    ),
+    end_trace,
+    format(user_output, '~n%%END_GAME%%~n', []),
+    flush_output(user_output).
+serve_request(Request) :-
+    format(user_output, 'ERROR: Unknown request ~q~n%%END_GAME%%~n', [Request]),
+    flush_output(user_output).
+
+play_game(WorldSize, WumpusList, PitList, GoldPos) :-
+    init_world(WorldSize, WumpusList, PitList, GoldPos),
+    empty_visits(Visits),
+    play_budgeted(take_steps(Visits, 0)).
+
+% A finished game halts the process, unless we are serving many games
+end_game :-
+    ( nb_current(wumpus_serving, true) ->
+        throw(game_over)
+    ; halt
+    ).
+
 clear_kb :-
     % Xóa toàn bộ các facts động (KB cũ)
     retractall(agent_location(_)),
@@ -52,20 +374,22 @@ clear_kb :-
     retractall(visited_cells(_)),
     retractall(world_size(_)),
     retractall(wumpus_location(_)),
-    retractall(isPit(_, _)),
-    retractall(isWumpus(_, _)),
-    retractall(isGold(_, _)),
-    retractall(isOK(_, _)),
+    retractall(kb_pit(_, _)),
+    retractall(kb_wumpus(_, _)),
+    retractall(kb_gold(_, _)),
+    retractall(kb_ok(_, _)),
     retractall(arrows(_)),
     retractall(wumpus_status(_, _)),
     retractall(known_wumpus_location(_)),
-    retractall(gold_status(_)).
+    retractall(gold_status(_)),
+    retractall(hazard_constraint(_, _, _)),
+    retractall(constraint_watch(_, _, _)).
 
 
 %------------------------------------------------------------------------------
 % Scheduling simulation:
 
-step_pre(VisitedList, Steps) :-
+step_pre(Visits, Steps) :-
     agent_location(AL),
     wumpus_location(WL),
     pit_location(PL),
@@ -75,77 +399,99 @@ step_pre(VisitedList, Steps) :-
     gold_status(GS),
     % Check for loss or win conditions
     ( GS = grabbed ->
-        writeln('WON!'),
-        format('Score: ~p,~n Time: ~p~n', [S,T])
+        log_event('WON!~n', []),
+        log_debug('Score: ~p,~n Time: ~p~n', [S,T]),
+        emit(end, [status-won, score-S, time-T])
     ; AL=WL, WS=alive ->
-        format('Lost: Wumpus eats you!~n', []),
-        format('Score: ~p,~n Time: ~p~n', [S,T])
+        log_event('Lost: Wumpus eats you!~n', []),
+        log_debug('Score: ~p,~n Time: ~p~n', [S,T]),
+        emit(end, [status-lost_wumpus, score-S, time-T])
     ; AL=PL ->
-        format('Lost: you fell into the pit!~n', []),
-        format('Score: ~p,~n Time: ~p~n', [S,T])
-    ; take_steps(VisitedList, Steps)
+        log_event('Lost: you fell into the pit!~n', []),
+        log_debug('Score: ~p,~n Time: ~p~n', [S,T]),
+        emit(end, [status-lost_pit, score-S, time-T])
+    ; take_steps(Visits, Steps)
     ).
 
-take_steps(VisitedList, Steps) :-
-    Steps < 100,
+take_steps(Visits, Steps) :-
+    max_rounds(MaxRounds),
+    Steps < MaxRounds,
     NewSteps is Steps + 1,
-    format('~n~n~n', []),
+    log_debug('~n~n~n', []),
     agent_location(AL),
-    format('New Round: I am at ~p and I have visited ~p~n', [AL,VisitedList]),
-
-    retractall( isOK(_, AL) ),
-    assert( isOK(yes, AL) ),
-    retractall( isPit(_, AL) ),
-    assert( isPit(no, AL) ),
-    retractall( isWumpus(_, AL) ),
-    assert( isWumpus(no, AL) ),
-    retractall( isGold(_, AL) ),
-    assert( isGold(no, AL) ),
+    visited_list(Visits, VisitedList),
+    log_event('New Round: I am at ~p', [AL]),
+    log_debug(' and I have visited ~p', [VisitedList]),
+    log_event('~n', []),
+    emit(round, [n-Steps, at-AL]),
+    round_cost_start,
+
+    retractall( kb_ok(AL, _) ),
+    assert( kb_ok(AL, yes) ),
+    retractall( kb_pit(AL, _) ),
+    assert( kb_pit(AL, no) ),
+    retractall( kb_wumpus(AL, _) ),
+    assert( kb_wumpus(AL, no) ),
+    retractall( kb_gold(AL, _) ),
+    assert( kb_gold(AL, no) ),
+    learned_free(pit, AL),
+    learned_free(wumpus, AL),
 
     make_percept_sentence(Perception),
-    format('I\'m in ~p, seeing: ~p~n', [AL,Perception]),
+    log_event('I\'m in ~p, seeing: ~p~n', [AL,Perception]),
+    Perception = [Stench,Breeze,Glitter],
+    emit(percept, [stench-Stench, breeze-Breeze, glitter-Glitter]),
 
-    update_KB(Perception, VisitedList),
-    VL = [AL|VisitedList],
+    update_KB(Perception, Visits),
+    add_visit(AL, Visits, VL),
     ( ask_KB(VL, Action) ->
         ( Action = shoot(WL) ->
-            format('I shoot an arrow at ~p!~n', [WL]),
+            log_event('I shoot an arrow at ~p!~n', [WL]),
+            emit(shoot, [at-WL]),
             shoot_arrow(WL)
         ; Action = grab ->
-            format('I grab the gold!~n', []),
+            log_event('I grab the gold!~n', []),
+            emit(grab, [at-AL]),
             grab_gold
-        ; format('I\'m going to: ~p~n', [Action]),
+        ; log_event('I\'m going to: ~p~n', [Action]),
+          emit(move, [to-Action]),
           update_agent_location(Action)
         )
-    ; format('Error: No valid action found~n', []),
+    ; log_event('Error: No valid action found~n', []),
       fail
     ),
 
     update_time,
     update_score,
+    round_cost_end(Steps),
 
     % Check if gold is grabbed after action
     gold_status(GS),
     score(S),
     time_taken(T),
     ( GS = grabbed ->
-        format('Checking standing: Gold grabbed, ending game!~n', []),
+        log_debug('Checking standing: Gold grabbed, ending game!~n', []),
         standing,
-        writeln('WON!'),
-        format('Score: ~p,~n Time: ~p~n', [S,T]),
-        halt
-    ; format('VisitedList = ~p~n', [VL]),
+        log_event('WON!~n', []),
+        log_debug('Score: ~p,~n Time: ~p~n', [S,T]),
+        emit(end, [status-won, score-S, time-T]),
+        end_game
+    ; visited_list(VL, VLCells),
+      log_debug('VisitedList = ~p~n', [VLCells]),
       standing,
+      flush_trace,
       step_pre(VL, NewSteps)
     ).
 
 take_steps(_, Steps) :-
-    Steps >= 100, % Kiểm tra nếu vượt quá 30 bước
-    format('Error: Maximum steps (30) reached, possible infinite loop~n', []),
+    max_rounds(MaxRounds),
+    Steps >= MaxRounds,
+    log_event('Error: Maximum steps (~p) reached, possible infinite loop~n', [MaxRounds]),
     score(S),
     time_taken(T),
-    format('Score: ~p,~n Time: ~p~n', [S,T]),
-    halt.
+    log_debug('Score: ~p,~n Time: ~p~n', [S,T]),
+    emit(end, [status-max_rounds, score-S, time-T]),
+    end_game.
 %------------------------------------------------------------------------------
 % Arrow shooting
 
@@ -155,12 +501,15 @@ shoot_arrow(WL) :-
     assert(wumpus_status(WL, dead)),
     retractall(arrows(_)),
     assert(arrows(0)),
-    retractall(isWumpus(_, WL)),
-    assert(isWumpus(no, WL)),
-    retractall(isOK(_, WL)),
-    assert(isOK(yes, WL)),
-    format('Wumpus at ~p is killed!~n', [WL]),
-    format('KB learn ~p is now OK~n', [WL]),
+    drop_constraints(wumpus, WL),
+    retractall(kb_wumpus(WL, _)),
+    assert(kb_wumpus(WL, no)),
+    retractall(kb_ok(WL, _)),
+    assert(kb_ok(WL, yes)),
+    log_event('Wumpus at ~p is killed!~n', [WL]),
+    log_event('KB learn ~p is now OK~n', [WL]),
+    emit(kill, [at-WL]),
+    emit(kb, [f-ok, v-yes, at-WL]),
     update_score(-10).
 
 %------------------------------------------------------------------------------
@@ -172,9 +521,10 @@ grab_gold :-
     AL = GL,
     retractall( gold_status(_) ),
     assert( gold_status(grabbed) ),
-    retractall( isGold(_, AL) ),
-    assert( isGold(yes, AL) ),
-    format('KB learn ~p - GOT THE GOLD!!!~n', [AL]),
+    retractall( kb_gold(AL, _) ),
+    assert( kb_gold(AL, yes) ),
+    log_event('KB learn ~p - GOT THE GOLD!!!~n', [AL]),
+    emit(kb, [f-gold, v-grabbed, at-AL]),
     update_score(1000).
 
 %------------------------------------------------------------------------------
@@ -185,7 +535,8 @@ update_time :-
     NewTime is T+1,
     retractall( time_taken(_) ),
     assert( time_taken(NewTime) ),
-    format('New time: ~p~n', [NewTime]).
+    log_event('New time: ~p~n', [NewTime]),
+    emit(time, [t-NewTime]).
 
 
 
@@ -194,7 +545,8 @@ update_score(P) :-
     NewScore is S+P,
     retractall( score(_) ),
     assert( score(NewScore) ),
-    format('New score: ~p~n', [NewScore]).
+    log_event('New score: ~p~n', [NewScore]),
+    emit(score, [s-NewScore]).
 
 update_score:-
     update_score(-1).
@@ -202,7 +554,7 @@ update_score:-
 update_agent_location(NewAL) :-
     retractall( agent_location(_) ),
     assert( agent_location(NewAL) ),
-    format('New Agent Location: ~p~n', [NewAL]).
+    log_debug('New Agent Location: ~p~n', [NewAL]).
 
 is_pit(no, X) :-
     \+ pit_location(X).
@@ -218,27 +570,31 @@ standing :-
     agent_location(AL),
     wumpus_status(WL, WS),
     gold_status(GS),
-    format('Checking standing: AL=~p, WL=~p, WS=~p, GS=~p~n', [AL, WL, WS, GS]),
-    ( is_pit(yes, AL) -> format('Agent has fallen into a pit!~n', []), fail
+    log_debug('Checking standing: AL=~p, WL=~p, WS=~p, GS=~p~n', [AL, WL, WS, GS]),
+    ( is_pit(yes, AL) ->
+        log_event('Agent has fallen into a pit!~n', []),
+        emit(end, [status-lost_pit]),
+        fail
     ; stnd(AL, GL, WL, WS, GS)
     ).
 
 stnd(AL, _, AL, alive, _) :-
-    format('YIKES! You\'re eaten by the wumpus!', []),
+    log_event('YIKES! You\'re eaten by the wumpus!', []),
+    emit(end, [status-lost_wumpus]),
     fail.
 stnd(_, _, _, _, grabbed) :-
-    format('AGENT GRABBED THE GOLD!!~n', []),
+    log_event('AGENT GRABBED THE GOLD!!~n', []),
     true.
 stnd(_, _, _, _, _) :-
-    format('There\'s still something to do...~n', []).
+    log_debug('There\'s still something to do...~n', []).
 
 %------------------------------------------------------------------------------
 % Perception
 
 make_percept_sentence([Stench,Breeze,Glitter]) :-
-    format('make_percept_sentence... ~p,~p,~p ~n', [Stench,Breeze,Glitter]),
+    log_debug('make_percept_sentence... ~p,~p,~p ~n', [Stench,Breeze,Glitter]),
     smelly(Stench),
-    format('Stench... ~p ~n', [Stench]),
+    log_debug('Stench... ~p ~n', [Stench]),
     breezy(Breeze),
     glittering(Glitter).
 
@@ -247,17 +603,24 @@ make_percept_sentence([Stench,Breeze,Glitter]) :-
 
 % Thay thế phần init bằng:
 init :-
-    init_game,
     (current_prolog_flag(argv, [InputFile|_]) -> 
         open(InputFile, read, Stream)
     ;
         open('init_data.txt', read, Stream)
     ),
-    read(Stream, WorldSize), assert(world_size(WorldSize)),
-    read(Stream, WumpusList), forall(member(Pos, WumpusList), assert_wumpus(Pos)),
-    read(Stream, PitList), forall(member(Pos, PitList), assert_pit(Pos)),
-    read(Stream, GoldPos), assert(gold_location(GoldPos)),
+    read(Stream, WorldSize),
+    read(Stream, WumpusList),
+    read(Stream, PitList),
+    read(Stream, GoldPos),
     close(Stream),
+    init_world(WorldSize, WumpusList, PitList, GoldPos).
+
+init_world(WorldSize, WumpusList, PitList, GoldPos) :-
+    init_game,
+    assert(world_size(WorldSize)),
+    forall(member(Pos, WumpusList), assert_wumpus(Pos)),
+    forall(member(Pos, PitList), assert_pit(Pos)),
+    assert(gold_location(GoldPos)),
     init_agent,
     init_kb.
 
@@ -273,8 +636,8 @@ init_game :-
     assert( time_taken(0) ),
     retractall( score(_) ),
     assert( score(0) ),
-    retractall( isWumpus(_,_) ),
-    retractall( isGold(_,_) ),
+    retractall( kb_wumpus(_, _) ),
+    retractall( kb_gold(_, _) ),
     retractall( visited_cells(_) ),
     assert( visited_cells([]) ),
     retractall( arrows(_) ),
@@ -285,8 +648,8 @@ init_game :-
     assert( gold_status(present) ).
 
 init_land_fig72 :-
-    retractall( isPit(_, _) ),
-    assert( isPit(maybe,[3,1]) ),
+    retractall( kb_pit(_, _) ),
+    assert( kb_pit([3,1], maybe) ),
     retractall( world_size(_) ),
     assert( world_size(4) ),
     retractall( gold_location(_) ),
@@ -297,8 +660,8 @@ init_land_fig72 :-
     assert( pit_location([3,1]) ).
 
 init_kb :-
-    retractall(isOK(_,_)),
-    assert(isOK(yes, [1,1])).
+    retractall(kb_ok(_, _)),
+    assert(kb_ok([1,1], yes)).
 
 init_agent :-
     retractall( agent_location(_) ),
@@ -350,11 +713,11 @@ breezy(no) :-
 smelly(yes) :-
     agent_location(AL),
     isSmelly(AL),
-    format('smelly=yes ~n', []).
+    log_debug('smelly=yes ~n', []).
 smelly(no) :-
     agent_location(AL),
     \+ isSmelly(AL),
-    format('smelly=no ~n', []).
+    log_debug('smelly=no ~n', []).
 
 glittering(yes) :-
     agent_location(AL),
@@ -366,29 +729,18 @@ glittering(no) :-
 %------------------------------------------------------------------------------
 % Knowledge Base:
 
-update_KB([Stench,Breeze,Glitter], VisitedList) :-
-    format('update_KB ~p~n', [[Stench,Breeze,Glitter]]),
-    add_wumpus_KB(Stench,VisitedList),
-    add_pit_KB(Breeze,VisitedList),
+update_KB([Stench,Breeze,Glitter], Visits) :-
+    log_debug('update_KB ~p~n', [[Stench,Breeze,Glitter]]),
+    add_wumpus_KB(Stench,Visits),
+    add_pit_KB(Breeze,Visits),
     add_gold_KB(Glitter),
-    add_ok_KB([Stench,Breeze], VisitedList),
-    update_known_wumpus_location.
-
-update_known_wumpus_location :-
-    findall(L, (isWumpus(maybe, L), permitted(L)), MaybeWumpus),
-    format('Maybe Wumpus locations: ~p~n', [MaybeWumpus]),
-    ( MaybeWumpus = [WL] ->
-        retractall(known_wumpus_location(_)),
-        assert(known_wumpus_location(WL)),
-        format('KB learn Wumpus is definitely at ~p~n', [WL])
-    ; true
-    ).
+    add_ok_KB([Stench,Breeze], Visits).
 
-add_ok_KB([Stench,Breeze], VisitedList) :-
-    format('add_ok_KB ~p,~p~n', [Stench,Breeze]),
+add_ok_KB([Stench,Breeze], Visits) :-
+    log_debug('add_ok_KB ~p,~p~n', [Stench,Breeze]),
     agent_location([X,Y]),
-    ( not_member([X,Y], VisitedList) ->
-        format('Not visited before= ~p~n', [[X,Y]]),
+    ( not_visited([X,Y], Visits) ->
+        log_debug('Not visited before= ~p~n', [[X,Y]]),
         Z1 is Y+1,
         Z2 is Y-1,
         Z3 is X+1,
@@ -397,114 +749,233 @@ add_ok_KB([Stench,Breeze], VisitedList) :-
         add_ok_KB_item([X,Z2]),
         add_ok_KB_item([Z3,Y]),
         add_ok_KB_item([Z4,Y])
-    ; format('Already visited before= ~p~n', [[X,Y]])
+    ; log_debug('Already visited before= ~p~n', [[X,Y]])
     ).
 
 add_ok_KB_item(L) :-
-    format('add_ok_KB_item ~p~n', [L]),
+    log_debug('add_ok_KB_item ~p~n', [L]),
     ( permitted(L) ->
-        isWumpus(IS_WUMPUS,L),
-        isPit(IS_PIT,L),
+        kb_wumpus(L, IS_WUMPUS),
+        kb_pit(L, IS_PIT),
         assume_ok(IS_WUMPUS,IS_PIT,L)
-    ; format('~p is not permitted~n', [L])
+    ; log_debug('~p is not permitted~n', [L])
     ).
 
-add_wumpus_KB(Stench,VisitedList) :-
-    format('add_wumpus_KB ~p~n', [Stench]),
+add_wumpus_KB(Stench,Visits) :-
+    log_debug('add_wumpus_KB ~p~n', [Stench]),
     agent_location([X,Y]),
-    ( not_member([X,Y], VisitedList) ->
-        format('Not visited before= ~p~n', [[X,Y]]),
+    ( not_visited([X,Y], Visits) ->
+        log_debug('Not visited before= ~p~n', [[X,Y]]),
         Z1 is Y+1,
         Z2 is Y-1,
         Z3 is X+1,
         Z4 is X-1,
-        ( permitted([X,Z1]) -> assume_wumpus(Stench,[X,Z1]) ; format('~p is not permitted~n', [[X,Z1]]) ),
-        ( permitted([X,Z2]) -> assume_wumpus(Stench,[X,Z2]) ; format('~p is not permitted~n', [[X,Z2]]) ),
-        ( permitted([Z3,Y]) -> assume_wumpus(Stench,[Z3,Y]) ; format('~p is not permitted~n', [[Z3,Y]]) ),
-        ( permitted([Z4,Y]) -> assume_wumpus(Stench,[Z4,Y]) ; format('~p is not permitted~n', [[Z4,Y]]) )
-    ; format('Already visited before= ~p~n', [[X,Y]])
+        ( permitted([X,Z1]) -> assume_wumpus(Stench,[X,Z1]) ; log_debug('~p is not permitted~n', [[X,Z1]]) ),
+        ( permitted([X,Z2]) -> assume_wumpus(Stench,[X,Z2]) ; log_debug('~p is not permitted~n', [[X,Z2]]) ),
+        ( permitted([Z3,Y]) -> assume_wumpus(Stench,[Z3,Y]) ; log_debug('~p is not permitted~n', [[Z3,Y]]) ),
+        ( permitted([Z4,Y]) -> assume_wumpus(Stench,[Z4,Y]) ; log_debug('~p is not permitted~n', [[Z4,Y]]) ),
+        ( Stench == yes -> add_constraint(wumpus, [X,Y]) ; true )
+    ; log_debug('Already visited before= ~p~n', [[X,Y]])
     ).
 
-add_pit_KB(Breeze,VisitedList) :-
-    format('add_pit_KB ~p~n', [Breeze]),
+add_pit_KB(Breeze,Visits) :-
+    log_debug('add_pit_KB ~p~n', [Breeze]),
     agent_location([X,Y]),
-    ( not_member([X,Y], VisitedList) ->
-        format('Not visited before= ~p~n', [[X,Y]]),
+    ( not_visited([X,Y], Visits) ->
+        log_debug('Not visited before= ~p~n', [[X,Y]]),
         Z1 is Y+1,
         Z2 is Y-1,
         Z3 is X+1,
         Z4 is X-1,
-        ( permitted([X,Z1]) -> assume_pit(Breeze,[X,Z1]) ; format('~p is not permitted~n', [[X,Z1]]) ),
-        ( permitted([X,Z2]) -> assume_pit(Breeze,[X,Z2]) ; format('~p is not permitted~n', [[X,Z2]]) ),
-        ( permitted([Z3,Y]) -> assume_pit(Breeze,[Z3,Y]) ; format('~p is not permitted~n', [[Z3,Y]]) ),
-        ( permitted([Z4,Y]) -> assume_pit(Breeze,[Z4,Y]) ; format('~p is not permitted~n', [[Z4,Y]]) )
-    ; format('Already visited before= ~p~n', [[X,Y]])
+        ( permitted([X,Z1]) -> assume_pit(Breeze,[X,Z1]) ; log_debug('~p is not permitted~n', [[X,Z1]]) ),
+        ( permitted([X,Z2]) -> assume_pit(Breeze,[X,Z2]) ; log_debug('~p is not permitted~n', [[X,Z2]]) ),
+        ( permitted([Z3,Y]) -> assume_pit(Breeze,[Z3,Y]) ; log_debug('~p is not permitted~n', [[Z3,Y]]) ),
+        ( permitted([Z4,Y]) -> assume_pit(Breeze,[Z4,Y]) ; log_debug('~p is not permitted~n', [[Z4,Y]]) ),
+        ( Breeze == yes -> add_constraint(pit, [X,Y]) ; true )
+    ; log_debug('Already visited before= ~p~n', [[X,Y]])
     ).
 
 add_gold_KB(Glitter) :-
-    format('add_gold_KB ~p~n', [Glitter]),
+    log_debug('add_gold_KB ~p~n', [Glitter]),
     agent_location(L),
     gold_status(GS),
     ( Glitter = yes, GS = present ->
-        retractall( isGold(_, L) ),
-        assert( isGold(yes, L) ),
-        format('KB learn ~p - glitter detected!~n', [L])
-    ; retractall( isGold(_, L) ),
-      assert( isGold(no, L) ),
-      format('KB learn ~p - there is no gold here!~n', [L])
+        retractall( kb_gold(L, _) ),
+        assert( kb_gold(L, yes) ),
+        log_event('KB learn ~p - glitter detected!~n', [L]),
+        emit(kb, [f-gold, v-yes, at-L])
+    ; retractall( kb_gold(L, _) ),
+      assert( kb_gold(L, no) ),
+      log_debug('KB learn ~p - there is no gold here!~n', [L]),
+      emit(kb, [f-gold, v-no, at-L])
     ).
 
 assume_wumpus(no, L) :-
-    retractall( isWumpus(_, L) ),
-    assert( isWumpus(no, L) ),
-    format('KB learn ~p - no Wumpus there!~n', [L]).
+    retractall( kb_wumpus(L, _) ),
+    assert( kb_wumpus(L, no) ),
+    log_event('KB learn ~p - no Wumpus there!~n', [L]),
+    emit(kb, [f-wumpus, v-no, at-L]),
+    learned_free(wumpus, L).
 
 assume_wumpus(yes, L) :-
-    format('KB learn ~p - is it a Wumpus?~n', [L]),
-    ( isWumpus(no, L) ->
-        format('I know there is no Wumpus at ~p!~n',[L])
-    ; retractall( isWumpus(_, L) ),
-      assert( isWumpus(maybe, L) ),
-      format('KB learn ~p - maybe there is a Wumpus!~n', [L])
+    log_debug('KB learn ~p - is it a Wumpus?~n', [L]),
+    ( kb_wumpus(L, no) ->
+        log_debug('I know there is no Wumpus at ~p!~n',[L])
+    ; kb_wumpus(L, yes) ->
+        log_debug('I know there is a Wumpus at ~p!~n',[L])
+    ; all_located(wumpus) ->
+        assume_wumpus(no, L)
+    ; retractall( kb_wumpus(L, _) ),
+      assert( kb_wumpus(L, maybe) ),
+      log_event('KB learn ~p - maybe there is a Wumpus!~n', [L]),
+      emit(kb, [f-wumpus, v-maybe, at-L])
     ).
 
 assume_pit(no, L) :-
-    retractall( isPit(_, L) ),
-    assert( isPit(no, L) ),
-    format('KB learn ~p - there is no Pit there!~n', [L]).
+    retractall( kb_pit(L, _) ),
+    assert( kb_pit(L, no) ),
+    log_event('KB learn ~p - there is no Pit there!~n', [L]),
+    emit(kb, [f-pit, v-no, at-L]),
+    learned_free(pit, L).
 
 assume_pit(yes, L) :-
-    format('KB learn ~p - is it a Pit?~n', [L]),
-    ( isPit(no, L) ->
-        format('I know there is no Pit at ~p!~n',[L])
-    ; retractall( isPit(_, L) ),
-      assert( isPit(maybe, L) ),
-      format('KB learn ~p - maybe there is a Pit!~n', [L])
+    log_debug('KB learn ~p - is it a Pit?~n', [L]),
+    ( kb_pit(L, no) ->
+        log_debug('I know there is no Pit at ~p!~n',[L])
+    ; kb_pit(L, yes) ->
+        log_debug('I know there is a Pit at ~p!~n',[L])
+    ; all_located(pit) ->
+        assume_pit(no, L)
+    ; retractall( kb_pit(L, _) ),
+      assert( kb_pit(L, maybe) ),
+      log_event('KB learn ~p - maybe there is a Pit!~n', [L]),
+      emit(kb, [f-pit, v-maybe, at-L])
     ).
 
 assume_ok(no,no,L) :-
-    format('assume_ok(no,no,L) ~p~n', [L]),
-    retractall( isOK(_, L) ),
-    assert( isOK(yes, L) ),
-    format('KB learn ~p is OK~n', [L]).
+    log_debug('assume_ok(no,no,L) ~p~n', [L]),
+    retractall( kb_ok(L, _) ),
+    assert( kb_ok(L, yes) ),
+    log_event('KB learn ~p is OK~n', [L]),
+    emit(kb, [f-ok, v-yes, at-L]).
 
 assume_ok(maybe,no,L) :-
-    format('assume_ok(maybe,no,L) ~p~n', [L]),
-    retractall( isOK(_, L) ),
-    assert( isOK(no, L) ),
-    format('KB learn ~p is NOT OK~n', [L]).
+    log_debug('assume_ok(maybe,no,L) ~p~n', [L]),
+    retractall( kb_ok(L, _) ),
+    assert( kb_ok(L, no) ),
+    log_debug('KB learn ~p is NOT OK~n', [L]),
+    emit(kb, [f-ok, v-no, at-L]).
 
 assume_ok(no,maybe,L) :-
-    format('assume_ok(no,maybe,L) ~p~n', [L]),
-    retractall( isOK(_, L) ),
-    assert( isOK(no, L) ),
-    format('KB learn ~p is NOT OK~n', [L]).
+    log_debug('assume_ok(no,maybe,L) ~p~n', [L]),
+    retractall( kb_ok(L, _) ),
+    assert( kb_ok(L, no) ),
+    log_debug('KB learn ~p is NOT OK~n', [L]),
+    emit(kb, [f-ok, v-no, at-L]).
 
 assume_ok(maybe,maybe,L) :-
-    format('assume_ok(maybe,maybe,L) ~p~n', [L]),
-    retractall( isOK(_, L) ),
-    assert( isOK(no, L) ),
-    format('KB learn ~p is NOT OK~n', [L]).
+    log_debug('assume_ok(maybe,maybe,L) ~p~n', [L]),
+    retractall( kb_ok(L, _) ),
+    assert( kb_ok(L, no) ),
+    log_debug('KB learn ~p is NOT OK~n', [L]),
+    emit(kb, [f-ok, v-no, at-L]).
+
+assume_ok(W,P,L) :-
+    ( W == yes ; P == yes ), !,
+    log_debug('assume_ok(~p,~p,L) ~p~n', [W,P,L]),
+    retractall( kb_ok(L, _) ),
+    assert( kb_ok(L, no) ),
+    log_debug('KB learn ~p is NOT OK~n', [L]),
+    emit(kb, [f-ok, v-no, at-L]).
+
+%------------------------------------------------------------------------------
+% Constraint propagation
+% A breeze (stench) seen at At is kept as hazard_constraint(At, Hazard, Cells):
+% at least one of Cells, the neighbours of At not known to be free of it,
+% holds a pit (live wumpus). constraint_watch(Cell, Hazard, At) indexes the
+% constraints by cell, so learning that a cell is free only re-examines the
+% constraints it is in:
+%   - a constraint left with one cell makes it a definite hazard;
+%   - once every pit (live wumpus) is located, the other maybe cells are free;
+%   - a cell free of both hazards that was NOT OK becomes OK.
+
+add_constraint(Hazard, At) :-
+    neighbours(At, Ns),
+    include(hazard_candidate(Hazard), Ns, Found),
+    sort(Found, Cells),
+    assert(hazard_constraint(At, Hazard, Cells)),
+    forall(member(C, Cells), assert(constraint_watch(C, Hazard, At))),
+    check_constraint(At, Hazard).
+
+hazard_candidate(Hazard, C) :-
+    permitted(C),
+    \+ hazard_free(Hazard, C).
+
+learned_free(Hazard, C) :-
+    forall(retract(constraint_watch(C, Hazard, At)),
+           ( retract(hazard_constraint(At, Hazard, Cells)),
+             selectchk(C, Cells, Left),
+             assert(hazard_constraint(At, Hazard, Left)),
+             check_constraint(At, Hazard)
+           )),
+    check_safe(C).
+
+check_constraint(At, Hazard) :-
+    ( hazard_constraint(At, Hazard, [C]) ->
+        learned_hazard(Hazard, C)
+    ; true
+    ).
+
+learned_hazard(Hazard, C) :-
+    ( hazard_at(Hazard, C) ->
+        true
+    ; set_hazard(Hazard, C),
+      retractall(kb_ok(C, _)),
+      assert(kb_ok(C, no)),
+      ( all_located(Hazard) ->
+          forall(maybe_hazard(Hazard, L), assume_free(Hazard, L))
+      ; true
+      )
+    ).
+
+set_hazard(pit, C) :-
+    retractall(kb_pit(C, _)),
+    assert(kb_pit(C, yes)),
+    log_event('KB learn ~p - there is definitely a Pit!~n', [C]),
+    emit(kb, [f-pit, v-yes, at-C]).
+set_hazard(wumpus, C) :-
+    retractall(kb_wumpus(C, _)),
+    assert(kb_wumpus(C, yes)),
+    assert(known_wumpus_location(C)),
+    log_event('KB learn Wumpus is definitely at ~p~n', [C]),
+    emit(kb, [f-wumpus, v-known, at-C]).
+
+assume_free(pit, L) :- assume_pit(no, L).
+assume_free(wumpus, L) :- assume_wumpus(no, L).
+
+hazard_at(pit, C) :- kb_pit(C, yes).
+hazard_at(wumpus, C) :- kb_wumpus(C, yes).
+
+all_located(Hazard) :-
+    hazard_count(Hazard, N),
+    aggregate_all(count, hazard_at(Hazard, _), K),
+    K >= N.
+
+check_safe(C) :-
+    ( kb_ok(C, no), kb_pit(C, no), kb_wumpus(C, no) ->
+        retractall(kb_ok(C, _)),
+        assert(kb_ok(C, yes)),
+        log_event('KB learn ~p is OK~n', [C]),
+        emit(kb, [f-ok, v-yes, at-C])
+    ; true
+    ).
+
+% A stench next to the wumpus we kill may have come from it
+drop_constraints(Hazard, C) :-
+    forall(retract(constraint_watch(C, Hazard, At)),
+           ( retract(hazard_constraint(At, Hazard, _)),
+             retractall(constraint_watch(_, Hazard, At))
+           )).
 
 permitted([X,Y]) :-
     world_size(WS),
@@ -514,86 +985,399 @@ permitted([X,Y]) :-
 %------------------------------------------------------------------------------
 % Action selection based on KB
 
-ask_KB(VisitedList, Action) :-
-    format('ask_KB VisitedList=~p - Action=~p~n', [VisitedList,Action]),
+ask_KB(Visits, Action) :-
+    visited_list(Visits, VisitedList),
+    log_debug('ask_KB VisitedList=~p - Action=~p~n', [VisitedList,Action]),
     agent_location(AL),
     gold_location(GL),
     gold_status(GS),
     make_percept_sentence([_,_,Glitter]),
-    format('agent_location=~p, Glitter=~p~n', [AL,Glitter]),
+    log_debug('agent_location=~p, Glitter=~p~n', [AL,Glitter]),
     ( AL = GL, Glitter = yes, GS = present ->
-        format('Glitter detected at ~p, grabbing gold!~n', [AL]),
+        log_debug('Glitter detected at ~p, grabbing gold!~n', [AL]),
         Action = grab
     ; known_wumpus_location(WL),
       adjacent(AL, WL),
       arrows(N), N > 0,
       wumpus_status(WL, alive) ->
-        format('I know the Wumpus is at ~p and I\'m adjacent!~n', [WL]),
+        log_debug('I know the Wumpus is at ~p and I\'m adjacent!~n', [WL]),
         Action = shoot(WL)
-    ; findall([Pref,L], preferred_move(Pref,VisitedList,L), Moves),
-      format('Available moves: ~p~n', [Moves]),
-      select_best_move(Moves, VisitedList, AL, Action),
-      format('Selected move to ~p~n', [Action]),
+    ; planned_move(AL, Visits, Action) ->
+        log_debug('Route to the nearest unexplored safe cell goes through ~p~n', [Action])
+    ; risky_move(AL, Action) ->
+        log_debug('No unexplored safe cell left, taking a risk through ~p~n', [Action])
+    ; findall([Pref,L], preferred_move(Pref,Visits,L), Moves),
+      log_debug('Available moves: ~p~n', [Moves]),
+      select_best_move(Moves, Visits, AL, Action),
+      log_debug('Selected move to ~p~n', [Action]),
       adjacent(Action, AL),
-      format('Action=~p is adjacent to AL=~p~n', [Action,AL])
+      log_debug('Action=~p is adjacent to AL=~p~n', [Action,AL])
     ).
 
-select_best_move(Moves, VisitedList, AL, L) :-
-    length(VisitedList, Len),
+select_best_move(Moves, Visits, AL, L) :-
+    visits_length(Visits, Len),
     ( Moves \= [],
       ( Len < 2, % Match original behavior: prefer visited cell early
         member([no,L], Moves),
-        not_in_cycle(L, VisitedList),
+        not_in_cycle(L, Visits),
         adjacent(L, AL) ->
-          format('Choosing safe visited cell (short history) ~p~n', [L])
+          log_debug('Choosing safe visited cell (short history) ~p~n', [L])
       ; member([yes,L], Moves),
-        not_in_cycle(L, VisitedList),
+        not_in_cycle(L, Visits),
         adjacent(L, AL) ->
-          format('Choosing unvisited safe cell ~p~n', [L])
+          log_debug('Choosing unvisited safe cell ~p~n', [L])
       ; member([no,L], Moves),
-        not_in_cycle(L, VisitedList),
+        not_in_cycle(L, Visits),
         adjacent(L, AL) ->
-          format('Choosing safe visited cell (least visited) ~p~n', [L])
+          log_debug('Choosing safe visited cell (least visited) ~p~n', [L])
       ; member([_,L], Moves),
         adjacent(L, AL) ->
-          format('Choosing safe cell (no better options) ~p~n', [L])
+          log_debug('Choosing safe cell (no better options) ~p~n', [L])
       )
-    ; format('No safe moves, failing~n', []),
+    ; log_debug('No safe moves, failing~n', []),
       fail
     ).
 
-% Avoid cycles by preferring cells not part of a repeating pattern
-not_in_cycle(L, VisitedList) :-
-    count_visits(L, VisitedList, Count),
-    Count < 2,
-    \+ detect_cycle(VisitedList).
+preferred_move(yes,Visits,L) :-
+    kb_ok(L, yes),
+    log_debug('preferred_move - Let\'s see if ~p is OK~n', [L]),
+    not_visited(L,Visits),
+    log_debug('preferred_move - L was not visited before= ~p~n', [L]).
 
-% Count number of times a cell appears in VisitedList
-count_visits(L, VisitedList, Count) :-
-    findall(1, member(L, VisitedList), Ones),
-    length(Ones, Count).
+preferred_move(no,_,L) :-
+    kb_ok(L, yes),
+    log_debug('preferred_move - Let\'s see if ~p is OK~n', [L]).
 
-% Detect cycles (e.g., [A,B,A,B] or [A,B,C,A])
-detect_cycle(VisitedList) :-
-    append(_, [A,B|Rest], VisitedList),
-    member(A, Rest),
-    A \= B.
+%------------------------------------------------------------------------------
+% Route planning
+% While some safe cell has not been visited yet, walk the shortest route over
+% known-safe cells to the nearest one. The distance map (assoc Cell -> steps
+% to the nearest unvisited safe cell) comes from one BFS started at all of
+% those cells at once, so it only depends on the safe and unvisited-safe
+% sets: it is cached under them and reused while the agent walks through
+% cells it has already seen.
+
+planned_move(AL, Visits, Next) :-
+    findall(L, kb_ok(L, yes), Found),
+    sort(Found, Safe),
+    exclude(visited_cell(Visits), Safe, Targets),
+    Targets \= [],
+    route_distances(Safe, Targets, Dist),
+    neighbours(AL, Ns),
+    best_step(Ns, Dist, none, step(_, Next)).
+
+visited_cell(Visits, L) :-
+    \+ not_visited(L, Visits).
+
+route_distances(Safe, Targets, Dist) :-
+    ( nb_current(route_cache, route(Safe, Targets, Cached)) ->
+        Dist = Cached
+    ; pairs_keys_values(SafePairs, Safe, Safe),
+      list_to_assoc(SafePairs, SafeSet),
+      findall(T-0, member(T, Targets), TargetPairs),
+      list_to_assoc(TargetPairs, Dist1),
+      route_bfs(Targets, 1, SafeSet, Dist1, Dist),
+      nb_setval(route_cache, route(Safe, Targets, Dist)),
+      log_debug('Route map recomputed for ~p unexplored safe cells~n', [Targets])
+    ).
 
-preferred_move(yes,VisitedList,L) :-
-    isOK(yes,L),
-    format('preferred_move - Let\'s see if ~p is OK~n', [L]),
-    not_member(L,VisitedList),
-    format('preferred_move - L was not visited before= ~p~n', [L]).
+% One BFS level per call: the listed cells are D - 1 steps away
+route_bfs([], _, _, Dist, Dist).
+route_bfs([C|Cs], D, SafeSet, Dist0, Dist) :-
+    expand_level([C|Cs], D, SafeSet, Dist0, Dist1, [], Next),
+    D1 is D + 1,
+    route_bfs(Next, D1, SafeSet, Dist1, Dist).
+
+expand_level([], _, _, Dist, Dist, Next, Next).
+expand_level([C|Cs], D, SafeSet, Dist0, Dist, Next0, Next) :-
+    neighbours(C, Ns),
+    expand_cell(Ns, D, SafeSet, Dist0, Dist1, Next0, Next1),
+    expand_level(Cs, D, SafeSet, Dist1, Dist, Next1, Next).
+
+expand_cell([], _, _, Dist, Dist, Next, Next).
+expand_cell([N|Ns], D, SafeSet, Dist0, Dist, Next0, Next) :-
+    ( get_assoc(N, SafeSet, _), \+ get_assoc(N, Dist0, _) ->
+        put_assoc(N, Dist0, D, Dist1),
+        Next1 = [N|Next0]
+    ; Dist1 = Dist0,
+      Next1 = Next0
+    ),
+    expand_cell(Ns, D, SafeSet, Dist1, Dist, Next1, Next).
+
+% Neighbour closest to an unvisited safe cell (first one on ties); only
+% safe cells have a distance
+best_step([], _, Best, Best) :-
+    Best \= none.
+best_step([N|Ns], Dist, Best0, Best) :-
+    ( get_assoc(N, Dist, D),
+      ( Best0 = step(D0, _) -> D < D0 ; true ) ->
+        best_step(Ns, Dist, step(D, N), Best)
+    ; best_step(Ns, Dist, Best0, Best)
+    ).
 
-preferred_move(no,_,L) :-
-    isOK(yes,L),
-    format('preferred_move - Let\'s see if ~p is OK~n', [L]).
+% Same order as add_ok_KB: up, down, right, left
+neighbours([X,Y], [[X,Y1], [X,Y2], [X1,Y], [X2,Y]]) :-
+    Y1 is Y+1,
+    Y2 is Y-1,
+    X1 is X+1,
+    X2 is X-1.
 
 %------------------------------------------------------------------------------
-% Utils
+% Frontier risk
+% When no unexplored safe cell can be reached, step towards the frontier
+% cell (next to a known-safe cell, not known OK) least likely to hold a pit
+% or a live wumpus, if that is below certainty.
+%
+% The breeze (stench) constraints are the ones kept by the constraint
+% propagation: "at least one of these cells has one". The models of the
+% constraints are counted exactly per connected group of cells and the
+% groups are combined with the known number of hazards: a model with K
+% hazards on constrained cells has weight C(Rest, N - K), Rest being the
+% unknown cells outside every constraint. Groups above risk_exact_limit
+% cells get a rough 1 / (constraint size) estimate instead. The counts only
+% depend on the constraints, N and Rest, so they are cached under them.
+
+risk_exact_limit(12).
+
+risky_move(AL, Next) :-
+    findall(L, kb_ok(L, yes), Found),
+    sort(Found, Safe),
+    findall(C, frontier_cell(Safe, C), FoundFrontier),
+    sort(FoundFrontier, Frontier),
+    Frontier \= [],
+    hazard_risk(pit, PitRisk),
+    hazard_risk(wumpus, WumpusRisk),
+    findall(Risk-C, (member(C, Frontier), cell_risk(PitRisk, WumpusRisk, C, Risk)), Risks),
+    keysort(Risks, ByRisk),
+    once((
+        member(Risk-Target, ByRisk),
+        Risk < 1.0,
+        sort([Target|Safe], Passable),
+        route_distances(Passable, [Target], Dist),
+        neighbours(AL, Ns),
+        best_step(Ns, Dist, none, step(_, Next))
+    )),
+    log_debug('Least risky frontier cell ~p (risk ~4f)~n', [Target, Risk]).
+
+frontier_cell(Safe, C) :-
+    member(S, Safe),
+    neighbours(S, Ns),
+    member(C, Ns),
+    permitted(C),
+    \+ kb_ok(C, yes).
+
+cell_risk(PitRisk, WumpusRisk, C, Risk) :-
+    hazard_prob(pit, PitRisk, C, P),
+    hazard_prob(wumpus, WumpusRisk, C, W),
+    Risk is 1 - (1 - P) * (1 - W).
+
+hazard_prob(Hazard, risk(Probs, RestProb), C, P) :-
+    ( hazard_free(Hazard, C) -> P = 0.0
+    ; get_assoc(C, Probs, P0) -> P = P0
+    ; P = RestProb
+    ).
+
+hazard_free(pit, C) :- kb_pit(C, no).
+hazard_free(wumpus, C) :- kb_wumpus(C, no).
+
+maybe_hazard(pit, C) :- kb_pit(C, maybe).
+maybe_hazard(wumpus, C) :- kb_wumpus(C, maybe).
+
+hazard_count(pit, N) :-
+    aggregate_all(count, pit_location(_), N).
+hazard_count(wumpus, N) :-
+    aggregate_all(count, wumpus_status(_, alive), N).
+
+hazard_constraints(Hazard, Cons) :-
+    findall(Cells, (hazard_constraint(_, Hazard, Cells), Cells \= []), Found),
+    sort(Found, Cons).
+
+hazard_risk(Hazard, risk(Probs, RestProb)) :-
+    hazard_constraints(Hazard, Cons),
+    hazard_count(Hazard, N),
+    world_size(S),
+    aggregate_all(count, hazard_free(Hazard, _), Free),
+    append(Cons, Flat),
+    sort(Flat, Vars),
+    length(Vars, NVars),
+    Rest is max(0, S * S - Free - NVars),
+    atom_concat(risk_cache_, Hazard, CacheKey),
+    ( nb_current(CacheKey, risk(Cons, N, Rest, Probs0, RestProb0)) ->
+        Probs = Probs0,
+        RestProb = RestProb0
+    ; count_models(Cons, N, Rest, Probs, RestProb),
+      nb_setval(CacheKey, risk(Cons, N, Rest, Probs, RestProb)),
+      log_debug('Risk of ~p recomputed for constraints ~p~n', [Hazard, Cons])
+    ).
 
-not_member(_, []).
-not_member([X,Y], [[U,V]|Ys]) :-
-    ( X=U,Y=V -> fail
-    ; not_member([X,Y], Ys)
-    ).
\ No newline at end of file
+count_models(Cons, N, Rest, Probs, RestProb) :-
+    constraint_components(Cons, Comps),
+    risk_exact_limit(Limit),
+    partition(small_component(Limit), Comps, Small, Large),
+    maplist(component_counts, Small, Counted),
+    foldl(mult_counted, Counted, [0-1], All),
+    poly_weight(All, 0, N, Rest, Total),
+    ( Total > 0 ->
+        findall(Pair, (member(C, Counted), exact_prob(C, Counted, N, Rest, Total, Pair)), Exact),
+        rest_prob(All, N, Rest, Total, RestProb),
+        Rough = Large
+    ; Exact = [],
+      ( Rest > 0 -> RestProb is min(1.0, N / Rest) ; RestProb = 0.0 ),
+      Rough = Comps
+    ),
+    findall(Pair, (member(C, Rough), rough_prob(C, Pair)), Estimated),
+    append(Exact, Estimated, Pairs),
+    list_to_assoc(Pairs, Probs).
+
+small_component(Limit, comp(Vars, _)) :-
+    length(Vars, Len),
+    Len =< Limit.
+
+% Cells linked by constraints, with their constraints
+constraint_components([], []).
+constraint_components([C|Cs], [comp(Vars, Cons)|Comps]) :-
+    grow_component(C, [C], Cs, Vars, Cons, Others),
+    constraint_components(Others, Comps).
+
+grow_component(Vars0, Cons0, Cs, Vars, Cons, Others) :-
+    partition(shares_cell(Vars0), Cs, Touching, Rest),
+    ( Touching == [] ->
+        Vars = Vars0,
+        Cons = Cons0,
+        Others = Rest
+    ; append([Vars0|Touching], Flat),
+      sort(Flat, Vars1),
+      append(Cons0, Touching, Cons1),
+      grow_component(Vars1, Cons1, Rest, Vars, Cons, Others)
+    ).
+
+shares_cell(Vars, C) :-
+    member(X, C),
+    memberchk(X, Vars),
+    !.
+
+% Models of one component: Poly lists K-Models, Cells maps K-Cell to the
+% number of models with K hazards that put one on Cell
+component_counts(comp(Vars, Cons), counted(Vars, Poly, Cells)) :-
+    findall(Hazards, (subset_of(Vars, Hazards), satisfies_all(Cons, Hazards)), Models),
+    findall(K-1, (member(H, Models), length(H, K)), Ones),
+    sum_by_key(Ones, Poly),
+    findall((K-V)-1, (member(H, Models), length(H, K), member(V, H)), CellOnes),
+    sum_by_key(CellOnes, CellPairs),
+    list_to_assoc(CellPairs, Cells).
+
+subset_of([], []).
+subset_of([X|Xs], [X|Ys]) :-
+    subset_of(Xs, Ys).
+subset_of([_|Xs], Ys) :-
+    subset_of(Xs, Ys).
+
+satisfies_all(Cons, Hazards) :-
+    \+ ( member(C, Cons), \+ ( member(X, C), memberchk(X, Hazards) ) ).
+
+sum_by_key(Pairs, Sums) :-
+    keysort(Pairs, Sorted),
+    group_pairs_by_key(Sorted, Groups),
+    findall(K-Sum, (member(K-Vs, Groups), sum_list(Vs, Sum)), Sums).
+
+mult_counted(counted(_, Poly, _), Acc, Product) :-
+    poly_mult(Poly, Acc, Product).
+
+poly_mult(P, Q, R) :-
+    findall(K-C, (member(A-X, P), member(B-Y, Q), K is A + B, C is X * Y), Terms),
+    sum_by_key(Terms, R).
+
+% Sum over M-C in Poly of C * C(Rest, N - Offset - M)
+poly_weight(Poly, Offset, N, Rest, W) :-
+    findall(T, (member(M-C, Poly), Left is N - Offset - M, binomial(Rest, Left, B), T is C * B), Ts),
+    sum_list(Ts, W).
+
+exact_prob(counted(Vars, Poly, Cells), Counted, N, Rest, Total, V-P) :-
+    select(counted(Vars, Poly, Cells), Counted, Others),
+    foldl(mult_counted, Others, [0-1], OthersPoly),
+    member(V, Vars),
+    findall(T,
+            ( member(K-_, Poly),
+              get_assoc(K-V, Cells, Models),
+              poly_weight(OthersPoly, K, N, Rest, W),
+              T is Models * W
+            ),
+            Ts),
+    sum_list(Ts, Weight),
+    P is Weight / Total.
+
+rest_prob(_, _, 0, _, 0.0) :- !.
+rest_prob(All, N, Rest, Total, P) :-
+    findall(T,
+            ( member(K-C, All),
+              Left is N - K,
+              binomial(Rest, Left, B),
+              T is C * B * Left
+            ),
+            Ts),
+    sum_list(Ts, Weight),
+    P is Weight / (Rest * Total).
+
+rough_prob(comp(Vars, Cons), V-P) :-
+    member(V, Vars),
+    findall(Q, (member(C, Cons), memberchk(V, C), length(C, Len), Q is 1 / Len), Qs),
+    max_list(Qs, P).
+
+binomial(N, K, B) :-
+    ( K < 0 -> B = 0
+    ; K > N -> B = 0
+    ; K1 is min(K, N - K),
+      binomial_loop(0, K1, N, 1, B)
+    ).
+
+binomial_loop(I, K, _, B, B) :-
+    I >= K,
+    !.
+binomial_loop(I, K, N, B0, B) :-
+    B1 is B0 * (N - I) // (I + 1),
+    I1 is I + 1,
+    binomial_loop(I1, K, N, B1, B).
+
+%------------------------------------------------------------------------------
+% Visit history
+% visits(Cells, Length, Counts, Cycle):
+%   Cells  - visited cells, most recent first (only printed in the trace)
+%   Counts - assoc Cell -> number of visits
+%   Cycle  - true once Cells holds a repeating pattern, e.g. [A,B,A,B] or
+%            [A,B,C,A]
+% Lookups and updates are O(log n) instead of scanning the list each round.
+
+empty_visits(visits([], 0, Counts, false)) :-
+    empty_assoc(Counts).
+
+visited_list(visits(Cells, _, _, _), Cells).
+
+visits_length(visits(_, Len, _, _), Len).
+
+% Number of times a cell was visited
+count_visits(L, visits(_, _, Counts, _), Count) :-
+    ( get_assoc(L, Counts, C) -> Count = C ; Count = 0 ).
+
+not_visited(L, visits(_, _, Counts, _)) :-
+    \+ get_assoc(L, Counts, _).
+
+% A pattern stays a pattern when cells are added in front, so only the new
+% cell has to be checked: pushing H onto [P|Rest] gives a cycle [H,P|Rest]
+% if H \= P and H is in Rest, i.e. H was visited before.
+add_visit(H, visits(Cells, Len, Counts, Cycle0), visits([H|Cells], Len1, Counts1, Cycle)) :-
+    ( get_assoc(H, Counts, C0) -> true ; C0 = 0 ),
+    ( Cycle0 == true ->
+        Cycle = true
+    ; Cells = [P|_], H \= P, C0 > 0 ->
+        Cycle = true
+    ; Cycle = false
+    ),
+    Len1 is Len + 1,
+    C1 is C0 + 1,
+    put_assoc(H, Counts, C1, Counts1).
+
+% Avoid cycles by preferring cells not part of a repeating pattern
+not_in_cycle(L, Visits) :-
+    count_visits(L, Visits, Count),
+    Count < 2,
+    Visits = visits(_, _, _, false).
@@ -1,27 +1,51 @@
-import asyncio
 import platform
-import pygame
 import os
 import re
 import subprocess
 import shutil
 import ast
+import json
+import queue
+import time
+
+from prolog_pool import END_MARKER, PrologGameProcess, PrologWorker
+import render_cache
+import viewport
+from kb_grid import KnowledgeGrid
+from prolog_runner import PROLOG_TIMEOUT, build_command, kill_timeout, trace_env
+from step_store import StepStore
+
+pygame = render_cache.lazy_import("pygame")  # chỉ nạp khi bắt đầu vẽ, xem init_display()
+asyncio = render_cache.lazy_import("asyncio")  # chỉ cần cho vòng lặp chính
 
 # --- Cấu hình ---
 PROLOG_EXECUTABLE = "swipl"
 PROLOG_SCRIPT = os.path.join(os.path.dirname(__file__), "wumpus_agent.pl") # Cập nhật để sử dụng file Prolog của bạn
 KB_FILE_PATH = os.path.join(os.path.dirname(__file__), "kb.txt")
+KB_JSON_PATH = os.path.join(os.path.dirname(__file__), "kb.jsonl")
+TRACE_FORMAT = "text"  # "json": agent ghi kb.jsonl, đọc bằng load_structured_trace
 INIT_DATA_PATH = os.path.join(os.path.dirname(__file__), "init_data.txt") # Đường dẫn đến file init_data.txt
+USE_WARM_WORKER = True  # Giữ một tiến trình swipl chạy sẵn giữa các lần Reset
+STREAM_TRACE = True  # Phân tích trace khi agent đang chạy, phát lại từ vòng đầu tiên
 
 # --- Thiết lập Pygame ---
-pygame.init()
-pygame.font.init()
-
 # Kích thước màn hình
 SCREEN_WIDTH = 950
 SCREEN_HEIGHT = 700
-screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-pygame.display.set_caption("Wumpus World (Simulated from kb.txt)")
+WINDOW_CAPTION = "Wumpus World (Simulated from kb.txt)"
+
+def open_window():
+    """
+    Đưa cửa sổ về cỡ và tiêu đề của màn hình mô phỏng. Khi chạy từ config.py
+    thì đây là cửa sổ của màn hình cấu hình, chỉ đổi cỡ chứ không tạo mới.
+    """
+    global screen, last_frame_state
+    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    pygame.display.set_caption(WINDOW_CAPTION)
+    last_frame_state = None
+    return screen
+
+screen = None  # Cửa sổ (hoặc Surface của render_batch), có sau init_display()
 
 # Màu sắc
 WHITE = (255, 255, 255)
@@ -35,25 +59,52 @@ LIGHT_BLUE = (173, 216, 230)
 ORANGE = (255, 165, 0)
 PURPLE = (128, 0, 128)
 DIM_COLOR = (0, 0, 0, 150)  # Màu mờ cho các ô chưa thăm
+DIM_TILE_COLOR = (105, 105, 105)  # DIM_COLOR trên nền trắng, cho ô màu khi thu nhỏ
+SAFE_COLOR = (144, 238, 144)
+PIT_COLOR = (139, 69, 19)
+KNOWN_PIT_COLOR = (80, 40, 10)
 
-# Font chữ
-FONT_SMALL = pygame.font.SysFont("arial", 18)
-FONT_MEDIUM = pygame.font.SysFont("arial", 22)
-FONT_LARGE = pygame.font.SysFont("arial", 28)
+# Font chữ, tạo trong init_display()
+FONT_SMALL = None
+FONT_MEDIUM = None
+FONT_LARGE = None
 
 # Cài đặt lưới
 CELL_SIZE = 70
 GRID_MARGIN_X = 50
 GRID_MARGIN_Y = 50
+TILE_GRID_MIN_CELL = 8  # khi thu nhỏ, chỉ kẻ lưới nếu ô >= 8 pixel
 
 # --- Đọc cấu hình từ init_data.txt ---
+scene_world_map = None  # Bản đồ config.py truyền trong bộ nhớ; None: đọc init_data.txt
+
+def set_world(world_map):
+    """
+    Cập nhật các biến toàn cục từ world_map = (world_dim, wumpus, pits, gold).
+    """
+    global WORLD_DIM, initial_agent_pos_prolog, pit_locations_prolog, wumpus_location_prolog, gold_location_prolog
+    world_dim, wumpus_locations, pit_locations, gold_location = world_map
+    WORLD_DIM = world_dim
+    initial_agent_pos_prolog = [1, 1]  # Agent luôn bắt đầu tại [1,1]
+    wumpus_location_prolog = [list(w) for w in wumpus_locations]  # Danh sách các Wumpus
+    pit_locations_prolog = [list(p) for p in pit_locations]
+    gold_location_prolog = list(gold_location)
+
+def load_world():
+    """
+    Bản đồ của ván: bản đồ được truyền vào (scene_world_map) hoặc init_data.txt.
+    """
+    if scene_world_map is not None:
+        set_world(scene_world_map)
+        return True
+    return load_init_data()
+
 def load_init_data():
     """
     Đọc dữ liệu từ init_data.txt để lấy kích thước bản đồ, vị trí Wumpus, hố, và vàng.
     Trả về tuple (world_dim, wumpus_locations, pit_locations, gold_location).
     Nếu đọc thất bại, trả về giá trị mặc định.
     """
-    global WORLD_DIM, initial_agent_pos_prolog, pit_locations_prolog, wumpus_location_prolog, gold_location_prolog
     try:
         with open(INIT_DATA_PATH, "r", encoding="utf-8") as f:
             lines = f.readlines()
@@ -75,11 +126,7 @@ def load_init_data():
         gold_location = ast.literal_eval(lines[3].strip().rstrip("."))
 
         # Cập nhật các biến toàn cục
-        WORLD_DIM = world_dim
-        initial_agent_pos_prolog = [1, 1]  # Agent luôn bắt đầu tại [1,1]
-        wumpus_location_prolog = wumpus_locations  # Danh sách các Wumpus
-        pit_locations_prolog = pit_locations
-        gold_location_prolog = gold_location
+        set_world((world_dim, wumpus_locations, pit_locations, gold_location))
 
         print(f"Đã đọc init_data.txt: world_dim={world_dim}, wumpus={wumpus_locations}, "
               f"pit={pit_locations}, gold={gold_location}")
@@ -137,7 +184,7 @@ def load_image(name, size=(CELL_SIZE - 10, CELL_SIZE - 10)):
                     return surface
 
         image = pygame.image.load(path)
-        image = pygame.transform.scale(image, size)
+        image = pygame.transform.scale(image, size).convert_alpha()
         return image
     except pygame.error as e:
         print(f"Không thể tải hình ảnh: {name} - {e}")
@@ -200,10 +247,27 @@ def load_all_images():
     surf.blit(start_text_render, start_text_rect)
     start_node_img = surf
 
-load_all_images()
+def init_display():
+    """
+    Khởi tạo pygame, cửa sổ, font và hình ảnh ở lần dùng đầu tiên. Import
+    module không khởi tạo gì, để các hàm phân tích trace dùng được trong
+    tiến trình không có màn hình.
+    """
+    global screen, FONT_SMALL, FONT_MEDIUM, FONT_LARGE
+    if FONT_SMALL is not None:
+        return
+    pygame.init()
+    pygame.font.init()
+    FONT_SMALL = pygame.font.SysFont("arial", 18)
+    FONT_MEDIUM = pygame.font.SysFont("arial", 22)
+    FONT_LARGE = pygame.font.SysFont("arial", 28)
+    if screen is None:
+        # config.py đã mở cửa sổ thì dùng lại, chỉ đổi cỡ khi vào màn hình này
+        screen = pygame.display.get_surface() or open_window()
+    load_all_images()
 
 # --- Biến trạng thái trò chơi ---
-simulation_steps_data = []
+simulation_steps_data = StepStore()
 current_step_index = -1
 simulation_agent_pos = list(initial_agent_pos_prolog)
 simulation_agent_path = [list(initial_agent_pos_prolog)]
@@ -213,41 +277,21 @@ simulation_game_status = "init"
 simulation_percepts_current = None
 simulation_wumpus_status = "alive"
 simulation_wumpus_location = list(wumpus_location_prolog)
-safe_locations = []
-maybe_wumpus_locations = []
-no_wumpus_locations = []
-maybe_pit_locations = []
-no_pit_locations = []
-visited_locations = [list(initial_agent_pos_prolog)]
+kb_grid = KnowledgeGrid(WORLD_DIM)  # KB đang hiển thị (safe / maybe / no / visited)
 step_by_step_mode = True
+show_cost_overlay = False  # phím I: số inference của agent ở từng bước
 simulation_running = False
 message_log = [
     "Welcome to Wumpus World (Simulated)! Please press 'Start Sim' to begin."
 ]
 MAX_LOG_LINES = 15
 last_auto_step_time = 0
+prolog_worker = None
+camera = None  # viewport.Camera của lưới, xem grid_camera()
+trace_stream = None
+start_when_ready = False
 
 # --- Hàm hỗ trợ ---
-def prolog_to_grid_coords(prolog_x, prolog_y):
-    """
-    Chuyển tọa độ Prolog ([X,Y]) sang tọa độ lưới Pygame.
-    """
-    grid_col = prolog_x - 1
-    grid_row = WORLD_DIM - prolog_y
-    return grid_col, grid_row
-
-def grid_to_screen_coords(grid_col, grid_row):
-    """
-    Chuyển tọa độ lưới sang tọa độ màn hình Pygame.
-    """
-    screen_x = (
-        GRID_MARGIN_X + grid_col * CELL_SIZE + (CELL_SIZE - agent_img.get_width()) // 2
-    )
-    screen_y = (
-        GRID_MARGIN_Y + grid_row * CELL_SIZE + (CELL_SIZE - agent_img.get_height()) // 2
-    )
-    return screen_x, screen_y
-
 def add_message(msg):
     """
     Thêm thông báo vào log và giới hạn số dòng tối đa.
@@ -280,6 +324,12 @@ def parse_prolog_percepts(percept_str):
     return ["?", "?", "?"]
 
 # --- Thực thi Prolog ---
+def trace_file_path():
+    """
+    File trace agent ghi ra theo TRACE_FORMAT.
+    """
+    return KB_JSON_PATH if TRACE_FORMAT == "json" else KB_FILE_PATH
+
 def find_prolog_executable(name=PROLOG_EXECUTABLE):
     """
     Tìm đường dẫn đến chương trình Prolog (swipl).
@@ -292,11 +342,50 @@ def find_prolog_executable(name=PROLOG_EXECUTABLE):
         add_message(f"Warning: '{name}' not found in PATH. Direct call assumed.")
         return name
 
+def run_prolog_worker():
+    """
+    Chạy ván trên worker Prolog chạy sẵn và ghi trace vào kb.txt.
+    Trả về False nếu worker không dùng được để quay về cách chạy swipl cũ.
+    """
+    global prolog_worker
+    world_map = (
+        WORLD_DIM,
+        wumpus_location_prolog,
+        pit_locations_prolog,
+        gold_location_prolog,
+    )
+    try:
+        if prolog_worker is None or not prolog_worker.is_alive():
+            prolog_worker = PrologWorker(find_prolog_executable(), TRACE_FORMAT, round_cost=True)
+        result = prolog_worker.play(world_map)
+    except OSError as e:
+        add_message(f"Cảnh báo: Không thể dùng worker Prolog: {e}")
+        prolog_worker = None
+        return False
+
+    if result["timed_out"] or result["crashed"] or not result["trace"]:
+        add_message("Cảnh báo: Worker Prolog lỗi hoặc hết thời gian, khởi động lại.")
+        prolog_worker.restart()
+        return False
+
+    trace_path = trace_file_path()
+    try:
+        with open(trace_path, "w") as f:
+            f.write(result["trace"])
+    except OSError as e:
+        add_message(f"LỖI: Không thể ghi {trace_path}: {e}")
+        return False
+    add_message(f"Worker Prolog chơi xong trong {result['wall_time']:.2f}s.")
+    return True
+
 def run_prolog_script():
     """
     Chạy file Prolog và tạo kb.txt.
     """
     global simulation_game_status
+    if USE_WARM_WORKER and run_prolog_worker():
+        return True
+
     prolog_cmd = find_prolog_executable()
     if not prolog_cmd:
         add_message(f"ERROR: Prolog ('{PROLOG_EXECUTABLE}') not found. Please install SWI-Prolog.")
@@ -308,11 +397,17 @@ def run_prolog_script():
         simulation_game_status = "error"
         return False
 
-    command = [prolog_cmd, "-s", PROLOG_SCRIPT, "-g", "start.", "-t", "halt."]
+    command = build_command(prolog_cmd)  # wumpus_agent.qlf nếu đã biên dịch sẵn
     add_message(f"Chạy Prolog: {' '.join(command)}")
+    timeout = kill_timeout(PROLOG_TIMEOUT)
     try:
         result = subprocess.run(
-            command, capture_output=True, text=True, timeout=15, check=False
+            command,
+            capture_output=True,
+            text=True,
+            timeout=timeout,
+            check=False,
+            env=trace_env(TRACE_FORMAT, round_cost=True),
         )
         if result.returncode != 0:
             add_message(f"LỖI: Prolog thoát với mã lỗi {result.returncode}.")
@@ -321,19 +416,20 @@ def run_prolog_script():
             add_message("--- Prolog stderr: ---")
             add_message(result.stderr if result.stderr else "<trống>")
             simulation_game_status = "error"
-            if os.path.exists(KB_FILE_PATH):
+            trace_path = trace_file_path()
+            if os.path.exists(trace_path):
                 try:
-                    with open(KB_FILE_PATH, "w") as f:
+                    with open(trace_path, "w") as f:
                         pass  # Hoặc f.write("") để rõ nghĩa hơn
-                    add_message(f"Đã clear nội dung trong {KB_FILE_PATH} .")
+                    add_message(f"Đã clear nội dung trong {trace_path} .")
                 except OSError as e:
-                    add_message(f"Cảnh báo: Không thể ghi rỗng vào {KB_FILE_PATH}: {e}")
+                    add_message(f"Cảnh báo: Không thể ghi rỗng vào {trace_path}: {e}")
 
             return False
         else:
             add_message("Thực thi Prolog thành công.")
-            if not os.path.exists(KB_FILE_PATH):
-                add_message(f"LỖI: Prolog hoàn tất nhưng không tạo '{KB_FILE_PATH}'.")
+            if not os.path.exists(trace_file_path()):
+                add_message(f"LỖI: Prolog hoàn tất nhưng không tạo '{trace_file_path()}'.")
                 add_message("--- Prolog stdout: ---")
                 add_message(result.stdout if result.stdout else "<trống>")
                 add_message("--- Prolog stderr: ---")
@@ -346,7 +442,7 @@ def run_prolog_script():
         simulation_game_status = "error"
         return False
     except subprocess.TimeoutExpired:
-        add_message("LỖI: Prolog hết thời gian (quá 15 giây).")
+        add_message(f"LỖI: Prolog hết thời gian (quá {timeout} giây).")
         simulation_game_status = "error"
         return False
     except Exception as e:
@@ -355,12 +451,270 @@ def run_prolog_script():
         return False
 
 # --- Phân tích KB.TXT ---
+# Trạng thái dùng chung khi phân tích trace theo từng vòng (đọc cả file hoặc stream).
+# Các danh sách KB được tích luỹ riêng ở đây để việc phát lại (handle_start_press,
+# advance_simulation_step) không ghi đè lên khi trace vẫn đang được đọc.
+trace_parse_state = {}
+
+def reset_trace_parse_state():
+    """
+    Xoá dữ liệu mô phỏng trước khi phân tích một trace mới.
+    """
+    global simulation_steps_data
+    simulation_steps_data = StepStore()
+    trace_parse_state.update(
+        {
+            "wumpus_status": "alive",
+            "wumpus_location": simulation_wumpus_location,
+            "step_info": None,
+            "kb": KnowledgeGrid(WORLD_DIM),
+        }
+    )
+    trace_parse_state["kb"].add("visited_locations", initial_agent_pos_prolog)
+
+def accept_step(step_info):
+    """
+    Thêm bước vào simulation_steps_data nếu đủ dữ liệu.
+    """
+    if (
+        step_info["start_location"]
+        and step_info["percepts"]
+        and (step_info["next_location"] or step_info["action"])
+        and step_info["time"] is not None
+        and step_info["score"] is not None
+    ):
+        simulation_steps_data.append(step_info, trace_parse_state["kb"])
+        return True
+    if step_info["end_status"] == "budget_exceeded" and len(simulation_steps_data):
+        # Agent hết ngân sách giữa vòng: bỏ vòng dở, ván kết thúc ở vòng trước
+        simulation_steps_data.set_fields(
+            -1,
+            end_status="budget_exceeded",
+            messages=simulation_steps_data[-1]["messages"] + step_info["messages"],
+        )
+        return False
+    add_message(
+        f"Cảnh báo: Dữ liệu không đầy đủ cho vòng {len(simulation_steps_data)+1}. Bỏ qua."
+    )
+    print(f"Debug: Dữ liệu bước không hoàn chỉnh: {step_info}")
+    return False
+
+def parse_round_block(round_block):
+    """
+    Phân tích một đoạn 'New Round:' hoàn chỉnh của kb.txt.
+    """
+    current_wumpus_status = trace_parse_state["wumpus_status"]
+    current_wumpus_location = trace_parse_state["wumpus_location"]
+    kb = trace_parse_state["kb"]
+    step_info = {
+        "round": len(simulation_steps_data),
+        "start_location": None,
+        "percepts": None,
+        "action": None,
+        "next_location": None,
+        "score": None,
+        "time": None,
+        "inferences": None,
+        "cpu_ms": None,
+        "end_status": "playing",
+        "wumpus_status": current_wumpus_status,
+        "wumpus_location": current_wumpus_location,
+        "messages": [],
+    }
+
+    lines = round_block.strip().split("\n")
+    agent_at_start = None
+    percepts_at_start = None
+    action_info = None
+    new_time = None
+    new_score = None
+    end_status_in_round = "playing"
+
+    for line in lines:
+        line = line.strip()
+        if line.startswith("I am at"):
+            match = re.search(r"I am at (\[\d+,\d+\])", line)
+            if match:
+                agent_at_start = parse_prolog_coord(match.group(1))
+                step_info["start_location"] = agent_at_start
+                kb.add("visited_locations", agent_at_start)
+
+        elif "seeing:" in line:
+            match = re.search(r"seeing: (\[.*?\])", line)
+            if match:
+                percepts_at_start = parse_prolog_percepts(match.group(1))
+                step_info["percepts"] = percepts_at_start
+
+        elif line.startswith("I'm going to:"):
+            match = re.search(r"I\'m going to: (\[\d+,\d+\])", line)
+            if match:
+                action_target = parse_prolog_coord(match.group(1))
+                action_info = {"type": "move", "target": action_target}
+                step_info["next_location"] = action_target
+                step_info["messages"].append(line)
+
+        elif line.startswith("I shoot an arrow at"):
+            match = re.search(r"I shoot an arrow at (\[\d+,\d+\])!", line)
+            if match:
+                shoot_target = parse_prolog_coord(match.group(1))
+                action_info = {"type": "shoot", "target": shoot_target}
+                step_info["action"] = action_info
+                step_info["messages"].append(line)
+
+        elif line.startswith("I grab the gold!"):
+            action_info = {"type": "grab"}
+            step_info["action"] = action_info
+            step_info["messages"].append(line)
+
+        elif line.startswith("Wumpus at"):
+            match = re.search(r"Wumpus at (\[\d+,\d+\]) is killed!", line)
+            if match:
+                current_wumpus_status = "dead"
+                killed_location = parse_prolog_coord(match.group(1))
+                action_info["result"] = (
+                    "killed"
+                    if action_info and action_info["type"] == "shoot"
+                    else None
+                )
+                step_info["wumpus_status"] = current_wumpus_status
+                # Vòng bắn trúng vẫn hiển thị các ô nghi có Wumpus trước khi xoá
+                # (ảnh chụp riêng của vòng, bỏ đi nếu KB Wumpus còn đổi sau đó)
+                step_info["kb_snapshot"] = {
+                    "maybe_wumpus_locations": kb.masks["maybe_wumpus_locations"],
+                    "known_wumpus_locations": kb.masks["known_wumpus_locations"],
+                }
+                kb.clear("maybe_wumpus_locations")
+                kb.discard("known_wumpus_locations", killed_location)
+                step_info["messages"].append(line)
+
+        elif line.startswith("KB learn") and (
+            "is now OK" in line or "is OK" in line
+        ):
+            match = re.search(r"KB learn (\[\d+,\d+\]) (?:is now OK|is OK)", line)
+            if match:
+                safe_loc = parse_prolog_coord(match.group(1))
+                kb.add("safe_locations", safe_loc)
+                step_info["messages"].append(f"KB learn {match.group(1)} is OK")
+
+        elif line.startswith("KB learn") and "maybe there is a Wumpus" in line:
+            match = re.search(
+                r"KB learn (\[\d+,\d+\]) - maybe there is a Wumpus!", line
+            )
+            if match:
+                wumpus_loc = parse_prolog_coord(match.group(1))
+                if not kb.has("no_wumpus_locations", wumpus_loc):
+                    kb.add("maybe_wumpus_locations", wumpus_loc)
+                step_info.pop("kb_snapshot", None)
+                step_info["messages"].append(line)
+
+        elif line.startswith("KB learn") and "no Wumpus there" in line:
+            match = re.search(r"KB learn (\[\d+,\d+\]) - no Wumpus there!", line)
+            if match:
+                no_wumpus_loc = parse_prolog_coord(match.group(1))
+                if kb.add("no_wumpus_locations", no_wumpus_loc):
+                    kb.discard("maybe_wumpus_locations", no_wumpus_loc)
+                step_info.pop("kb_snapshot", None)
+                step_info["messages"].append(line)
+
+        elif line.startswith("KB learn") and "is definitely at" in line:
+            match = re.search(
+                r"KB learn Wumpus is definitely at (\[\d+,\d+\])", line
+            )
+            if match:
+                confirmed_wumpus = parse_prolog_coord(match.group(1))
+                kb.add("known_wumpus_locations", confirmed_wumpus)
+                kb.discard("maybe_wumpus_locations", confirmed_wumpus)
+                step_info["wumpus_location"] = confirmed_wumpus
+                current_wumpus_location = confirmed_wumpus
+                step_info.pop("kb_snapshot", None)
+                step_info["messages"].append(
+                    f"KB learn Wumpus is definitely at {match.group(1)}"
+                )
+
+        elif line.startswith("KB learn") and "maybe there is a Pit" in line:
+            match = re.search(
+                r"KB learn (\[\d+,\d+\]) - maybe there is a Pit!", line
+            )
+            if match:
+                pit_loc = parse_prolog_coord(match.group(1))
+                if not kb.has("no_pit_locations", pit_loc):
+                    kb.add("maybe_pit_locations", pit_loc)
+                step_info["messages"].append(line)
+
+        elif line.startswith("KB learn") and "definitely a Pit" in line:
+            match = re.search(
+                r"KB learn (\[\d+,\d+\]) - there is definitely a Pit!", line
+            )
+            if match:
+                pit_loc = parse_prolog_coord(match.group(1))
+                kb.add("known_pit_locations", pit_loc)
+                kb.discard("maybe_pit_locations", pit_loc)
+                step_info["messages"].append(line)
+
+        elif line.startswith("KB learn") and "no Pit there" in line:
+            match = re.search(
+                r"KB learn (\[\d+,\d+\]) - there is no Pit there!", line
+            )
+            if match:
+                no_pit_loc = parse_prolog_coord(match.group(1))
+                if kb.add("no_pit_locations", no_pit_loc):
+                    kb.discard("maybe_pit_locations", no_pit_loc)
+                step_info["messages"].append(line)
+
+        elif line.startswith("KB learn") and "glitter detected" in line:
+            match = re.search(r"KB learn (\[\d+,\d+\]) - glitter detected!", line)
+            if match:
+                step_info["messages"].append(line)
+
+        elif line.startswith("KB learn") and "GOT THE GOLD" in line:
+            match = re.search(r"KB learn (\[\d+,\d+\]) - GOT THE GOLD!!!", line)
+            if match:
+                step_info["messages"].append(line)
+                end_status_in_round = "won"
+
+        elif line == "WON!":
+            end_status_in_round = "won"
+            step_info["messages"].append("WON!")
+        elif "AGENT GRABBED THE GOLD!!" in line:
+            end_status_in_round = "won"
+            step_info["messages"].append("AGENT GRABBED THE GOLD!!")
+        elif "Lost: Wumpus eats you!" in line or "eaten by the wumpus!" in line:
+            end_status_in_round = "lost_wumpus"
+        elif "Lost: you fell into the pit!" in line or "fallen into a pit!" in line:
+            end_status_in_round = "lost_pit"
+        elif line.startswith("Error: Budget exceeded"):
+            end_status_in_round = "budget_exceeded"
+            step_info["messages"].append(line)
+        elif line.startswith("Round cost:"):
+            match = re.search(r"Round cost: (\d+) inferences, ([\d.]+) ms", line)
+            if match:
+                step_info["inferences"] = int(match.group(1))
+                step_info["cpu_ms"] = float(match.group(2))
+
+        elif line.startswith("New time:"):
+            match = re.search(r"New time: (\d+)", line)
+            if match:
+                new_time = int(match.group(1))
+                step_info["time"] = new_time
+
+        elif line.startswith("New score:"):
+            match = re.search(r"New score: (-?\d+)", line)
+            if match:
+                new_score = int(match.group(1))
+                step_info["score"] = new_score
+
+    step_info["end_status"] = end_status_in_round
+    step_info["action"] = action_info
+
+    trace_parse_state["wumpus_status"] = current_wumpus_status
+    trace_parse_state["wumpus_location"] = current_wumpus_location
+    return accept_step(step_info)
+
 def load_and_parse_kb_log(filepath=KB_FILE_PATH):
     """
     Đọc và phân tích file kb.txt để lấy dữ liệu mô phỏng.
     """
-    global simulation_steps_data, simulation_wumpus_location, simulation_wumpus_status
-    simulation_steps_data = []
+    reset_trace_parse_state()
     if not os.path.exists(filepath):
         add_message(f"LỖI: Không tìm thấy file mô phỏng {filepath}")
         return False
@@ -380,230 +734,159 @@ def load_and_parse_kb_log(filepath=KB_FILE_PATH):
             add_message("Nội dung file không chứa dấu 'New Round:'.")
         return False
 
-    current_round_num = 0
-    current_wumpus_status = "alive"
-    current_wumpus_location = simulation_wumpus_location
-    safe_locations.clear()
-    maybe_wumpus_locations.clear()
-    no_wumpus_locations.clear()
-    maybe_pit_locations.clear()
-    no_pit_locations.clear()
-    visited_locations.clear()
-    visited_locations.append(list(initial_agent_pos_prolog))
-
     for round_block in rounds_text:
-        step_info = {
-            "round": current_round_num,
-            "start_location": None,
+        parse_round_block(round_block)
+
+    if not simulation_steps_data:
+        add_message(f"LỖI: Không thể phân tích bất kỳ bước hợp lệ nào từ {filepath}")
+        return False
+
+    add_message(
+        f"Đã phân tích thành công {len(simulation_steps_data)} bước từ {filepath}"
+    )
+    return True
+
+def _fmt_coord(loc):
+    return f"[{loc[0]},{loc[1]}]"
+
+def finish_structured_round():
+    """
+    Chốt vòng đang dựng từ trace JSON và thêm vào simulation_steps_data.
+    """
+    step_info = trace_parse_state["step_info"]
+    if step_info is None:
+        return False
+    trace_parse_state["step_info"] = None
+    return accept_step(step_info)
+
+def apply_trace_event(event):
+    """
+    Áp dụng một sự kiện của trace JSON lines. Vòng trước được chốt khi gặp
+    sự kiện round tiếp theo.
+    """
+    kind = event["e"]
+    kb = trace_parse_state["kb"]
+    if kind == "round":
+        finish_structured_round()
+        start = event["at"]
+        kb.add("visited_locations", start)
+        trace_parse_state["step_info"] = {
+            "round": len(simulation_steps_data),
+            "start_location": start,
             "percepts": None,
             "action": None,
             "next_location": None,
             "score": None,
             "time": None,
+            "inferences": None,
+            "cpu_ms": None,
             "end_status": "playing",
-            "wumpus_status": current_wumpus_status,
-            "wumpus_location": current_wumpus_location,
-            "safe_locations": list(safe_locations),
-            "maybe_wumpus_locations": list(maybe_wumpus_locations),
-            "no_wumpus_locations": list(no_wumpus_locations),
-            "maybe_pit_locations": list(maybe_pit_locations),
-            "no_pit_locations": list(no_pit_locations),
-            "visited_locations": list(visited_locations),
+            "wumpus_status": trace_parse_state["wumpus_status"],
+            "wumpus_location": trace_parse_state["wumpus_location"],
             "messages": [],
-            "raw_text": round_block,
         }
+        return
+    step_info = trace_parse_state["step_info"]
+    if step_info is None:
+        return
 
-        lines = round_block.strip().split("\n")
-        agent_at_start = None
-        percepts_at_start = None
-        action_info = None
-        new_time = None
-        new_score = None
-        end_status_in_round = "playing"
-
-        for line in lines:
-            line = line.strip()
-            if line.startswith("I am at"):
-                match = re.search(r"I am at (\[\d+,\d+\])", line)
-                if match:
-                    agent_at_start = parse_prolog_coord(match.group(1))
-                    step_info["start_location"] = agent_at_start
-                    if agent_at_start not in visited_locations:
-                        visited_locations.append(agent_at_start)
-
-            elif "seeing:" in line:
-                match = re.search(r"seeing: (\[.*?\])", line)
-                if match:
-                    percepts_at_start = parse_prolog_percepts(match.group(1))
-                    step_info["percepts"] = percepts_at_start
-
-            elif line.startswith("I'm going to:"):
-                match = re.search(r"I\'m going to: (\[\d+,\d+\])", line)
-                if match:
-                    action_target = parse_prolog_coord(match.group(1))
-                    action_info = {"type": "move", "target": action_target}
-                    step_info["next_location"] = action_target
-                    step_info["messages"].append(line)
-
-            elif line.startswith("I shoot an arrow at"):
-                match = re.search(r"I shoot an arrow at (\[\d+,\d+\])!", line)
-                if match:
-                    shoot_target = parse_prolog_coord(match.group(1))
-                    action_info = {"type": "shoot", "target": shoot_target}
-                    step_info["action"] = action_info
-                    step_info["messages"].append(line)
-
-            elif line.startswith("I grab the gold!"):
-                action_info = {"type": "grab"}
-                step_info["action"] = action_info
-                step_info["messages"].append(line)
+    if kind == "percept":
+        step_info["percepts"] = [event["stench"], event["breeze"], event["glitter"]]
+    elif kind == "move":
+        step_info["next_location"] = event["to"]
+        step_info["action"] = {"type": "move", "target": event["to"]}
+        step_info["messages"].append(f"I'm going to: {_fmt_coord(event['to'])}")
+    elif kind == "shoot":
+        step_info["action"] = {"type": "shoot", "target": event["at"]}
+        step_info["messages"].append(f"I shoot an arrow at {_fmt_coord(event['at'])}!")
+    elif kind == "grab":
+        step_info["action"] = {"type": "grab"}
+        step_info["messages"].append("I grab the gold!")
+    elif kind == "kill":
+        trace_parse_state["wumpus_status"] = "dead"
+        if step_info["action"]:
+            step_info["action"]["result"] = "killed"
+        step_info["wumpus_status"] = "dead"
+        kb.clear("maybe_wumpus_locations")
+        kb.discard("known_wumpus_locations", event["at"])
+        step_info["messages"].append(f"Wumpus at {_fmt_coord(event['at'])} is killed!")
+    elif kind == "kb":
+        fact, value, loc = event["f"], event["v"], event["at"]
+        coord = _fmt_coord(loc)
+        if fact == "ok" and value == "yes":
+            kb.add("safe_locations", loc)
+            step_info["messages"].append(f"KB learn {coord} is OK")
+        elif fact == "wumpus" and value == "maybe":
+            if not kb.has("no_wumpus_locations", loc):
+                kb.add("maybe_wumpus_locations", loc)
+            step_info["messages"].append(f"KB learn {coord} - maybe there is a Wumpus!")
+        elif fact == "wumpus" and value == "no":
+            if kb.add("no_wumpus_locations", loc):
+                kb.discard("maybe_wumpus_locations", loc)
+            step_info["messages"].append(f"KB learn {coord} - no Wumpus there!")
+        elif fact == "wumpus" and value == "known":
+            kb.add("known_wumpus_locations", loc)
+            kb.discard("maybe_wumpus_locations", loc)
+            step_info["wumpus_location"] = loc
+            trace_parse_state["wumpus_location"] = loc
+            step_info["messages"].append(f"KB learn Wumpus is definitely at {coord}")
+        elif fact == "pit" and value == "maybe":
+            if not kb.has("no_pit_locations", loc):
+                kb.add("maybe_pit_locations", loc)
+            step_info["messages"].append(f"KB learn {coord} - maybe there is a Pit!")
+        elif fact == "pit" and value == "yes":
+            kb.add("known_pit_locations", loc)
+            kb.discard("maybe_pit_locations", loc)
+            step_info["messages"].append(f"KB learn {coord} - there is definitely a Pit!")
+        elif fact == "pit" and value == "no":
+            if kb.add("no_pit_locations", loc):
+                kb.discard("maybe_pit_locations", loc)
+            step_info["messages"].append(f"KB learn {coord} - there is no Pit there!")
+        elif fact == "gold" and value == "yes":
+            step_info["messages"].append(f"KB learn {coord} - glitter detected!")
+        elif fact == "gold" and value == "grabbed":
+            step_info["messages"].append(f"KB learn {coord} - GOT THE GOLD!!!")
+            step_info["end_status"] = "won"
+    elif kind == "cost":
+        step_info["inferences"] = event["inferences"]
+        step_info["cpu_ms"] = event["cpu"]
+    elif kind == "time":
+        step_info["time"] = event["t"]
+    elif kind == "score":
+        step_info["score"] = event["s"]
+    elif kind == "end" and event["status"] != "max_rounds":
+        step_info["end_status"] = event["status"]
+        if event["status"] == "won":
+            step_info["messages"].append("WON!")
+        elif event["status"] == "budget_exceeded":
+            step_info["messages"].append(
+                f"Error: Budget exceeded: {event['budget']} "
+                f"(used {event['used']} of {event['limit']})"
+            )
 
-            elif line.startswith("Wumpus at"):
-                match = re.search(r"Wumpus at (\[\d+,\d+\]) is killed!", line)
-                if match:
-                    current_wumpus_status = "dead"
-                    killed_location = parse_prolog_coord(match.group(1))
-                    action_info["result"] = (
-                        "killed"
-                        if action_info and action_info["type"] == "shoot"
-                        else None
-                    )
-                    step_info["wumpus_status"] = current_wumpus_status
-                    maybe_wumpus_locations.clear()
-                    step_info["messages"].append(line)
-
-            elif line.startswith("KB learn") and (
-                "is now OK" in line or "is OK" in line
-            ):
-                match = re.search(r"KB learn (\[\d+,\d+\]) (?:is now OK|is OK)", line)
-                if match:
-                    safe_loc = parse_prolog_coord(match.group(1))
-                    if safe_loc not in safe_locations:
-                        safe_locations.append(safe_loc)
-                    step_info["safe_locations"] = list(safe_locations)
-                    step_info["messages"].append(f"KB learn {match.group(1)} is OK")
-
-            elif line.startswith("KB learn") and "maybe there is a Wumpus" in line:
-                match = re.search(
-                    r"KB learn (\[\d+,\d+\]) - maybe there is a Wumpus!", line
-                )
-                if match:
-                    wumpus_loc = parse_prolog_coord(match.group(1))
-                    if (
-                        wumpus_loc not in maybe_wumpus_locations
-                        and wumpus_loc not in no_wumpus_locations
-                    ):
-                        maybe_wumpus_locations.append(wumpus_loc)
-                    step_info["maybe_wumpus_locations"] = list(maybe_wumpus_locations)
-                    step_info["messages"].append(line)
-
-            elif line.startswith("KB learn") and "no Wumpus there" in line:
-                match = re.search(r"KB learn (\[\d+,\d+\]) - no Wumpus there!", line)
-                if match:
-                    no_wumpus_loc = parse_prolog_coord(match.group(1))
-                    if no_wumpus_loc not in no_wumpus_locations:
-                        no_wumpus_locations.append(no_wumpus_loc)
-                        if no_wumpus_loc in maybe_wumpus_locations:
-                            maybe_wumpus_locations.remove(no_wumpus_loc)
-                    step_info["no_wumpus_locations"] = list(no_wumpus_locations)
-                    step_info["maybe_wumpus_locations"] = list(maybe_wumpus_locations)
-                    step_info["messages"].append(line)
-
-            elif line.startswith("KB learn") and "is definitely at" in line:
-                match = re.search(
-                    r"KB learn Wumpus is definitely at (\[\d+,\d+\])", line
-                )
-                if match:
-                    confirmed_wumpus = parse_prolog_coord(match.group(1))
-                    maybe_wumpus_locations.clear()
-                    maybe_wumpus_locations.append(confirmed_wumpus)
-                    step_info["wumpus_location"] = confirmed_wumpus
-                    current_wumpus_location = confirmed_wumpus
-                    step_info["maybe_wumpus_locations"] = list(maybe_wumpus_locations)
-                    step_info["messages"].append(
-                        f"KB learn Wumpus is definitely at {match.group(1)}"
-                    )
 
-            elif line.startswith("KB learn") and "maybe there is a Pit" in line:
-                match = re.search(
-                    r"KB learn (\[\d+,\d+\]) - maybe there is a Pit!", line
-                )
-                if match:
-                    pit_loc = parse_prolog_coord(match.group(1))
-                    if (
-                        pit_loc not in maybe_pit_locations
-                        and pit_loc not in no_pit_locations
-                    ):
-                        maybe_pit_locations.append(pit_loc)
-                    step_info["maybe_pit_locations"] = list(maybe_pit_locations)
-                    step_info["messages"].append(line)
-
-            elif line.startswith("KB learn") and "no Pit there" in line:
-                match = re.search(
-                    r"KB learn (\[\d+,\d+\]) - there is no Pit there!", line
-                )
-                if match:
-                    no_pit_loc = parse_prolog_coord(match.group(1))
-                    if no_pit_loc not in no_pit_locations:
-                        no_pit_locations.append(no_pit_loc)
-                        if no_pit_loc in maybe_pit_locations:
-                            maybe_pit_locations.remove(no_pit_loc)
-                    step_info["no_pit_locations"] = list(no_pit_locations)
-                    step_info["maybe_pit_locations"] = list(maybe_pit_locations)
-                    step_info["messages"].append(line)
-
-            elif line.startswith("KB learn") and "glitter detected" in line:
-                match = re.search(r"KB learn (\[\d+,\d+\]) - glitter detected!", line)
-                if match:
-                    step_info["messages"].append(line)
-
-            elif line.startswith("KB learn") and "GOT THE GOLD" in line:
-                match = re.search(r"KB learn (\[\d+,\d+\]) - GOT THE GOLD!!!", line)
-                if match:
-                    step_info["messages"].append(line)
-                    end_status_in_round = "won"
-
-            elif line == "WON!":
-                end_status_in_round = "won"
-                step_info["messages"].append("WON!")
-            elif "AGENT GRABBED THE GOLD!!" in line:
-                end_status_in_round = "won"
-                step_info["messages"].append("AGENT GRABBED THE GOLD!!")
-            elif "Lost: Wumpus eats you!" in line or "eaten by the wumpus!" in line:
-                end_status_in_round = "lost_wumpus"
-            elif "Lost: you fell into the pit!" in line or "fallen into a pit!" in line:
-                end_status_in_round = "lost_pit"
-
-            elif line.startswith("New time:"):
-                match = re.search(r"New time: (\d+)", line)
-                if match:
-                    new_time = int(match.group(1))
-                    step_info["time"] = new_time
-
-            elif line.startswith("New score:"):
-                match = re.search(r"New score: (-?\d+)", line)
-                if match:
-                    new_score = int(match.group(1))
-                    step_info["score"] = new_score
-
-        step_info["end_status"] = end_status_in_round
-        step_info["action"] = action_info
-        step_info["visited_locations"] = list(visited_locations)
+def load_structured_trace(filepath=KB_JSON_PATH):
+    """
+    Đọc trace JSON lines (WUMPUS_TRACE=json) và dựng simulation_steps_data
+    giống hệt load_and_parse_kb_log, nhưng không cần regex.
+    """
+    reset_trace_parse_state()
+    try:
+        with open(filepath, "r") as f:
+            content = f.read()
+    except OSError as e:
+        add_message(f"LỖI: Không thể đọc file {filepath}: {e}")
+        return False
+    try:
+        # Gộp cả file thành một mảng JSON để chỉ gọi json.loads một lần
+        events = json.loads("[" + ",".join(content.split()) + "]")
+    except ValueError as e:
+        add_message(f"LỖI: Trace JSON không hợp lệ trong {filepath}: {e}")
+        return False
 
-        if (
-            step_info["start_location"]
-            and step_info["percepts"]
-            and (step_info["next_location"] or step_info["action"])
-            and step_info["time"] is not None
-            and step_info["score"] is not None
-        ):
-            simulation_steps_data.append(step_info)
-            current_round_num += 1
-        else:
-            add_message(
-                f"Cảnh báo: Dữ liệu không đầy đủ cho vòng {current_round_num+1}. Bỏ qua."
-            )
-            print(f"Debug: Dữ liệu bước không hoàn chỉnh: {step_info}")
+    for event in events:
+        apply_trace_event(event)
+    finish_structured_round()
 
     if not simulation_steps_data:
         add_message(f"LỖI: Không thể phân tích bất kỳ bước hợp lệ nào từ {filepath}")
@@ -614,149 +897,415 @@ def load_and_parse_kb_log(filepath=KB_FILE_PATH):
     )
     return True
 
+# --- Đọc trace dạng stream ---
+def stop_trace_stream():
+    """
+    Dừng ván đang được stream (Reset giữa chừng hoặc thoát chương trình).
+    """
+    global trace_stream
+    if trace_stream is None:
+        return
+    if not trace_stream["done"]:
+        source = trace_stream["source"]
+        if source is prolog_worker:
+            source.restart()  # worker đang chơi dở ván, không ngắt mềm được
+        else:
+            source.stop()
+    trace_stream = None
+
+def start_trace_stream():
+    """
+    Khởi chạy agent và đọc trace dần dần; các vòng được phân tích trong
+    poll_trace_stream() ở mỗi khung hình.
+    """
+    global trace_stream, prolog_worker, start_when_ready
+    stop_trace_stream()
+    reset_trace_parse_state()
+    start_when_ready = False
+    world_map = (
+        WORLD_DIM,
+        wumpus_location_prolog,
+        pit_locations_prolog,
+        gold_location_prolog,
+    )
+
+    source = None
+    if USE_WARM_WORKER:
+        try:
+            if prolog_worker is None or not prolog_worker.is_alive():
+                prolog_worker = PrologWorker(
+                    find_prolog_executable(), TRACE_FORMAT, round_cost=True
+                )
+            prolog_worker.send(world_map)
+            source = prolog_worker
+        except OSError as e:
+            add_message(f"Cảnh báo: Không thể dùng worker Prolog: {e}")
+            prolog_worker = None
+    if source is None:
+        try:
+            source = PrologGameProcess(
+                find_prolog_executable(),
+                TRACE_FORMAT,
+                round_cost=True,
+                cwd=os.path.dirname(os.path.abspath(INIT_DATA_PATH)),
+            )
+        except OSError as e:
+            add_message(f"LỖI: Không tìm thấy lệnh Prolog: {e}")
+            return False
+
+    trace_stream = {
+        "source": source,
+        "block": None,
+        "text": [],
+        "started": time.perf_counter(),
+        "first_round_ms": None,
+        "done": False,
+    }
+    return True
+
+def feed_trace_line(line):
+    """
+    Đưa một dòng trace vào bộ phân tích; vòng trước được chốt khi vòng mới bắt đầu.
+    """
+    if TRACE_FORMAT == "json":
+        line = line.strip()
+        if line.startswith("{"):
+            apply_trace_event(json.loads(line))
+        return
+    if "New Round:" in line:
+        if trace_stream["block"] is not None:
+            parse_round_block("".join(trace_stream["block"]))
+        trace_stream["block"] = [line.split("New Round:", 1)[1]]
+    elif trace_stream["block"] is not None:
+        trace_stream["block"].append(line)
+
+def finish_trace_stream():
+    """
+    Agent đã chơi xong: chốt vòng cuối và lưu trace đầy đủ ra file như trước.
+    """
+    global simulation_game_status
+    if TRACE_FORMAT == "json":
+        finish_structured_round()
+    elif trace_stream["block"] is not None:
+        parse_round_block("".join(trace_stream["block"]))
+    trace_stream["block"] = None
+    trace_stream["done"] = True
+    if trace_stream["source"] is not prolog_worker:
+        trace_stream["source"].stop()
+
+    try:
+        with open(trace_file_path(), "w") as f:
+            f.write("".join(trace_stream["text"]))
+    except OSError as e:
+        add_message(f"Cảnh báo: Không thể ghi {trace_file_path()}: {e}")
+
+    total_ms = (time.perf_counter() - trace_stream["started"]) * 1000
+    add_message(f"Agent chơi xong sau {total_ms:.0f} ms ({len(simulation_steps_data)} bước).")
+    if not simulation_steps_data:
+        add_message("LỖI: Không thể phân tích bất kỳ bước hợp lệ nào từ trace.")
+        simulation_game_status = "error"
+
+def poll_trace_stream(max_lines=5000):
+    """
+    Gọi mỗi khung hình: đọc các dòng trace mới mà không chặn vòng lặp chính.
+    """
+    global simulation_game_status, start_when_ready
+    if trace_stream is None or trace_stream["done"]:
+        return
+    source = trace_stream["source"]
+    for _ in range(max_lines):
+        try:
+            line = source.read_line(timeout=0)
+        except queue.Empty:
+            break
+        if line is None or line.rstrip("\n") == END_MARKER:
+            finish_trace_stream()
+            break
+        trace_stream["text"].append(line)
+        feed_trace_line(line)
+
+    timeout = kill_timeout(PROLOG_TIMEOUT)
+    if not trace_stream["done"] and time.perf_counter() - trace_stream["started"] > timeout:
+        add_message(f"LỖI: Prolog hết thời gian (quá {timeout} giây).")
+        stop_trace_stream()
+        if simulation_game_status == "loading":
+            simulation_game_status = "error"
+        return
+
+    if trace_stream["first_round_ms"] is None and simulation_steps_data:
+        trace_stream["first_round_ms"] = (time.perf_counter() - trace_stream["started"]) * 1000
+        add_message(f"Vòng đầu tiên sẵn sàng sau {trace_stream['first_round_ms']:.0f} ms.")
+        if simulation_game_status == "loading":
+            simulation_game_status = "ready"
+            if start_when_ready:
+                start_when_ready = False
+                handle_start_press()
+
+def trace_stream_pending():
+    """
+    True nếu agent vẫn đang chạy và có thể còn vòng mới.
+    """
+    return trace_stream is not None and not trace_stream["done"]
+
 # --- Hàm vẽ ---
+def grid_camera():
+    """
+    Camera của lưới; tạo lại khi đổi kích thước bản đồ.
+    """
+    global camera
+    if camera is None or camera.world_dim != WORLD_DIM:
+        camera = viewport.Camera.for_grid((GRID_MARGIN_X, GRID_MARGIN_Y), WORLD_DIM, CELL_SIZE)
+        camera.follow(simulation_agent_pos)
+    return camera
+
+def follow_agent():
+    grid_camera().follow(simulation_agent_pos)
+
+PAN_KEYS = {"left": (-1, 0), "right": (1, 0), "up": (0, -1), "down": (0, 1)}  # pygame.key.name
+
+def handle_view_event(event):
+    """
+    Cuộn chuột: zoom quanh ô dưới con trỏ; +/-: zoom quanh agent; mũi tên:
+    kéo khung (thôi theo agent); F: theo agent trở lại; I: bật / tắt số
+    inference của từng bước.
+    """
+    global show_cost_overlay
+    cam = grid_camera()
+    if event.type == pygame.MOUSEWHEEL and event.y:
+        anchor = cam.cell_at(pygame.mouse.get_pos()) or simulation_agent_pos
+        cam.zoom_step(1 if event.y > 0 else -1, anchor)
+    elif event.type != pygame.KEYDOWN:
+        return
+    elif event.key in (pygame.K_PLUS, pygame.K_EQUALS, pygame.K_KP_PLUS):
+        cam.zoom_step(1, simulation_agent_pos)
+    elif event.key in (pygame.K_MINUS, pygame.K_KP_MINUS):
+        cam.zoom_step(-1, simulation_agent_pos)
+    elif pygame.key.name(event.key) in PAN_KEYS:
+        dcol, drow = PAN_KEYS[pygame.key.name(event.key)]
+        step = max(1, cam.cols // 4)
+        cam.pan(dcol * step, drow * step)
+    elif event.key == pygame.K_f:
+        cam.following = True
+        cam.center_on(simulation_agent_pos)
+    elif event.key == pygame.K_i:
+        show_cost_overlay = not show_cost_overlay
+    follow_agent()
+
+def zoomed(name, image, alpha=None):
+    """
+    Hình image (tải theo CELL_SIZE) ở cỡ ô hiện tại của camera.
+    """
+    zoom = grid_camera().zoom
+    if zoom == CELL_SIZE and alpha is None:
+        return image
+    width, height = image.get_size()
+    size = (max(1, width * zoom // CELL_SIZE), max(1, height * zoom // CELL_SIZE))
+    return render_cache.sprite(name, image, size, alpha=alpha)
+
+def blit_in_cell(image, loc):
+    """
+    Vẽ image ở giữa ô loc.
+    """
+    rect = grid_camera().cell_rect(loc)
+    screen.blit(
+        image,
+        (rect.x + (rect.w - image.get_width()) // 2, rect.y + (rect.h - image.get_height()) // 2),
+    )
+
+def build_grid_layer():
+    """
+    Lưới và tọa độ Prolog của các ô đang hiện, vẽ sẵn trên một surface (gốc
+    tại góc khung nhìn).
+    """
+    cam = grid_camera()
+    layer = pygame.Surface(cam.rect.size)
+    layer.fill(WHITE)
+    for loc in cam.visible_cells():
+        rect = cam.cell_rect(loc).move(-cam.view.x, -cam.view.y)
+        pygame.draw.rect(layer, BLACK, rect, 1)
+        if cam.labels:
+            coord_text = FONT_SMALL.render(f"({loc[0]},{loc[1]})", True, GRAY)
+            layer.blit(coord_text, (rect.x + 5, rect.y + 5))
+    return layer
+
+def known_cells_mask(kb):
+    return kb.union(
+        "visited_locations",
+        "safe_locations",
+        "known_wumpus_locations",
+        "maybe_wumpus_locations",
+        "known_pit_locations",
+        "maybe_pit_locations",
+    )
+
+def gold_visible(step_data):
+    """
+    Vàng chỉ hiện khi agent đứng trên nó, cảm nhận lấp lánh và chưa nhặt.
+    """
+    percepts = step_data["percepts"]
+    return bool(
+        gold_location_prolog
+        and step_data["end_status"] != "won"
+        and percepts
+        and percepts[2] == "yes"
+        and step_data["start_location"] == gold_location_prolog
+    )
+
+def build_tile_layer():
+    """
+    Ô màu cho mức thu nhỏ: mỗi ô một pixel, màu theo KB của bước hiện tại.
+    """
+    kb = KnowledgeGrid(WORLD_DIM)
+    if current_step_index < 0:
+        layers = [((1 << WORLD_DIM * WORLD_DIM) - 1, WHITE)]
+    else:
+        step_data = simulation_steps_data[current_step_index]
+        kb = step_data["kb"]
+        layers = [
+            (known_cells_mask(kb), WHITE),
+            (kb.masks["safe_locations"], SAFE_COLOR),
+            (kb.masks["maybe_pit_locations"], PIT_COLOR),
+            (kb.masks["known_pit_locations"], KNOWN_PIT_COLOR),
+            (kb.masks["maybe_wumpus_locations"], PURPLE),
+            (kb.masks["known_wumpus_locations"], RED),
+        ]
+        if gold_visible(step_data):
+            layers.append((kb.bit(gold_location_prolog), GOLD_COLOR))
+    if current_step_index < 0 or simulation_agent_pos != initial_agent_pos_prolog:
+        layers.append((kb.bit(initial_agent_pos_prolog), GREEN))
+    return viewport.tile_surface(WORLD_DIM, layers, DIM_TILE_COLOR)
+
 def draw_grid():
     """
-    Vẽ lưới bản đồ với tọa độ Prolog.
+    Vẽ lưới bản đồ với tọa độ Prolog (hoặc ô màu khi thu nhỏ).
     """
-    for r_idx_pygame in range(WORLD_DIM):
-        for c_idx_pygame in range(WORLD_DIM):
-            rect = pygame.Rect(
-                GRID_MARGIN_X + c_idx_pygame * CELL_SIZE,
-                GRID_MARGIN_Y + r_idx_pygame * CELL_SIZE,
-                CELL_SIZE,
-                CELL_SIZE,
-            )
-            pygame.draw.rect(screen, BLACK, rect, 1)
-            prolog_x = c_idx_pygame + 1
-            prolog_y = WORLD_DIM - r_idx_pygame
-            coord_text = FONT_SMALL.render(f"({prolog_x},{prolog_y})", True, GRAY)
-            screen.blit(coord_text, (rect.x + 5, rect.y + 5))
-            # Làm mờ các ô chưa thăm và chưa biết
-            cell = [prolog_x, prolog_y]
-            if current_step_index >= 0:
-                visited = simulation_steps_data[current_step_index]["visited_locations"]
-                safe = simulation_steps_data[current_step_index]["safe_locations"]
-                maybe_wumpus = simulation_steps_data[current_step_index][
-                    "maybe_wumpus_locations"
-                ]
-                maybe_pit = simulation_steps_data[current_step_index][
-                    "maybe_pit_locations"
-                ]
-                known_elements = safe + maybe_wumpus + maybe_pit
-                if cell not in visited and cell not in known_elements:
-                    dim_surface = pygame.Surface(
-                        (CELL_SIZE, CELL_SIZE), pygame.SRCALPHA
-                    )
-                    dim_surface.fill(DIM_COLOR)
-                    screen.blit(dim_surface, (rect.x, rect.y))
+    cam = grid_camera()
+    if not cam.detailed:
+        # Ô màu chỉ dựng lại khi đổi bước (hoặc agent rời / về ô xuất phát)
+        step_key = (
+            WORLD_DIM,
+            simulation_steps_data,
+            current_step_index,
+            simulation_agent_pos != initial_agent_pos_prolog,
+        )
+        tiles = render_cache.layer("ui_tiles", step_key, build_tile_layer)
+        cam.blit_tiles(screen, tiles)
+        if cam.zoom >= TILE_GRID_MIN_CELL:
+            cam.blit_grid_lines(screen, GRAY)
+        return
+
+    # Lớp lưới chỉ dựng lại khi đổi bản đồ hoặc khung nhìn
+    screen.blit(render_cache.layer("ui_grid", cam.state(), build_grid_layer), cam.rect.topleft)
+    if current_step_index < 0:
+        return
+
+    # Làm mờ các ô chưa thăm và chưa biết
+    kb = simulation_steps_data[current_step_index]["kb"]
+    dim_surface = render_cache.fill_surface((cam.zoom, cam.zoom), DIM_COLOR)
+    for cell in kb.mask_cells(~known_cells_mask(kb) & cam.visible_mask()):
+        screen.blit(dim_surface, cam.cell_rect(cell))
 
 def draw_world_elements():
     """
     Vẽ các thành phần của thế giới (hố, vàng, Wumpus, ô an toàn, v.v.).
     """
+    cam = grid_camera()
+    if not cam.detailed:
+        return  # đã có trong ô màu của draw_grid
+
     if current_step_index < 0:
         # Chỉ vẽ vị trí bắt đầu ở trạng thái ban đầu
-        if initial_agent_pos_prolog:
-            col, row = prolog_to_grid_coords(
-                initial_agent_pos_prolog[0], initial_agent_pos_prolog[1]
-            )
-            s_x, s_y = grid_to_screen_coords(col, row)
-            screen.blit(start_node_img, (s_x, s_y))
+        if initial_agent_pos_prolog and cam.is_visible(initial_agent_pos_prolog):
+            blit_in_cell(zoomed("start", start_node_img), initial_agent_pos_prolog)
         return
 
     step_data = simulation_steps_data[current_step_index]
-    wumpus_status = step_data["wumpus_status"]
-    wumpus_location = step_data["wumpus_location"]
-    safe_locs = step_data["safe_locations"]
-    maybe_wumpus_locs = step_data["maybe_wumpus_locations"]
-    maybe_pit_locs = step_data["maybe_pit_locations"]
-    percepts = step_data["percepts"]
+    kb = step_data["kb"]
+    visible = cam.visible_mask()
+    question = zoomed("question", question_mark_img)
 
     # Vẽ các ô an toàn
-    for safe_x, safe_y in safe_locs:
-        col, row = prolog_to_grid_coords(safe_x, safe_y)
-        s_x = GRID_MARGIN_X + col * CELL_SIZE + (CELL_SIZE - safe_img.get_width()) // 2
-        s_y = GRID_MARGIN_Y + row * CELL_SIZE + (CELL_SIZE - safe_img.get_height()) // 2
-        screen.blit(safe_img, (s_x, s_y))
+    safe = zoomed("safe", safe_img)
+    for loc in kb.mask_cells(kb.masks["safe_locations"] & visible):
+        blit_in_cell(safe, loc)
 
     # Vẽ các ô có thể có hố
-    for pit_x, pit_y in maybe_pit_locs:
-        col, row = prolog_to_grid_coords(pit_x, pit_y)
-        s_x, s_y = grid_to_screen_coords(col, row)
-        pit_img_alpha = pit_img.copy()
-        pit_img_alpha.set_alpha(128)
-        screen.blit(pit_img_alpha, (s_x, s_y))
-        q_x = s_x + (pit_img.get_width() - question_mark_img.get_width()) // 2
-        q_y = s_y + (pit_img.get_height() - question_mark_img.get_height()) // 2
-        screen.blit(question_mark_img, (q_x, q_y))
+    pit_alpha = zoomed("pit", pit_img, alpha=128)
+    for loc in kb.mask_cells(kb.masks["maybe_pit_locations"] & visible):
+        blit_in_cell(pit_alpha, loc)
+        blit_in_cell(question, loc)
+
+    # Vẽ các hố đã xác định
+    pit = zoomed("pit", pit_img)
+    for loc in kb.mask_cells(kb.masks["known_pit_locations"] & visible):
+        blit_in_cell(pit, loc)
 
     # Vẽ vàng nếu cảm nhận lấp lánh và chưa nhặt
-    if gold_location_prolog and step_data["end_status"] != "won":
-        g_x, g_y = gold_location_prolog
-        if (
-            percepts
-            and percepts[2] == "yes"
-            and step_data["start_location"] == gold_location_prolog
-        ):
-            col, row = prolog_to_grid_coords(g_x, g_y)
-            s_x, s_y = grid_to_screen_coords(col, row)
-            screen.blit(gold_img, (s_x, s_y))
+    if gold_visible(step_data) and cam.is_visible(gold_location_prolog):
+        blit_in_cell(zoomed("gold", gold_img), gold_location_prolog)
 
     # Vẽ các ô có thể có Wumpus
-    for w_x, w_y in maybe_wumpus_locs:
-        if (
-            len(maybe_wumpus_locs) == 1
-            and [w_x, w_y] == wumpus_location
-            and wumpus_status == "alive"
-        ):
-            continue
-        col, row = prolog_to_grid_coords(w_x, w_y)
-        s_x, s_y = grid_to_screen_coords(col, row)
-        wumpus_img_alpha = wumpus_img.copy()
-        wumpus_img_alpha.set_alpha(128)
-        screen.blit(wumpus_img_alpha, (s_x, s_y))
-        q_x = s_x + (wumpus_img.get_width() - question_mark_img.get_width()) // 2
-        q_y = s_y + (wumpus_img.get_height() - question_mark_img.get_height()) // 2
-        screen.blit(question_mark_img, (q_x, q_y))
-
-    # Vẽ Wumpus đã xác định
+    wumpus_alpha = zoomed("wumpus", wumpus_img, alpha=128)
+    for loc in kb.mask_cells(kb.masks["maybe_wumpus_locations"] & visible):
+        blit_in_cell(wumpus_alpha, loc)
+        blit_in_cell(question, loc)
+
+    # Vẽ các Wumpus đã xác định
+    wumpus = zoomed("wumpus", wumpus_img)
+    for loc in kb.mask_cells(kb.masks["known_wumpus_locations"] & visible):
+        blit_in_cell(wumpus, loc)
+
+    # Vẽ vị trí bắt đầu
     if (
-        wumpus_status == "alive"
-        and wumpus_location
-        and len(maybe_wumpus_locs) == 1
-        and wumpus_location in maybe_wumpus_locs
+        initial_agent_pos_prolog
+        and simulation_agent_pos != initial_agent_pos_prolog
+        and cam.is_visible(initial_agent_pos_prolog)
     ):
-        w_x, w_y = wumpus_location
-        col, row = prolog_to_grid_coords(w_x, w_y)
-        s_x, s_y = grid_to_screen_coords(col, row)
-        screen.blit(wumpus_img, (s_x, s_y))
+        blit_in_cell(zoomed("start", start_node_img), initial_agent_pos_prolog)
 
-    # Vẽ vị trí bắt đầu
-    if initial_agent_pos_prolog:
-        col, row = prolog_to_grid_coords(
-            initial_agent_pos_prolog[0], initial_agent_pos_prolog[1]
-        )
-        s_x, s_y = grid_to_screen_coords(col, row)
-        if simulation_agent_pos != initial_agent_pos_prolog:
-            screen.blit(start_node_img, (s_x, s_y))
+def cost_label(inferences):
+    if inferences >= 10000:
+        return f"{inferences // 1000}k"
+    return str(inferences)
+
+def draw_cost_overlay():
+    """
+    Số inference agent đã dùng ở mỗi ô (cộng các bước tới bước hiện tại
+    đứng ở ô đó), ghi ở góc dưới ô.
+    """
+    cam = grid_camera()
+    if not cam.labels or current_step_index < 0:
+        return
+    stop = current_step_index + 1
+    costs = {}
+    for loc, inferences in zip(
+        simulation_steps_data.field("start_location", stop),
+        simulation_steps_data.field("inferences", stop),
+    ):
+        if loc and inferences is not None:
+            costs[tuple(loc)] = costs.get(tuple(loc), 0) + inferences
+    for loc, inferences in costs.items():
+        if not cam.is_visible(loc):
+            continue
+        label = FONT_SMALL.render(cost_label(inferences), True, BLACK, WHITE)
+        rect = cam.cell_rect(loc)
+        screen.blit(label, (rect.x + 2, rect.bottom - label.get_height() - 2))
 
 def draw_agent_path():
     """
     Vẽ đường đi của agent.
     """
     if len(simulation_agent_path) > 1:
+        cam = grid_camera()
         points_screen = []
         for p_pos_prolog in simulation_agent_path:
             if isinstance(p_pos_prolog, (list, tuple)) and len(p_pos_prolog) == 2:
-                col, row = prolog_to_grid_coords(p_pos_prolog[0], p_pos_prolog[1])
-                center_x = GRID_MARGIN_X + col * CELL_SIZE + CELL_SIZE // 2
-                center_y = GRID_MARGIN_Y + row * CELL_SIZE + CELL_SIZE // 2
-                points_screen.append((center_x, center_y))
+                points_screen.append(cam.cell_rect(p_pos_prolog).center)
             else:
                 print(f"Cảnh báo: Điểm không hợp lệ trong đường đi: {p_pos_prolog}")
         if len(points_screen) > 1:
-            pygame.draw.lines(screen, BLUE, False, points_screen, 3)
+            width = 3 if cam.detailed else max(1, cam.zoom // 8)
+            pygame.draw.lines(screen, BLUE, False, points_screen, width)
 
 def draw_action_effects():
     """
@@ -767,90 +1316,104 @@ def draw_action_effects():
     current_step = simulation_steps_data[current_step_index]
     action = current_step.get("action")
     if action and action["type"] == "shoot":
-        start_pos = current_step["start_location"]
-        target_pos = action["target"]
-        start_col, start_row = prolog_to_grid_coords(start_pos[0], start_pos[1])
-        target_col, target_row = prolog_to_grid_coords(target_pos[0], target_pos[1])
-        start_x = GRID_MARGIN_X + start_col * CELL_SIZE + CELL_SIZE // 2
-        start_y = GRID_MARGIN_Y + start_row * CELL_SIZE + CELL_SIZE // 2
-        target_x = GRID_MARGIN_X + target_col * CELL_SIZE + CELL_SIZE // 2
-        target_y = GRID_MARGIN_Y + target_row * CELL_SIZE + CELL_SIZE // 2
-        screen.blit(
-            arrow_img,
-            (
-                start_x - arrow_img.get_width() // 2,
-                start_y - arrow_img.get_height() // 2,
-            ),
-        )
+        cam = grid_camera()
+        start_x, start_y = cam.cell_rect(current_step["start_location"]).center
+        target_x, target_y = cam.cell_rect(action["target"]).center
+        if cam.detailed:
+            arrow = zoomed("arrow", arrow_img)
+            screen.blit(
+                arrow,
+                (
+                    start_x - arrow.get_width() // 2,
+                    start_y - arrow.get_height() // 2,
+                ),
+            )
         pygame.draw.line(screen, RED, (start_x, start_y), (target_x, target_y), 2)
 
 def draw_agent():
     """
     Vẽ agent tại vị trí hiện tại.
     """
-    if simulation_agent_pos:
-        col, row = prolog_to_grid_coords(
-            simulation_agent_pos[0], simulation_agent_pos[1]
-        )
-        s_x, s_y = grid_to_screen_coords(col, row)
-        screen.blit(agent_img, (s_x, s_y))
+    cam = grid_camera()
+    if simulation_agent_pos and cam.is_visible(simulation_agent_pos):
+        if cam.detailed:
+            blit_in_cell(zoomed("agent", agent_img), simulation_agent_pos)
+        else:
+            rect = cam.cell_rect(simulation_agent_pos)
+            pygame.draw.circle(screen, ORANGE, rect.center, max(2, cam.zoom // 2))
 
 def draw_percepts_at_agent_location():
     """
     Vẽ các tri giác (mùi, gió, lấp lánh) tại vị trí agent.
     """
+    cam = grid_camera()
     if (
         simulation_percepts_current
         and simulation_agent_pos
         and simulation_game_status not in ["init", "error"]
+        and cam.detailed
+        and cam.is_visible(simulation_agent_pos)
     ):
         stench_val, breeze_val, glitter_val = simulation_percepts_current
         if stench_val == "?" and breeze_val == "?":
             return
 
-        col_agent, row_agent = prolog_to_grid_coords(
-            simulation_agent_pos[0], simulation_agent_pos[1]
-        )
-        icon_start_x = GRID_MARGIN_X + col_agent * CELL_SIZE + 5
-        icon_y_offset = (
-            GRID_MARGIN_Y
-            + row_agent * CELL_SIZE
-            + CELL_SIZE
-            - stench_img.get_height()
-            - 5
-        )
+        stench = zoomed("stench", stench_img)
+        breeze = zoomed("breeze", breeze_img)
+        glitter = zoomed("glitter", glitter_img)
+        rect = cam.cell_rect(simulation_agent_pos)
+        icon_start_x = rect.x + 5
+        icon_y_offset = rect.y + rect.h - stench.get_height() - 5
         current_x = icon_start_x
         if stench_val == "yes":
-            screen.blit(stench_img, (current_x, icon_y_offset))
-            current_x += stench_img.get_width() + 2
+            screen.blit(stench, (current_x, icon_y_offset))
+            current_x += stench.get_width() + 2
         if breeze_val == "yes":
-            screen.blit(breeze_img, (current_x, icon_y_offset))
-            current_x += breeze_img.get_width() + 2
+            screen.blit(breeze, (current_x, icon_y_offset))
+            current_x += breeze.get_width() + 2
         if glitter_val == "yes":
-            screen.blit(glitter_img, (current_x, icon_y_offset))
+            screen.blit(glitter, (current_x, icon_y_offset))
 
 # --- Vẽ giao diện người dùng ---
-def draw_ui_elements():
+UI_Y_SPACING = 10
+
+def ui_button_rects():
     """
-    Vẽ các nút điều khiển và thông tin trạng thái.
+    Vị trí các nút Reset / Start / Next Step / Step Mode bên phải lưới.
     """
-    ui_start_x = GRID_MARGIN_X + WORLD_DIM * CELL_SIZE + 30
+    ui_start_x = grid_camera().view.right + 30
     button_width = 180
     button_height = 40
-    y_spacing = 10
 
     reset_button_rect = pygame.Rect(
         ui_start_x, GRID_MARGIN_Y, button_width, button_height
     )
     start_button_rect = pygame.Rect(
-        ui_start_x, reset_button_rect.bottom + y_spacing, button_width, button_height
+        ui_start_x, reset_button_rect.bottom + UI_Y_SPACING, button_width, button_height
     )
     step_button_rect = pygame.Rect(
-        ui_start_x, start_button_rect.bottom + y_spacing, button_width, button_height
+        ui_start_x, start_button_rect.bottom + UI_Y_SPACING, button_width, button_height
     )
     step_mode_button_rect = pygame.Rect(
-        ui_start_x, step_button_rect.bottom + y_spacing, button_width, button_height
+        ui_start_x, step_button_rect.bottom + UI_Y_SPACING, button_width, button_height
+    )
+    return reset_button_rect, start_button_rect, step_button_rect, step_mode_button_rect
+
+def ui_log_top():
+    """
+    Tọa độ y bắt đầu vùng log: dưới phần trạng thái và không đè lên lưới.
+    """
+    status_y_start = ui_button_rects()[3].bottom + UI_Y_SPACING + 20
+    return max(status_y_start + 150, grid_camera().view.bottom + 20)
+
+def draw_ui_elements():
+    """
+    Vẽ các nút điều khiển và thông tin trạng thái.
+    """
+    reset_button_rect, start_button_rect, step_button_rect, step_mode_button_rect = (
+        ui_button_rects()
     )
+    ui_start_x = reset_button_rect.x
 
     pygame.draw.rect(screen, RED, reset_button_rect)
     reset_text = FONT_MEDIUM.render("Reset Sim", True, WHITE)
@@ -901,9 +1464,14 @@ def draw_ui_elements():
         step_mode_text, (step_mode_button_rect.x + 10, step_mode_button_rect.y + 5)
     )
 
-    status_y_start = step_mode_button_rect.bottom + y_spacing + 20
+    status_y_start = step_mode_button_rect.bottom + UI_Y_SPACING + 20
     display_step = max(0, current_step_index)
-    step_num_text = FONT_MEDIUM.render(f"Step: {display_step}", True, BLACK)
+    step_label = f"Step: {display_step}"
+    if show_cost_overlay and current_step_index >= 0:
+        step = simulation_steps_data[current_step_index]
+        if step.get("inferences") is not None:
+            step_label += f" ({step['inferences']} inf)"
+    step_num_text = FONT_MEDIUM.render(step_label, True, BLACK)
     screen.blit(step_num_text, (ui_start_x, status_y_start))
 
     score_text = FONT_MEDIUM.render(f"Score: {simulation_score}", True, BLACK)
@@ -922,11 +1490,7 @@ def draw_ui_elements():
         percepts_display = FONT_MEDIUM.render(p_text, True, BLACK)
         screen.blit(percepts_display, (ui_start_x, status_y_start + 120))
 
-    log_y_start = status_y_start + 150
-    grid_bottom = GRID_MARGIN_Y + WORLD_DIM * CELL_SIZE + 20
-    if log_y_start < grid_bottom:
-        log_y_start = grid_bottom
-
+    log_y_start = ui_log_top()
     log_area_height = SCREEN_HEIGHT - log_y_start - 10
     max_visible_lines = log_area_height // (FONT_SMALL.get_height() + 2)
 
@@ -938,6 +1502,192 @@ def draw_ui_elements():
 
     return reset_button_rect, start_button_rect, step_button_rect, step_mode_button_rect
 
+# --- Vẽ lại theo vùng thay đổi (dirty rect) ---
+STREAM_POLL_MS = 30  # Chu kỳ đọc trace khi agent còn đang chạy
+last_frame_state = None  # Trạng thái đã vẽ ở khung trước; None: vẽ lại toàn màn hình
+
+def grid_screen_rect():
+    return pygame.Rect(grid_camera().view)
+
+def cell_screen_rect(loc):
+    return grid_camera().cell_rect(loc)
+
+def agent_screen_rect(loc):
+    """
+    Ô của agent cùng dải biểu tượng tri giác (có thể tràn sang ô bên phải).
+    """
+    rect = cell_screen_rect(loc)
+    strip_width = 5 + 3 * (zoomed("stench", stench_img).get_width() + 2)
+    return rect.union(pygame.Rect(rect.x, rect.y, strip_width, rect.h))
+
+def frame_state():
+    """
+    Những gì đang hiển thị, chia theo vùng (lưới / bảng nút / log), để so
+    với khung trước và chỉ vẽ lại vùng thay đổi.
+    """
+    step = simulation_steps_data[current_step_index] if current_step_index >= 0 else None
+    grid = {"step": current_step_index, "agent": tuple(simulation_agent_pos or ())}
+    grid["view"] = grid_camera().state()
+    grid["path_len"] = len(simulation_agent_path)
+    grid["percepts"] = (
+        tuple(simulation_percepts_current)
+        if simulation_percepts_current and simulation_game_status not in ["init", "error"]
+        else None
+    )
+    grid["start_node"] = step is None or simulation_agent_pos != initial_agent_pos_prolog
+    grid["cost"] = show_cost_overlay
+    if step is not None:
+        kb = step["kb"]
+        action = step.get("action")
+        percepts = step["percepts"]
+        grid["masks"] = tuple(
+            kb.masks[key]
+            for key in (
+                "visited_locations",
+                "safe_locations",
+                "maybe_pit_locations",
+                "known_pit_locations",
+            )
+        )
+        grid["wumpus"] = (
+            kb.masks["maybe_wumpus_locations"],
+            kb.masks["known_wumpus_locations"],
+            step["wumpus_status"],
+            str(step["wumpus_location"]),
+        )
+        grid["action"] = (
+            (tuple(step["start_location"]), tuple(action["target"]))
+            if action and action["type"] == "shoot"
+            else None
+        )
+        grid["gold"] = bool(
+            percepts
+            and percepts[2] == "yes"
+            and step["start_location"] == gold_location_prolog
+            and step["end_status"] != "won"
+        )
+    return {
+        # Đổi bản đồ / trace / đường đi (Reset) thì vẽ lại toàn bộ
+        "layout": (WORLD_DIM, CELL_SIZE, simulation_steps_data, simulation_agent_path),
+        "grid": grid,
+        "panel": (
+            simulation_game_status,
+            step_by_step_mode,
+            simulation_running,
+            current_step_index,
+            len(simulation_steps_data),
+            simulation_score,
+            simulation_time_taken,
+            grid["percepts"],
+            show_cost_overlay,
+        ),
+        "log": tuple(message_log),
+    }
+
+def grid_dirty_rect(prev, cur):
+    """
+    Vùng lưới cần vẽ lại giữa hai khung: các ô có KB đổi, ô cũ/mới của
+    agent, đoạn đường đi mới, mũi tên, vàng và ô xuất phát.
+    """
+    if (
+        (prev["step"] < 0) != (cur["step"] < 0)
+        or cur["path_len"] < prev["path_len"]
+        or prev["view"] != cur["view"]
+        or prev["cost"] != cur["cost"]
+    ):
+        return grid_screen_rect()
+    rects = []
+    if cur["step"] >= 0:
+        kb = simulation_steps_data[cur["step"]]["kb"]
+        changed = 0
+        for before, after in zip(prev["masks"], cur["masks"]):
+            changed |= before ^ after
+        if prev["wumpus"] != cur["wumpus"]:
+            changed |= prev["wumpus"][0] | cur["wumpus"][0]
+        visible = grid_camera().visible_mask()
+        rects += [cell_screen_rect(cell) for cell in kb.mask_cells(changed & visible)]
+        for action in (prev["action"], cur["action"]):
+            if action:
+                rects += [cell_screen_rect(action[0]), cell_screen_rect(action[1])]
+        if prev["gold"] != cur["gold"] and gold_location_prolog:
+            rects.append(cell_screen_rect(gold_location_prolog))
+    if prev["agent"] != cur["agent"] or prev["percepts"] != cur["percepts"]:
+        rects += [agent_screen_rect(loc) for loc in (prev["agent"], cur["agent"]) if loc]
+    for loc in simulation_agent_path[max(0, prev["path_len"] - 1):cur["path_len"]]:
+        rects.append(cell_screen_rect(loc))
+    if prev["start_node"] != cur["start_node"]:
+        rects.append(cell_screen_rect(initial_agent_pos_prolog))
+    if not rects:
+        return None
+    rect = rects[0].unionall(rects[1:]).clip(grid_screen_rect().inflate(CELL_SIZE, 0))
+    return rect if rect.w and rect.h else None
+
+def dirty_rects(prev, cur):
+    """
+    Các vùng màn hình phải vẽ lại; [] nếu khung hình không đổi.
+    """
+    if prev is None or any(a is not b for a, b in zip(prev["layout"], cur["layout"])):
+        return [screen.get_rect()]
+    rects = []
+    if prev["grid"] != cur["grid"]:
+        rect = grid_dirty_rect(prev["grid"], cur["grid"])
+        if rect:
+            rects.append(rect)
+    log_top = ui_log_top()
+    if prev["panel"] != cur["panel"]:
+        panel_x = ui_button_rects()[0].x
+        rects.append(pygame.Rect(panel_x, 0, SCREEN_WIDTH - panel_x, log_top))
+    if prev["log"] != cur["log"]:
+        rects.append(pygame.Rect(0, log_top, SCREEN_WIDTH, SCREEN_HEIGHT - log_top))
+    return rects
+
+def draw_scene(rect):
+    """
+    Vẽ lại những phần của khung hình nằm trong rect.
+    """
+    screen.set_clip(rect)
+    screen.fill(WHITE)
+    grid_clip = rect.clip(grid_screen_rect().inflate(CELL_SIZE, 0))
+    if grid_clip.w and grid_clip.h:
+        screen.set_clip(grid_clip)
+        draw_grid()
+        draw_world_elements()
+        # Đường đi / mũi tên có thể dẫn ra ngoài khung nhìn
+        screen.set_clip(rect.clip(grid_camera().rect))
+        draw_agent_path()
+        draw_action_effects()
+        screen.set_clip(grid_clip)
+        draw_agent()
+        draw_percepts_at_agent_location()
+        if show_cost_overlay:
+            draw_cost_overlay()
+        screen.set_clip(rect)
+    draw_ui_elements()
+    screen.set_clip(None)
+
+def render_frame():
+    """
+    Chỉ vẽ lại và đẩy lên màn hình các vùng thay đổi từ khung trước.
+    """
+    global last_frame_state
+    state = frame_state()
+    rects = dirty_rects(last_frame_state, state)
+    last_frame_state = state
+    for rect in rects:
+        draw_scene(rect)
+    if rects:
+        pygame.display.update(rects)
+
+def next_wakeup_ms(current_time_ms, auto_step_delay):
+    """
+    Bao lâu nữa vòng lặp cần chạy lại nếu không có sự kiện (None: chờ sự kiện).
+    """
+    if trace_stream_pending():
+        return STREAM_POLL_MS
+    if simulation_running and not step_by_step_mode and simulation_game_status == "playing":
+        return auto_step_delay - (current_time_ms - last_auto_step_time)
+    return None
+
 # --- Hàm logic trò chơi ---
 def initialize_simulation():
     """
@@ -947,30 +1697,54 @@ def initialize_simulation():
     global simulation_score, simulation_time_taken, simulation_game_status
     global simulation_percepts_current, simulation_running, message_log
     global simulation_steps_data, simulation_wumpus_status, simulation_wumpus_location
-    global safe_locations, maybe_wumpus_locations, no_wumpus_locations, maybe_pit_locations, no_pit_locations
-    global visited_locations
+    global kb_grid
 
     add_message("--- Khởi tạo Mô phỏng ---")
     
-    # Đọc cấu hình từ init_data.txt
-    if not load_init_data():
+    # Đọc cấu hình (bản đồ từ config.py hoặc init_data.txt)
+    if not load_world():
         add_message("Cảnh báo: Không thể đọc init_data.txt, sử dụng cấu hình mặc định.")
+    if WORLD_DIM > viewport.VIEW_CELLS:
+        add_message("Bản đồ lớn: cuộn chuột hoặc +/- để zoom, mũi tên để kéo khung, F để theo agent.")
     
     # Cập nhật biến mô phỏng
     simulation_wumpus_location = list(wumpus_location_prolog)
     simulation_agent_pos = list(initial_agent_pos_prolog)
     simulation_agent_path = [list(initial_agent_pos_prolog)]
-    visited_locations = [list(initial_agent_pos_prolog)]
+    kb_grid = KnowledgeGrid(WORLD_DIM)
+    kb_grid.add("visited_locations", initial_agent_pos_prolog)
+    grid_camera().following = True
+    follow_agent()
+
+    if STREAM_TRACE:
+        if not start_trace_stream():
+            add_message("Khởi tạo thất bại: Không thể chạy file Prolog.")
+            simulation_game_status = "error"
+            simulation_steps_data = StepStore()
+            return
+        current_step_index = -1
+        simulation_score = 0
+        simulation_time_taken = 0
+        simulation_percepts_current = None
+        simulation_running = False
+        simulation_game_status = "loading"
+        simulation_wumpus_status = "alive"
+        add_message("Agent đang chạy; có thể bắt đầu ngay khi xong vòng đầu tiên.")
+        return
 
     if not run_prolog_script():
         add_message("Khởi tạo thất bại: Không thể chạy file Prolog.")
         simulation_game_status = "error"
-        simulation_steps_data = []
+        simulation_steps_data = StepStore()
         message_log = [msg for msg in message_log if "ERROR" in msg or "Chào mừng" in msg]
         return
 
-    if not load_and_parse_kb_log():
-        add_message(f"Khởi tạo thất bại: Không thể phân tích '{KB_FILE_PATH}'.")
+    if TRACE_FORMAT == "json":
+        parsed = load_structured_trace()
+    else:
+        parsed = load_and_parse_kb_log()
+    if not parsed:
+        add_message(f"Khởi tạo thất bại: Không thể phân tích '{trace_file_path()}'.")
         simulation_game_status = "error"
         message_log = [msg for msg in message_log if "ERROR" in msg or "Chào mừng" in msg]
         return
@@ -982,11 +1756,6 @@ def initialize_simulation():
     simulation_running = False
     simulation_game_status = "ready"
     simulation_wumpus_status = "alive"
-    safe_locations.clear()
-    maybe_wumpus_locations.clear()
-    no_wumpus_locations.clear()
-    maybe_pit_locations.clear()
-    no_pit_locations.clear()
 
     add_message(
         f"Khởi tạo hoàn tất. Agent tại {simulation_agent_pos}. Nhấn 'Start Sim'."
@@ -1000,7 +1769,7 @@ def handle_start_press():
     global current_step_index, simulation_game_status, simulation_percepts_current
     global simulation_running, simulation_score, simulation_time_taken, last_auto_step_time
     global simulation_agent_pos, simulation_wumpus_status, simulation_wumpus_location
-    global safe_locations, maybe_wumpus_locations, no_wumpus_locations, maybe_pit_locations, no_pit_locations
+    global kb_grid
 
     if not simulation_steps_data:
         add_message("Lỗi: Không có dữ liệu mô phỏng. Không thể bắt đầu.")
@@ -1009,11 +1778,7 @@ def handle_start_press():
     first_round_data = simulation_steps_data[0]
     initial_percepts = first_round_data.get("percepts")
     initial_messages = first_round_data.get("messages", [])
-    initial_safe_locations = first_round_data.get("safe_locations", [])
-    initial_maybe_wumpus = first_round_data.get("maybe_wumpus_locations", [])
-    initial_no_wumpus = first_round_data.get("no_wumpus_locations", [])
-    initial_maybe_pit = first_round_data.get("maybe_pit_locations", [])
-    initial_no_pit = first_round_data.get("no_pit_locations", [])
+    initial_kb = first_round_data["kb"]
     initial_wumpus_status = first_round_data.get("wumpus_status", "alive")
     initial_wumpus_location = first_round_data.get(
         "wumpus_location", simulation_wumpus_location
@@ -1032,11 +1797,8 @@ def handle_start_press():
     simulation_game_status = "playing"
     simulation_wumpus_status = initial_wumpus_status
     simulation_wumpus_location = initial_wumpus_location
-    safe_locations[:] = initial_safe_locations
-    maybe_wumpus_locations[:] = initial_maybe_wumpus
-    no_wumpus_locations[:] = initial_no_wumpus
-    maybe_pit_locations[:] = initial_maybe_pit
-    no_pit_locations[:] = initial_no_pit
+    kb_grid = initial_kb.copy()
+    follow_agent()
 
     add_message(
         f"Bước 0: Agent tại {simulation_agent_pos}. Tri giác: {initial_percepts}. Điểm: {simulation_score}, Thời gian: {simulation_time_taken}. Trạng thái: playing"
@@ -1061,13 +1823,18 @@ def advance_simulation_step():
     global simulation_score, simulation_time_taken, simulation_game_status
     global simulation_percepts_current, simulation_running
     global simulation_wumpus_status, simulation_wumpus_location
-    global safe_locations, maybe_wumpus_locations, no_wumpus_locations, maybe_pit_locations, no_pit_locations
+    global kb_grid
 
     if simulation_game_status != "playing":
         simulation_running = False
         return False
 
     if current_step_index + 1 >= len(simulation_steps_data):
+        if trace_stream_pending():
+            # Agent chưa chơi xong: giữ nguyên bước hiện tại, chờ vòng tiếp theo
+            if step_by_step_mode:
+                add_message("Agent vẫn đang chạy, chờ vòng tiếp theo...")
+            return True
         add_message("Đã đến cuối dữ liệu mô phỏng.")
         simulation_game_status = (
             simulation_steps_data[current_step_index]["end_status"]
@@ -1091,11 +1858,7 @@ def advance_simulation_step():
         "wumpus_location", simulation_wumpus_location
     )
     current_messages = round_data.get("messages", [])
-    current_safe_locations = round_data.get("safe_locations", [])
-    current_maybe_wumpus = round_data.get("maybe_wumpus_locations", [])
-    current_no_wumpus = round_data.get("no_wumpus_locations", [])
-    current_maybe_pit = round_data.get("maybe_pit_locations", [])
-    current_no_pit = round_data.get("no_pit_locations", [])
+    current_kb = round_data["kb"]
 
     if (
         current_pos is None
@@ -1124,11 +1887,8 @@ def advance_simulation_step():
     simulation_game_status = current_status
     simulation_wumpus_status = current_wumpus_status
     simulation_wumpus_location = current_wumpus_location
-    safe_locations[:] = current_safe_locations
-    maybe_wumpus_locations[:] = current_maybe_wumpus
-    no_wumpus_locations[:] = current_no_wumpus
-    maybe_pit_locations[:] = current_maybe_pit
-    no_pit_locations[:] = current_no_pit
+    kb_grid = current_kb.copy()
+    follow_agent()
 
     if current_step_index > 0:
         prev_pos = simulation_steps_data[current_step_index - 1]["start_location"]
@@ -1143,33 +1903,47 @@ def advance_simulation_step():
     return True
 
 # --- Vòng lặp chính ---
-async def main():
+def start_scene(world_map=None):
+    """
+    Vào màn hình mô phỏng: nhận bản đồ (None: init_data.txt), đổi cỡ cửa sổ
+    nếu đang là cửa sổ của config.py, rồi khởi tạo ván.
+    """
+    global scene_world_map
+    init_display()
+    if world_map is not None:
+        scene_world_map = world_map
+    if pygame.display.get_surface() is not screen or screen.get_size() != (SCREEN_WIDTH, SCREEN_HEIGHT):
+        open_window()
+    initialize_simulation()
+
+async def main(world_map=None, play_pressed=None):
     """
     Vòng lặp chính của trò chơi, xử lý sự kiện và cập nhật giao diện.
+    config.py gọi trong cùng tiến trình với world_map (bản đồ vừa cấu hình) và
+    play_pressed (time.perf_counter() lúc bấm PLAY) để đo độ trễ chuyển cảnh.
     """
     global simulation_running, step_by_step_mode, message_log, current_step_index, last_auto_step_time
+    global start_when_ready
     running = True
     clock = pygame.time.Clock()
     auto_step_delay = 700
 
-    initialize_simulation()
-
-    ui_button_rects = None
+    start_scene(world_map)
 
+    events = []
     while running:
         current_time_ms = pygame.time.get_ticks()
         mouse_pos = pygame.mouse.get_pos()
+        poll_trace_stream()
 
-        for event in pygame.event.get():
+        for event in events + pygame.event.get():
             if event.type == pygame.QUIT:
                 running = False
-            if (
-                event.type == pygame.MOUSEBUTTONDOWN
-                and event.button == 1
-                and ui_button_rects
-            ):
+            handle_view_event(event)
+            if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
+                mouse_pos = event.pos
                 reset_btn_rect, start_btn_rect, step_btn_rect, step_mode_btn_rect = (
-                    ui_button_rects
+                    ui_button_rects()
                 )
                 if reset_btn_rect.collidepoint(mouse_pos):
                     add_message("Nút Reset được nhấn.")
@@ -1178,7 +1952,10 @@ async def main():
                     ]
                     initialize_simulation()
                 elif start_btn_rect.collidepoint(mouse_pos):
-                    if simulation_game_status == "ready":
+                    if simulation_game_status == "loading":
+                        add_message("Sẽ bắt đầu ngay khi agent xong vòng đầu tiên.")
+                        start_when_ready = True
+                    elif simulation_game_status == "ready":
                         handle_start_press()
                     elif simulation_game_status == "playing":
                         if step_by_step_mode:
@@ -1228,21 +2005,27 @@ async def main():
                     add_message("Mô phỏng dừng: Hết bước hoặc trò chơi kết thúc.")
                     simulation_running = False
 
-        screen.fill(WHITE)
-        draw_grid()
-        draw_world_elements()
-        draw_agent_path()
-        draw_action_effects()
-        draw_agent()
-        draw_percepts_at_agent_location()
-        ui_button_rects = draw_ui_elements()
+        render_frame()
+        if play_pressed is not None:
+            latency_ms = (time.perf_counter() - play_pressed) * 1000
+            play_pressed = None
+            add_message(f"Khung hình đầu tiên sau {latency_ms:.0f} ms kể từ khi bấm PLAY.")
+            render_frame()
 
-        pygame.display.flip()
-        clock.tick(60)
         if platform.system() == "Emscripten":
+            clock.tick(60)
+            events = []
             await asyncio.sleep(1.0 / 60)
-        else:
+        elif running:
+            # Không có gì chuyển động thì ngủ tới sự kiện / bước tự động kế tiếp
+            events = render_cache.wait_for_events(
+                next_wakeup_ms(pygame.time.get_ticks(), auto_step_delay)
+            )
             await asyncio.sleep(0)
 
+    stop_trace_stream()
+    if prolog_worker is not None:
+        prolog_worker.stop()
+
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file